@@ -18,7 +18,7 @@ COMPILE_ARGS = ("-Wall -g -O2 -shared -fPIC"
 SSE_FLAGS = "-mfpmath=sse -msse2"
 SOURCE_FILES = [
     'pyhelper.c', 'serialqueue.c', 'stepcompress.c', 'itersolve.c', 'trapq.c',
-    'pollreactor.c', 'msgblock.c', 'trdispatch.c',
+    'pollreactor.c', 'msgblock.c', 'trdispatch.c', 'stepgen.c',
     'kin_cartesian.c', 'kin_corexy.c', 'kin_corexz.c', 'kin_delta.c',
     'kin_deltesian.c', 'kin_polar.c', 'kin_rotary_delta.c', 'kin_winch.c',
     'kin_extruder.c', 'kin_shaper.c',
@@ -26,7 +26,7 @@ SOURCE_FILES = [
 DEST_LIB = "c_helper.so"
 OTHER_FILES = [
     'list.h', 'serialqueue.h', 'stepcompress.h', 'itersolve.h', 'pyhelper.h',
-    'trapq.h', 'pollreactor.h', 'msgblock.h'
+    'trapq.h', 'pollreactor.h', 'msgblock.h', 'stepgen.h'
 ]
 
 defs_stepcompress = """
@@ -39,10 +39,14 @@ defs_stepcompress = """
     struct stepcompress *stepcompress_alloc(uint32_t oid);
     void stepcompress_fill(struct stepcompress *sc, uint32_t max_error
         , int32_t queue_step_msgtag, int32_t set_next_step_dir_msgtag);
+    void stepcompress_set_adaptive_error(struct stepcompress *sc
+        , uint32_t adaptive_max_error);
     void stepcompress_set_invert_sdir(struct stepcompress *sc
         , uint32_t invert_sdir);
     void stepcompress_free(struct stepcompress *sc);
     int stepcompress_reset(struct stepcompress *sc, uint64_t last_step_clock);
+    int stepcompress_append_clocks(struct stepcompress *sc, int sdir
+        , uint64_t *clocks, int count);
     int stepcompress_set_last_position(struct stepcompress *sc
         , uint64_t clock, int64_t last_position);
     int64_t stepcompress_find_past_position(struct stepcompress *sc
@@ -75,6 +79,25 @@ defs_itersolve = """
     void itersolve_set_position(struct stepper_kinematics *sk
         , double x, double y, double z);
     double itersolve_get_commanded_pos(struct stepper_kinematics *sk);
+    void itersolve_set_iterative_only(struct stepper_kinematics *sk
+        , int enable);
+"""
+
+defs_stepgen = """
+    struct stepgen_pool *stepgen_pool_alloc(int num_threads);
+    void stepgen_pool_free(struct stepgen_pool *sp);
+    int32_t stepgen_pool_generate_steps(struct stepgen_pool *sp
+        , struct stepper_kinematics **sk_list, int sk_num, double flush_time);
+
+    struct motion_pipeline *pipeline_alloc(struct stepgen_pool *pool);
+    void pipeline_free(struct motion_pipeline *mp);
+    int32_t pipeline_set_trapqs(struct motion_pipeline *mp
+        , struct trapq **tq_list, int tq_num);
+    int32_t pipeline_set_steppersyncs(struct motion_pipeline *mp
+        , struct steppersync **ss_list, int ss_num);
+    int32_t pipeline_advance(struct motion_pipeline *mp
+        , struct stepper_kinematics **sk_list, int sk_num
+        , double flush_time, double free_time, double move_flush_time);
 """
 
 defs_trapq = """
@@ -93,6 +116,8 @@ defs_trapq = """
         , double axes_r_x, double axes_r_y, double axes_r_z
         , double start_v, double cruise_v, double accel);
     void trapq_finalize_moves(struct trapq *tq, double print_time);
+    void trapq_set_merge_moves(struct trapq *tq, int enable);
+    int64_t trapq_get_merged_moves(struct trapq *tq);
     void trapq_set_position(struct trapq *tq, double print_time
         , double pos_x, double pos_y, double pos_z);
     int trapq_extract_old(struct trapq *tq, struct pull_move *p, int max
@@ -141,6 +166,8 @@ defs_kin_extruder = """
     struct stepper_kinematics *extruder_stepper_alloc(void);
     void extruder_set_pressure_advance(struct stepper_kinematics *sk
         , double pressure_advance, double smooth_time);
+    void extruder_set_smooth_segments(struct stepper_kinematics *sk
+        , int enable);
 """
 
 defs_kin_shaper = """
@@ -208,7 +235,7 @@ defs_std = """
 
 defs_all = [
     defs_pyhelper, defs_serialqueue, defs_std, defs_stepcompress,
-    defs_itersolve, defs_trapq, defs_trdispatch,
+    defs_itersolve, defs_stepgen, defs_trapq, defs_trdispatch,
     defs_kin_cartesian, defs_kin_corexy, defs_kin_corexz, defs_kin_delta,
     defs_kin_deltesian, defs_kin_polar, defs_kin_rotary_delta, defs_kin_winch,
     defs_kin_extruder, defs_kin_shaper,
@@ -4,7 +4,7 @@
 //
 // This file may be distributed under the terms of the GNU GPLv3 license.
 
-#include <math.h> // fabs
+#include <math.h> // fabs, sqrt
 #include <stddef.h> // offsetof
 #include <string.h> // memset
 #include "compiler.h" // __visible
@@ -26,8 +26,8 @@ struct timepos {
 
 // Generate step times for a portion of a move
 static int32_t
-itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
-                          , double abs_start, double abs_end)
+itersolve_gen_steps_iter(struct stepper_kinematics *sk, struct move *m
+                         , double abs_start, double abs_end)
 {
     sk_calc_callback calc_position_cb = sk->calc_position_cb;
     double half_step = .5 * sk->step_dist;
@@ -128,6 +128,104 @@ itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
 }
 
 
+
+/****************************************************************
+ * Analytic solver for linear kinematics
+ ****************************************************************/
+
+// On kinematics where the stepper position is a linear function of
+// the move distance (eg, cartesian and corexy) the step times can be
+// found directly by solving the quadratic motion formula of the move:
+//   position(t) = base + scale * (start_v + half_accel * t) * t
+// The position is monotonic during a move, so the analytic solver is
+// only used when the move travels in the current step direction.
+// Direction changes (and stationary steppers) are left to the
+// iterative solver so that the step+dir+step filtering is unchanged.
+
+// Find the time the motion formula reaches the given distance
+static inline double
+calc_distance_time(double v, double ha, double dist)
+{
+    if (!ha)
+        return dist / v;
+    double disc = v*v + 4. * ha * dist;
+    if (disc < 0.)
+        disc = 0.;
+    return 2. * dist / (v + sqrt(disc));
+}
+
+// Generate step times for a portion of a move on a linear kinematic.
+// Returns 1 if the move must be handled by the iterative solver.
+static int32_t
+itersolve_gen_steps_linear(struct stepper_kinematics *sk, struct move *m
+                           , double abs_start, double abs_end)
+{
+    double half_step = .5 * sk->step_dist;
+    double start = abs_start - m->print_time, end = abs_end - m->print_time;
+    if (start < 0.)
+        start = 0.;
+    if (end > m->move_t)
+        end = m->move_t;
+    double base, scale, v = m->start_v, ha = m->half_accel;
+    sk->calc_linear_cb(m, &base, &scale);
+    if (v < 0. || (!v && ha < 0.)) {
+        // Move with a negative velocity (eg, an extruder retraction)
+        v = -v;
+        ha = -ha;
+        scale = -scale;
+    }
+    int sdir = stepcompress_get_step_dir(sk->sc);
+    if ((sdir ? scale <= 0. : scale >= 0.) || end <= start
+        || (!v && ha <= 0.))
+        return 1;
+    double target = sk->commanded_pos + (sdir ? half_step : -half_step);
+    double end_pos = sk->calc_position_cb(sk, m, end);
+    double inv_scale = 1. / scale, step = sdir ? 2. * half_step : -2.*half_step;
+    for (;;) {
+        double rel_dist = sdir ? end_pos - target : target - end_pos;
+        if (rel_dist < -.000000001)
+            break;
+        // Found next step - submit it
+        double step_time = end;
+        if (rel_dist > 0.) {
+            step_time = calc_distance_time(v, ha, (target - base) * inv_scale);
+            if (step_time < start)
+                step_time = start;
+            else if (step_time > end)
+                step_time = end;
+        }
+        int ret = stepcompress_append(sk->sc, sdir, m->print_time, step_time);
+        if (ret)
+            return ret;
+        target += step;
+    }
+    // Avoid rollback if stepper fully reaches step position
+    double rel_dist = sdir ? end_pos - target : target - end_pos;
+    if (rel_dist >= -half_step) {
+        int ret = stepcompress_commit(sk->sc);
+        if (ret)
+            return ret;
+    }
+    sk->commanded_pos = target - (sdir ? half_step : -half_step);
+    if (sk->post_cb)
+        sk->post_cb(sk);
+    return 0;
+}
+
+// Generate step times for a portion of a move
+static int32_t
+itersolve_gen_steps_range(struct stepper_kinematics *sk, struct move *m
+                          , double abs_start, double abs_end)
+{
+    if (sk->calc_linear_cb && !sk->iterative_only) {
+        int32_t ret = itersolve_gen_steps_linear(sk, m, abs_start, abs_end);
+        if (ret != 1)
+            return ret;
+    }
+    return itersolve_gen_steps_iter(sk, m, abs_start, abs_end);
+}
+
+
 /****************************************************************
  * Interface functions
  ****************************************************************/
@@ -278,3 +376,10 @@ itersolve_get_commanded_pos(struct stepper_kinematics *sk)
 {
     return sk->commanded_pos;
 }
+
+// Disable the analytic solver (for testing)
+void __visible
+itersolve_set_iterative_only(struct stepper_kinematics *sk, int enable)
+{
+    sk->iterative_only = enable;
+}
@@ -12,6 +12,8 @@ struct move;
 typedef double (*sk_calc_callback)(struct stepper_kinematics *sk, struct move *m
                                    , double move_time);
 typedef void (*sk_post_callback)(struct stepper_kinematics *sk);
+typedef void (*sk_linear_callback)(struct move *m, double *base
+                                   , double *scale);
 struct stepper_kinematics {
     double step_dist, commanded_pos;
     struct stepcompress *sc;
@@ -23,6 +25,9 @@ struct stepper_kinematics {
 
     sk_calc_callback calc_position_cb;
     sk_post_callback post_cb;
+    // Optional: stepper position is base + scale * move_get_distance()
+    sk_linear_callback calc_linear_cb;
+    int iterative_only;
 };
 
 int32_t itersolve_generate_steps(struct stepper_kinematics *sk
@@ -37,5 +42,6 @@ double itersolve_calc_position_from_coord(struct stepper_kinematics *sk
 void itersolve_set_position(struct stepper_kinematics *sk
                             , double x, double y, double z);
 double itersolve_get_commanded_pos(struct stepper_kinematics *sk);
+void itersolve_set_iterative_only(struct stepper_kinematics *sk, int enable);
 
 #endif // itersolve.h
@@ -18,6 +18,13 @@ cart_stepper_x_calc_position(struct stepper_kinematics *sk, struct move *m
     return move_get_coord(m, move_time).x;
 }
 
+static void
+cart_stepper_x_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = m->start_pos.x;
+    *scale = m->axes_r.x;
+}
+
 static double
 cart_stepper_y_calc_position(struct stepper_kinematics *sk, struct move *m
                              , double move_time)
@@ -25,6 +32,13 @@ cart_stepper_y_calc_position(struct stepper_kinematics *sk, struct move *m
     return move_get_coord(m, move_time).y;
 }
 
+static void
+cart_stepper_y_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = m->start_pos.y;
+    *scale = m->axes_r.y;
+}
+
 static double
 cart_stepper_z_calc_position(struct stepper_kinematics *sk, struct move *m
                              , double move_time)
@@ -32,6 +46,13 @@ cart_stepper_z_calc_position(struct stepper_kinematics *sk, struct move *m
     return move_get_coord(m, move_time).z;
 }
 
+static void
+cart_stepper_z_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = m->start_pos.z;
+    *scale = m->axes_r.z;
+}
+
 struct stepper_kinematics * __visible
 cartesian_stepper_alloc(char axis)
 {
@@ -39,12 +60,15 @@ cartesian_stepper_alloc(char axis)
     memset(sk, 0, sizeof(*sk));
     if (axis == 'x') {
         sk->calc_position_cb = cart_stepper_x_calc_position;
+        sk->calc_linear_cb = cart_stepper_x_calc_linear;
         sk->active_flags = AF_X;
     } else if (axis == 'y') {
         sk->calc_position_cb = cart_stepper_y_calc_position;
+        sk->calc_linear_cb = cart_stepper_y_calc_linear;
         sk->active_flags = AF_Y;
     } else if (axis == 'z') {
         sk->calc_position_cb = cart_stepper_z_calc_position;
+        sk->calc_linear_cb = cart_stepper_z_calc_linear;
         sk->active_flags = AF_Z;
     }
     return sk;
@@ -57,6 +81,13 @@ cart_reverse_stepper_x_calc_position(struct stepper_kinematics *sk
     return -move_get_coord(m, move_time).x;
 }
 
+static void
+cart_reverse_stepper_x_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = -m->start_pos.x;
+    *scale = -m->axes_r.x;
+}
+
 static double
 cart_reverse_stepper_y_calc_position(struct stepper_kinematics *sk
                              , struct move *m, double move_time)
@@ -64,6 +95,13 @@ cart_reverse_stepper_y_calc_position(struct stepper_kinematics *sk
     return -move_get_coord(m, move_time).y;
 }
 
+static void
+cart_reverse_stepper_y_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = -m->start_pos.y;
+    *scale = -m->axes_r.y;
+}
+
 static double
 cart_reverse_stepper_z_calc_position(struct stepper_kinematics *sk
                              , struct move *m, double move_time)
@@ -71,6 +109,13 @@ cart_reverse_stepper_z_calc_position(struct stepper_kinematics *sk
     return -move_get_coord(m, move_time).z;
 }
 
+static void
+cart_reverse_stepper_z_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = -m->start_pos.z;
+    *scale = -m->axes_r.z;
+}
+
 struct stepper_kinematics * __visible
 cartesian_reverse_stepper_alloc(char axis)
 {
@@ -78,12 +123,15 @@ cartesian_reverse_stepper_alloc(char axis)
     memset(sk, 0, sizeof(*sk));
     if (axis == 'x') {
         sk->calc_position_cb = cart_reverse_stepper_x_calc_position;
+        sk->calc_linear_cb = cart_reverse_stepper_x_calc_linear;
         sk->active_flags = AF_X;
     } else if (axis == 'y') {
         sk->calc_position_cb = cart_reverse_stepper_y_calc_position;
+        sk->calc_linear_cb = cart_reverse_stepper_y_calc_linear;
         sk->active_flags = AF_Y;
     } else if (axis == 'z') {
         sk->calc_position_cb = cart_reverse_stepper_z_calc_position;
+        sk->calc_linear_cb = cart_reverse_stepper_z_calc_linear;
         sk->active_flags = AF_Z;
     }
     return sk;
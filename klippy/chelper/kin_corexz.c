@@ -26,15 +26,32 @@ corexz_stepper_minus_calc_position(struct stepper_kinematics *sk, struct move *m
     return c.x - c.z;
 }
 
+static void
+corexz_stepper_plus_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = m->start_pos.x + m->start_pos.z;
+    *scale = m->axes_r.x + m->axes_r.z;
+}
+
+static void
+corexz_stepper_minus_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = m->start_pos.x - m->start_pos.z;
+    *scale = m->axes_r.x - m->axes_r.z;
+}
+
 struct stepper_kinematics * __visible
 corexz_stepper_alloc(char type)
 {
     struct stepper_kinematics *sk = malloc(sizeof(*sk));
     memset(sk, 0, sizeof(*sk));
-    if (type == '+')
+    if (type == '+') {
         sk->calc_position_cb = corexz_stepper_plus_calc_position;
-    else if (type == '-')
+        sk->calc_linear_cb = corexz_stepper_plus_calc_linear;
+    } else if (type == '-') {
         sk->calc_position_cb = corexz_stepper_minus_calc_position;
+        sk->calc_linear_cb = corexz_stepper_minus_calc_linear;
+    }
     sk->active_flags = AF_X | AF_Z;
     return sk;
 }
@@ -101,9 +101,123 @@ pa_range_integrate(struct move *m, double move_time
     return res;
 }
 
+
+
+/****************************************************************
+ * Precomputed smoothed position
+ ****************************************************************/
+
+// Between the times where t-smooth_time/2, t, or t+smooth_time/2
+// cross a move boundary, the smoothed position is a polynomial of t.
+// From the triangular weights of the smoothing:
+//   smooth_velocity(t) = (integral(pa_position, t, t+smooth_time/2)
+//                         - integral(pa_position, t-smooth_time/2, t))
+//                        / ((smooth_time/2)**2)
+//   smooth_accel(t) = (pa_position(t+smooth_time/2) - 2*pa_position(t)
+//                      + pa_position(t-smooth_time/2)) / ((smooth_time/2)**2)
+// and the third and fourth derivatives follow from the pa_position
+// velocity and acceleration in the same way.  The coefficients of the
+// segment around the last requested time are cached so that the many
+// calc_position calls itersolve makes for each step are evaluated
+// without integrating over the moves.
+
+struct smooth_segment {
+    struct move *m;
+    double move_time, start_time, end_time;
+    double c0, c1, c2, c3, c4;
+};
+
+// Find the move containing a time (relative to the start of move 'm')
+static struct move *
+find_move(struct move *m, double *move_time)
+{
+    while (unlikely(*move_time < 0.)) {
+        m = list_prev_entry(m, node);
+        *move_time += m->move_t;
+    }
+    while (unlikely(*move_time > m->move_t)) {
+        *move_time -= m->move_t;
+        m = list_next_entry(m, node);
+    }
+    return m;
+}
+
+// Calculate the definitive integral of the pressure advanced position
+// (relative to 'base') over a range of moves
+static double
+pa_range_integrate_pos(struct move *m, double pressure_advance, double base
+                       , double start, double end)
+{
+    double duration = end - start;
+    m = find_move(m, &start);
+    end = start + duration;
+    double res = 0.;
+    for (;;) {
+        double pa = m->axes_r.y != 0. ? pressure_advance : 0.;
+        double move_base = m->start_pos.x - base + pa * m->start_v;
+        double start_v = m->start_v + pa * 2. * m->half_accel;
+        double move_end = end < m->move_t ? end : m->move_t;
+        res += extruder_integrate(move_base, start_v, m->half_accel
+                                  , start, move_end);
+        if (end <= m->move_t)
+            return res;
+        end -= m->move_t;
+        start = 0.;
+        m = list_next_entry(m, node);
+    }
+}
+
+// Calculate the smoothed position polynomial around the given time
+static void
+build_smooth_segment(struct smooth_segment *seg, struct move *m
+                     , double move_time, double pressure_advance
+                     , double hst, double inv_hst2, double position)
+{
+    double start_time = move_time - hst, end_time = move_time + hst;
+    double pos[3], vel[3], accel[3];
+    int i;
+    for (i = 0; i < 3; i++) {
+        double t = move_time + (i - 1) * hst;
+        struct move *pm = find_move(m, &t);
+        double pa = pm->axes_r.y != 0. ? pressure_advance : 0.;
+        double v = pm->start_v + 2. * pm->half_accel * t;
+        pos[i] = (pm->start_pos.x - m->start_pos.x
+                  + move_get_distance(pm, t) + pa * v);
+        vel[i] = v + pa * 2. * pm->half_accel;
+        accel[i] = 2. * pm->half_accel;
+        // Range of times for which this point stays within 'pm'
+        if (start_time < move_time - t)
+            start_time = move_time - t;
+        if (end_time > move_time - t + pm->move_t)
+            end_time = move_time - t + pm->move_t;
+    }
+    double base = m->start_pos.x;
+    double fwd = pa_range_integrate_pos(m, pressure_advance, base
+                                        , move_time, move_time + hst);
+    double back = pa_range_integrate_pos(m, pressure_advance, base
+                                         , move_time - hst, move_time);
+    // Moves from itersolve_calc_position_from_coord() are not on a trapq
+    seg->m = m->node.next ? m : NULL;
+    seg->move_time = move_time;
+    seg->start_time = start_time;
+    seg->end_time = end_time;
+    seg->c0 = position;
+    seg->c1 = (fwd - back) * inv_hst2;
+    seg->c2 = (pos[2] - 2. * pos[1] + pos[0]) * inv_hst2 * (1. / 2.);
+    seg->c3 = (vel[2] - 2. * vel[1] + vel[0]) * inv_hst2 * (1. / 6.);
+    seg->c4 = (accel[2] - 2. * accel[1] + accel[0]) * inv_hst2 * (1. / 24.);
+}
+
+
+/****************************************************************
+ * Extruder kinematics
+ ****************************************************************/
+
 struct extruder_stepper {
     struct stepper_kinematics sk;
     double pressure_advance, half_smooth_time, inv_half_smooth_time2;
+    int use_segments;
+    struct smooth_segment seg;
 };
 
 static double
@@ -115,9 +229,35 @@ extruder_calc_position(struct stepper_kinematics *sk, struct move *m
     if (!hst)
         // Pressure advance not enabled
         return m->start_pos.x + move_get_distance(m, move_time);
+    struct smooth_segment *seg = &es->seg;
+    if (es->use_segments && m == seg->m && move_time >= seg->start_time
+        && move_time <= seg->end_time) {
+        double t = move_time - seg->move_time;
+        return seg->c0 + (seg->c1 + (seg->c2 + (seg->c3 + seg->c4 * t)
+                                     * t) * t) * t;
+    }
     // Apply pressure advance and average over smooth_time
     double area = pa_range_integrate(m, move_time, es->pressure_advance, hst);
-    return m->start_pos.x + area * es->inv_half_smooth_time2;
+    double position = m->start_pos.x + area * es->inv_half_smooth_time2;
+    if (es->use_segments)
+        build_smooth_segment(seg, m, move_time, es->pressure_advance, hst
+                             , es->inv_half_smooth_time2, position);
+    return position;
+}
+
+// The trapq may change between step generation calls
+static void
+extruder_post(struct stepper_kinematics *sk)
+{
+    struct extruder_stepper *es = container_of(sk, struct extruder_stepper, sk);
+    es->seg.m = NULL;
+}
+
+static void
+extruder_calc_linear(struct move *m, double *base, double *scale)
+{
+    *base = m->start_pos.x;
+    *scale = 1.;
 }
 
 void __visible
@@ -128,18 +268,31 @@ extruder_set_pressure_advance(struct stepper_kinematics *sk
     double hst = smooth_time * .5;
     es->half_smooth_time = hst;
     es->sk.gen_steps_pre_active = es->sk.gen_steps_post_active = hst;
+    es->sk.calc_linear_cb = hst ? NULL : extruder_calc_linear;
+    es->seg.m = NULL;
     if (! hst)
         return;
     es->inv_half_smooth_time2 = 1. / (hst * hst);
     es->pressure_advance = pressure_advance;
 }
 
+// Enable (or disable) the precomputed smoothed position segments
+void __visible
+extruder_set_smooth_segments(struct stepper_kinematics *sk, int enable)
+{
+    struct extruder_stepper *es = container_of(sk, struct extruder_stepper, sk);
+    es->use_segments = enable;
+    es->seg.m = NULL;
+}
+
 struct stepper_kinematics * __visible
 extruder_stepper_alloc(void)
 {
     struct extruder_stepper *es = malloc(sizeof(*es));
     memset(es, 0, sizeof(*es));
     es->sk.calc_position_cb = extruder_calc_position;
+    es->sk.calc_linear_cb = extruder_calc_linear;
+    es->sk.post_cb = extruder_post;
     es->sk.active_flags = AF_X;
     return &es->sk;
 }
@@ -5,6 +5,7 @@
 //
 // This file may be distributed under the terms of the GNU GPLv3 license.
 
+#include <float.h> // DBL_MAX
 #include <math.h> // sqrt, exp
 #include <stddef.h> // offsetof
 #include <stdlib.h> // malloc
@@ -65,41 +66,72 @@ init_shaper(int n, double a[], double t[], struct shaper_pulses *sp)
  * Generic position calculation via shaper convolution
  ****************************************************************/
 
-static inline double
-get_axis_position(struct move *m, int axis, double move_time)
-{
-    double axis_r = m->axes_r.axis[axis - 'x'];
-    double start_pos = m->start_pos.axis[axis - 'x'];
-    double move_dist = move_get_distance(m, move_time);
-    return start_pos + axis_r * move_dist;
-}
+// The shaped position is the convolution of the shaper pulses with the
+// input signal.  Between the (pulse shifted) move boundaries it is a
+// quadratic function of time, so the coefficients of the segment
+// around the last requested time are cached.  This avoids walking the
+// trapq for every shaper pulse on each of the many calc_position
+// calls itersolve makes for each step.
+struct shaper_segment {
+    struct move *m;
+    double time, start_time, end_time;
+    double c0, c1, c2;
+};
 
-static inline double
-get_axis_position_across_moves(struct move *m, int axis, double time)
+// Calculate the shaped position polynomial around the given time
+static void
+build_segment(struct shaper_segment *seg, struct move *m, int axis
+              , double move_time, struct shaper_pulses *sp)
 {
-    while (likely(time < 0.)) {
-        m = list_prev_entry(m, node);
-        time += m->move_t;
-    }
-    while (likely(time > m->move_t)) {
-        time -= m->move_t;
-        m = list_next_entry(m, node);
+    double time = m->print_time + move_time;
+    double start_time = -DBL_MAX, end_time = DBL_MAX;
+    double c0 = 0., c1 = 0., c2 = 0.;
+    int num_pulses = sp->num_pulses, i;
+    for (i = 0; i < num_pulses; ++i) {
+        double t = move_time + sp->pulses[i].t, a = sp->pulses[i].a;
+        struct move *pm = m;
+        // Find the move containing the pulse
+        while (likely(t < 0.)) {
+            pm = list_prev_entry(pm, node);
+            t += pm->move_t;
+        }
+        while (likely(t > pm->move_t)) {
+            t -= pm->move_t;
+            pm = list_next_entry(pm, node);
+        }
+        double axis_r = a * pm->axes_r.axis[axis - 'x'];
+        double start_pos = a * pm->start_pos.axis[axis - 'x'];
+        c0 += start_pos + axis_r * move_get_distance(pm, t);
+        c1 += axis_r * (pm->start_v + 2. * pm->half_accel * t);
+        c2 += axis_r * pm->half_accel;
+        // Range of times for which this pulse stays within 'pm'
+        if (start_time < time - t)
+            start_time = time - t;
+        if (end_time > time - t + pm->move_t)
+            end_time = time - t + pm->move_t;
     }
-    return get_axis_position(m, axis, time);
+    // Moves from itersolve_calc_position_from_coord() are not on a trapq
+    seg->m = m->node.next ? m : NULL;
+    seg->time = time;
+    seg->start_time = start_time;
+    seg->end_time = end_time;
+    seg->c0 = c0;
+    seg->c1 = c1;
+    seg->c2 = c2;
 }
 
-// Calculate the position from the convolution of the shaper with input signal
+// Calculate the shaped position using the cached segment if possible
 static inline double
-calc_position(struct move *m, int axis, double move_time
-              , struct shaper_pulses *sp)
+calc_position_cached(struct shaper_segment *seg, struct move *m, int axis
+                     , double move_time, struct shaper_pulses *sp)
 {
-    double res = 0.;
-    int num_pulses = sp->num_pulses, i;
-    for (i = 0; i < num_pulses; ++i) {
-        double t = sp->pulses[i].t, a = sp->pulses[i].a;
-        res += a * get_axis_position_across_moves(m, axis, move_time + t);
+    double time = m->print_time + move_time;
+    if (m != seg->m || time < seg->start_time || time > seg->end_time) {
+        build_segment(seg, m, axis, move_time, sp);
+        return seg->c0;
     }
-    return res;
+    double dt = time - seg->time;
+    return seg->c0 + (seg->c1 + seg->c2 * dt) * dt;
 }
 
 
@@ -114,6 +146,7 @@ struct input_shaper {
     struct stepper_kinematics *orig_sk;
     struct move m;
     struct shaper_pulses sx, sy;
+    struct shaper_segment seg_x, seg_y;
 };
 
 // Optimized calc_position when only x axis is needed
@@ -124,7 +157,8 @@ shaper_x_calc_position(struct stepper_kinematics *sk, struct move *m
     struct input_shaper *is = container_of(sk, struct input_shaper, sk);
     if (!is->sx.num_pulses)
         return is->orig_sk->calc_position_cb(is->orig_sk, m, move_time);
-    is->m.start_pos.x = calc_position(m, 'x', move_time, &is->sx);
+    is->m.start_pos.x = calc_position_cached(
+        &is->seg_x, m, 'x', move_time, &is->sx);
     return is->orig_sk->calc_position_cb(is->orig_sk, &is->m, DUMMY_T);
 }
 
@@ -136,7 +170,8 @@ shaper_y_calc_position(struct stepper_kinematics *sk, struct move *m
     struct input_shaper *is = container_of(sk, struct input_shaper, sk);
     if (!is->sy.num_pulses)
         return is->orig_sk->calc_position_cb(is->orig_sk, m, move_time);
-    is->m.start_pos.y = calc_position(m, 'y', move_time, &is->sy);
+    is->m.start_pos.y = calc_position_cached(
+        &is->seg_y, m, 'y', move_time, &is->sy);
     return is->orig_sk->calc_position_cb(is->orig_sk, &is->m, DUMMY_T);
 }
 
@@ -150,12 +185,22 @@ shaper_xy_calc_position(struct stepper_kinematics *sk, struct move *m
         return is->orig_sk->calc_position_cb(is->orig_sk, m, move_time);
     is->m.start_pos = move_get_coord(m, move_time);
     if (is->sx.num_pulses)
-        is->m.start_pos.x = calc_position(m, 'x', move_time, &is->sx);
+        is->m.start_pos.x = calc_position_cached(
+            &is->seg_x, m, 'x', move_time, &is->sx);
     if (is->sy.num_pulses)
-        is->m.start_pos.y = calc_position(m, 'y', move_time, &is->sy);
+        is->m.start_pos.y = calc_position_cached(
+            &is->seg_y, m, 'y', move_time, &is->sy);
     return is->orig_sk->calc_position_cb(is->orig_sk, &is->m, DUMMY_T);
 }
 
+// The trapq may change between step generation calls
+static void
+shaper_post(struct stepper_kinematics *sk)
+{
+    struct input_shaper *is = container_of(sk, struct input_shaper, sk);
+    is->seg_x.m = is->seg_y.m = NULL;
+}
+
 int __visible
 input_shaper_set_sk(struct stepper_kinematics *sk
                     , struct stepper_kinematics *orig_sk)
@@ -170,6 +215,7 @@ input_shaper_set_sk(struct stepper_kinematics *sk
     else
         return -1;
     is->sk.active_flags = orig_sk->active_flags;
+    is->sk.post_cb = shaper_post;
     is->orig_sk = orig_sk;
     is->sk.commanded_pos = orig_sk->commanded_pos;
     is->sk.last_flush_time = orig_sk->last_flush_time;
@@ -203,6 +249,7 @@ input_shaper_set_shaper_params(struct stepper_kinematics *sk, char axis
         return -1;
     struct input_shaper *is = container_of(sk, struct input_shaper, sk);
     struct shaper_pulses *sp = axis == 'x' ? &is->sx : &is->sy;
+    is->seg_x.m = is->seg_y.m = NULL;
     int status = 0;
     if (is->orig_sk->active_flags & (axis == 'x' ? AF_X : AF_Y))
         status = init_shaper(n, a, t, sp);
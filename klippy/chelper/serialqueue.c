@@ -912,6 +912,19 @@ serialqueue_get_clock_est(struct serialqueue *sq, struct clock_estimate *ce)
     pthread_mutex_unlock(&sq->lock);
 }
 
+// Return the number of bytes ready to transmit (but not yet sent) and
+// the current estimated mcu clock (or zero if the clock is not known)
+void
+serialqueue_get_load(struct serialqueue *sq, int *ready_bytes
+                     , uint64_t *clock)
+{
+    double eventtime = get_monotonic();
+    pthread_mutex_lock(&sq->lock);
+    *ready_bytes = sq->ready_bytes;
+    *clock = sq->ce.est_freq ? clock_from_time(&sq->ce, eventtime) : 0;
+    pthread_mutex_unlock(&sq->lock);
+}
+
 // Return a string buffer containing statistics for the serial port
 void __visible
 serialqueue_get_stats(struct serialqueue *sq, char *buf, int len)
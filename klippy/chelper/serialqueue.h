@@ -49,6 +49,8 @@ void serialqueue_set_clock_est(struct serialqueue *sq, double est_freq
                                , uint64_t last_clock);
 void serialqueue_get_clock_est(struct serialqueue *sq
                                , struct clock_estimate *ce);
+void serialqueue_get_load(struct serialqueue *sq, int *ready_bytes
+                          , uint64_t *clock);
 void serialqueue_get_stats(struct serialqueue *sq, char *buf, int len);
 int serialqueue_extract_old(struct serialqueue *sq, int sentq
                             , struct pull_queue_message *q, int max);
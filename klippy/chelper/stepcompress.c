@@ -32,7 +32,8 @@ struct stepcompress {
     // Buffer management
     uint32_t *queue, *queue_end, *queue_pos, *queue_next;
     // Internal tracking
-    uint32_t max_error;
+    uint32_t max_error, base_max_error, adaptive_max_error;
+    uint32_t adaptive_msgs;
     double mcu_time_offset, mcu_freq, last_step_print_time;
     // Message generation
     uint64_t last_step_clock;
@@ -261,11 +262,22 @@ void __visible
 stepcompress_fill(struct stepcompress *sc, uint32_t max_error
                   , int32_t queue_step_msgtag, int32_t set_next_step_dir_msgtag)
 {
-    sc->max_error = max_error;
+    sc->max_error = sc->base_max_error = max_error;
     sc->queue_step_msgtag = queue_step_msgtag;
     sc->set_next_step_dir_msgtag = set_next_step_dir_msgtag;
 }
 
+// Allow the max_error to be relaxed up to 'adaptive_max_error' while
+// the mcu connection is congested (zero disables)
+void __visible
+stepcompress_set_adaptive_error(struct stepcompress *sc
+                                , uint32_t adaptive_max_error)
+{
+    sc->adaptive_max_error = adaptive_max_error;
+    if (adaptive_max_error <= sc->base_max_error)
+        sc->max_error = sc->base_max_error;
+}
+
 // Set the inverted stepper direction flag
 void __visible
 stepcompress_set_invert_sdir(struct stepcompress *sc, uint32_t invert_sdir)
@@ -358,6 +370,7 @@ add_move(struct stepcompress *sc, uint64_t first_clock, struct step_move *move)
         qm->req_clock = first_clock;
     list_add_tail(&qm->node, &sc->msg_queue);
     sc->last_step_clock = last_clock;
+    sc->adaptive_msgs++;
 
     // Create and store move in history tracking
     struct history_steps *hs = malloc(sizeof(*hs));
@@ -536,6 +549,24 @@ stepcompress_commit(struct stepcompress *sc)
     return 0;
 }
 
+// Add a list of precomputed step clocks (eg, when replaying a log)
+int __visible
+stepcompress_append_clocks(struct stepcompress *sc, int sdir
+                           , uint64_t *clocks, int count)
+{
+    int i;
+    for (i=0; i<count; i++) {
+        if (sc->next_step_clock) {
+            int ret = queue_append(sc);
+            if (ret)
+                return ret;
+        }
+        sc->next_step_clock = clocks[i];
+        sc->next_step_dir = sdir;
+    }
+    return 0;
+}
+
 // Flush pending steps
 static int
 stepcompress_flush(struct stepcompress *sc, uint64_t move_clock)
@@ -669,6 +700,10 @@ struct steppersync {
     // Storage for list of pending move clocks
     uint64_t *move_clocks;
     int num_move_clocks;
+    // Conversion from print_time to mcu clock
+    double time_offset, mcu_freq;
+    // Adaptive step compression error tracking
+    double adaptive_load;
 };
 
 // Allocate a new 'steppersync' object
@@ -709,6 +744,8 @@ void __visible
 steppersync_set_time(struct steppersync *ss, double time_offset
                      , double mcu_freq)
 {
+    ss->time_offset = time_offset;
+    ss->mcu_freq = mcu_freq;
     int i;
     for (i=0; i<ss->sc_num; i++) {
         struct stepcompress *sc = ss->sc_list[i];
@@ -741,10 +778,79 @@ heap_replace(struct steppersync *ss, uint64_t req_clock)
     }
 }
 
+// Transmit backlog (in bytes) and mcu move queue usage at which the
+// step compression error is fully relaxed
+#define ADAPTIVE_READY_BYTES (MESSAGE_MAX * 8)
+#define ADAPTIVE_QUEUE_LOW 0.50
+#define ADAPTIVE_QUEUE_HIGH 0.90
+// Rate at which the error is tightened again once the load drops
+#define ADAPTIVE_DECAY 0.10
+
+// Update the max_error of each stepcompress from the current load on
+// the serial port and on the mcu move queue
+static void
+update_adaptive_error(struct steppersync *ss)
+{
+    int i, has_adaptive = 0;
+    uint32_t max_msgs = 0;
+    for (i=0; i<ss->sc_num; i++) {
+        struct stepcompress *sc = ss->sc_list[i];
+        if (sc->adaptive_max_error > sc->base_max_error)
+            has_adaptive = 1;
+        if (sc->adaptive_msgs > max_msgs)
+            max_msgs = sc->adaptive_msgs;
+    }
+    if (!has_adaptive)
+        return;
+
+    // Determine the load on the serial port
+    int ready_bytes;
+    uint64_t clock;
+    serialqueue_get_load(ss->sq, &ready_bytes, &clock);
+    double load = (double)ready_bytes / ADAPTIVE_READY_BYTES;
+
+    // Determine the load on the mcu move queue
+    if (clock && ss->num_move_clocks) {
+        int used = 0;
+        for (i=0; i<ss->num_move_clocks; i++)
+            if (ss->move_clocks[i] > clock)
+                used++;
+        double usage = (double)used / ss->num_move_clocks;
+        double qload = ((usage - ADAPTIVE_QUEUE_LOW)
+                        / (ADAPTIVE_QUEUE_HIGH - ADAPTIVE_QUEUE_LOW));
+        if (qload > load)
+            load = qload;
+    }
+    if (load > 1.)
+        load = 1.;
+    else if (load < 0.)
+        load = 0.;
+
+    // Relax the error immediately, but tighten it gradually
+    if (load > ss->adaptive_load)
+        ss->adaptive_load = load;
+    else
+        ss->adaptive_load += (load - ss->adaptive_load) * ADAPTIVE_DECAY;
+
+    // Relax each stepper according to its share of the recent
+    // queue_step traffic
+    for (i=0; i<ss->sc_num; i++) {
+        struct stepcompress *sc = ss->sc_list[i];
+        uint32_t base = sc->base_max_error, max = sc->adaptive_max_error;
+        if (max > base && max_msgs) {
+            double share = (double)sc->adaptive_msgs / max_msgs;
+            sc->max_error = base + (max - base) * ss->adaptive_load * share;
+        }
+        sc->adaptive_msgs /= 2;
+    }
+}
+
 // Find and transmit any scheduled steps prior to the given 'move_clock'
 int __visible
 steppersync_flush(struct steppersync *ss, uint64_t move_clock)
 {
+    update_adaptive_error(ss);
+
     // Flush each stepcompress to the specified move_clock
     int i;
     for (i=0; i<ss->sc_num; i++) {
@@ -793,3 +899,13 @@ steppersync_flush(struct steppersync *ss, uint64_t move_clock)
         serialqueue_send_batch(ss->sq, ss->cq, &msgs);
     return 0;
 }
+
+// Transmit any scheduled steps prior to the given 'print_time'
+int
+steppersync_flush_time(struct steppersync *ss, double print_time)
+{
+    double clock = (print_time - ss->time_offset) * ss->mcu_freq;
+    if (clock < 0.)
+        return 0;
+    return steppersync_flush(ss, clock);
+}
@@ -15,6 +15,8 @@ struct stepcompress *stepcompress_alloc(uint32_t oid);
 void stepcompress_fill(struct stepcompress *sc, uint32_t max_error
                        , int32_t queue_step_msgtag
                        , int32_t set_next_step_dir_msgtag);
+void stepcompress_set_adaptive_error(struct stepcompress *sc
+                                     , uint32_t adaptive_max_error);
 void stepcompress_set_invert_sdir(struct stepcompress *sc
                                   , uint32_t invert_sdir);
 void stepcompress_free(struct stepcompress *sc);
@@ -23,6 +25,8 @@ int stepcompress_get_step_dir(struct stepcompress *sc);
 int stepcompress_append(struct stepcompress *sc, int sdir
                         , double print_time, double step_time);
 int stepcompress_commit(struct stepcompress *sc);
+int stepcompress_append_clocks(struct stepcompress *sc, int sdir
+                               , uint64_t *clocks, int count);
 int stepcompress_reset(struct stepcompress *sc, uint64_t last_step_clock);
 int stepcompress_set_last_position(struct stepcompress *sc, uint64_t clock
                                    , int64_t last_position);
@@ -41,5 +45,6 @@ void steppersync_free(struct steppersync *ss);
 void steppersync_set_time(struct steppersync *ss, double time_offset
                           , double mcu_freq);
 int steppersync_flush(struct steppersync *ss, uint64_t move_clock);
+int steppersync_flush_time(struct steppersync *ss, double print_time);
 
 #endif // stepcompress.h
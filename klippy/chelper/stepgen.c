@@ -0,0 +1,277 @@
+// Parallel step generation and batched motion flushing
+//
+// Copyright (C) 2026  agent <agent@local>
+//
+// This file may be distributed under the terms of the GNU GPLv3 license.
+
+#include <pthread.h> // pthread_create
+#include <stdlib.h> // malloc
+#include <string.h> // memset
+#include "compiler.h" // __visible
+#include "itersolve.h" // itersolve_generate_steps
+#include "pyhelper.h" // report_errno
+#include "stepcompress.h" // steppersync_flush_time
+#include "stepgen.h" // stepgen_pool_alloc
+#include "trapq.h" // trapq_check_sentinels
+
+// Steppers are independent of each other between calls to
+// trapq_finalize_moves(), so the itersolve_generate_steps() calls of a
+// batch may run concurrently.  The calling thread takes part in the
+// work and waits until every stepper of the batch is done.
+
+struct stepgen_pool {
+    pthread_mutex_t lock; // protects variables below
+    pthread_cond_t work_cond, done_cond;
+    int num_threads, do_exit;
+    uint32_t batch_id;
+    // Current batch
+    struct stepper_kinematics **sk_list;
+    int sk_num, next_sk, pending;
+    double flush_time;
+    int32_t ret;
+    pthread_t tids[];
+};
+
+// Run steppers from the current batch until none are left (called
+// with the lock held)
+static void
+run_batch(struct stepgen_pool *sp)
+{
+    while (sp->next_sk < sp->sk_num) {
+        struct stepper_kinematics *sk = sp->sk_list[sp->next_sk++];
+        double flush_time = sp->flush_time;
+        pthread_mutex_unlock(&sp->lock);
+        int32_t ret = itersolve_generate_steps(sk, flush_time);
+        pthread_mutex_lock(&sp->lock);
+        if (ret && !sp->ret)
+            sp->ret = ret;
+        if (!--sp->pending)
+            pthread_cond_signal(&sp->done_cond);
+    }
+}
+
+// Main code for worker threads
+static void *
+worker_thread(void *data)
+{
+    struct stepgen_pool *sp = data;
+    pthread_mutex_lock(&sp->lock);
+    uint32_t batch_id = sp->batch_id;
+    for (;;) {
+        while (!sp->do_exit && sp->batch_id == batch_id)
+            pthread_cond_wait(&sp->work_cond, &sp->lock);
+        if (sp->do_exit)
+            break;
+        batch_id = sp->batch_id;
+        run_batch(sp);
+    }
+    pthread_mutex_unlock(&sp->lock);
+    return NULL;
+}
+
+// Stop and wait for the first 'count' worker threads
+static void
+stop_threads(struct stepgen_pool *sp, int count)
+{
+    pthread_mutex_lock(&sp->lock);
+    sp->do_exit = 1;
+    pthread_cond_broadcast(&sp->work_cond);
+    pthread_mutex_unlock(&sp->lock);
+    int i;
+    for (i=0; i<count; i++) {
+        int ret = pthread_join(sp->tids[i], NULL);
+        if (ret)
+            report_errno("pthread_join", ret);
+    }
+}
+
+// Create a pool with 'num_threads' threads (including the caller)
+struct stepgen_pool * __visible
+stepgen_pool_alloc(int num_threads)
+{
+    if (num_threads < 1)
+        num_threads = 1;
+    int workers = num_threads - 1;
+    struct stepgen_pool *sp = malloc(sizeof(*sp)
+                                     + workers * sizeof(sp->tids[0]));
+    if (!sp) {
+        errorf("stepgen_pool_alloc: out of memory");
+        return NULL;
+    }
+    memset(sp, 0, sizeof(*sp));
+    int ret = pthread_mutex_init(&sp->lock, NULL);
+    if (ret)
+        goto fail;
+    ret = pthread_cond_init(&sp->work_cond, NULL);
+    if (ret)
+        goto fail;
+    ret = pthread_cond_init(&sp->done_cond, NULL);
+    if (ret)
+        goto fail;
+    for (; sp->num_threads < workers; sp->num_threads++) {
+        ret = pthread_create(&sp->tids[sp->num_threads], NULL
+                             , worker_thread, sp);
+        if (ret) {
+            stop_threads(sp, sp->num_threads);
+            goto fail;
+        }
+    }
+    return sp;
+
+fail:
+    report_errno("stepgen_pool_alloc", ret);
+    free(sp);
+    return NULL;
+}
+
+// Stop the worker threads and free the pool
+void __visible
+stepgen_pool_free(struct stepgen_pool *sp)
+{
+    if (!sp)
+        return;
+    stop_threads(sp, sp->num_threads);
+    pthread_cond_destroy(&sp->work_cond);
+    pthread_cond_destroy(&sp->done_cond);
+    pthread_mutex_destroy(&sp->lock);
+    free(sp);
+}
+
+// Generate steps up to flush_time for all steppers in sk_list
+int32_t __visible
+stepgen_pool_generate_steps(struct stepgen_pool *sp
+                            , struct stepper_kinematics **sk_list, int sk_num
+                            , double flush_time)
+{
+    // Update the shared trapq sentinels before any concurrent access
+    int i;
+    for (i=0; i<sk_num; i++)
+        if (sk_list[i]->tq)
+            trapq_check_sentinels(sk_list[i]->tq);
+    if (!sp->num_threads || sk_num <= 1) {
+        for (i=0; i<sk_num; i++) {
+            int32_t ret = itersolve_generate_steps(sk_list[i], flush_time);
+            if (ret)
+                return ret;
+        }
+        return 0;
+    }
+    pthread_mutex_lock(&sp->lock);
+    sp->sk_list = sk_list;
+    sp->sk_num = sp->pending = sk_num;
+    sp->next_sk = 0;
+    sp->flush_time = flush_time;
+    sp->ret = 0;
+    sp->batch_id++;
+    pthread_cond_broadcast(&sp->work_cond);
+    run_batch(sp);
+    while (sp->pending)
+        pthread_cond_wait(&sp->done_cond, &sp->lock);
+    int32_t ret = sp->ret;
+    sp->sk_list = NULL;
+    sp->sk_num = 0;
+    pthread_mutex_unlock(&sp->lock);
+    return ret;
+}
+
+
+/****************************************************************
+ * Motion pipeline
+ ****************************************************************/
+
+// The motion pipeline performs all the per-batch work of the toolhead
+// (step generation, trapq finalization, and steppersync flushing) in
+// a single call.
+
+struct motion_pipeline {
+    struct stepgen_pool *pool;
+    struct trapq **tq_list;
+    int tq_num;
+    struct steppersync **ss_list;
+    int ss_num;
+};
+
+// Allocate a new 'motion_pipeline' object that generates steps using
+// the given pool (the pool is owned by the caller)
+struct motion_pipeline * __visible
+pipeline_alloc(struct stepgen_pool *pool)
+{
+    if (!pool)
+        return NULL;
+    struct motion_pipeline *mp = malloc(sizeof(*mp));
+    if (!mp) {
+        errorf("pipeline_alloc: out of memory");
+        return NULL;
+    }
+    memset(mp, 0, sizeof(*mp));
+    mp->pool = pool;
+    return mp;
+}
+
+// Free memory associated with a 'motion_pipeline' object
+void __visible
+pipeline_free(struct motion_pipeline *mp)
+{
+    if (!mp)
+        return;
+    free(mp->tq_list);
+    free(mp->ss_list);
+    free(mp);
+}
+
+// Set the list of trapq objects finalized on each advance
+int32_t __visible
+pipeline_set_trapqs(struct motion_pipeline *mp, struct trapq **tq_list
+                    , int tq_num)
+{
+    struct trapq **new_list = malloc(sizeof(*tq_list)*tq_num);
+    if (!new_list && tq_num) {
+        errorf("pipeline_set_trapqs: out of memory");
+        return -1;
+    }
+    memcpy(new_list, tq_list, sizeof(*tq_list)*tq_num);
+    free(mp->tq_list);
+    mp->tq_list = new_list;
+    mp->tq_num = tq_num;
+    return 0;
+}
+
+// Set the list of steppersync objects flushed on each advance
+int32_t __visible
+pipeline_set_steppersyncs(struct motion_pipeline *mp
+                          , struct steppersync **ss_list, int ss_num)
+{
+    struct steppersync **new_list = malloc(sizeof(*ss_list)*ss_num);
+    if (!new_list && ss_num) {
+        errorf("pipeline_set_steppersyncs: out of memory");
+        return -1;
+    }
+    memcpy(new_list, ss_list, sizeof(*ss_list)*ss_num);
+    free(mp->ss_list);
+    mp->ss_list = new_list;
+    mp->ss_num = ss_num;
+    return 0;
+}
+
+// Generate steps up to flush_time, free moves prior to free_time, and
+// transmit steps prior to move_flush_time.  Returns 0 on success, -1
+// on a step generation error, or the index+1 of a failing steppersync.
+int32_t __visible
+pipeline_advance(struct motion_pipeline *mp
+                 , struct stepper_kinematics **sk_list, int sk_num
+                 , double flush_time, double free_time, double move_flush_time)
+{
+    int32_t ret = stepgen_pool_generate_steps(mp->pool, sk_list, sk_num
+                                              , flush_time);
+    if (ret)
+        return -1;
+    int i;
+    for (i=0; i<mp->tq_num; i++)
+        trapq_finalize_moves(mp->tq_list[i], free_time);
+    for (i=0; i<mp->ss_num; i++) {
+        ret = steppersync_flush_time(mp->ss_list[i], move_flush_time);
+        if (ret)
+            return i + 1;
+    }
+    return 0;
+}
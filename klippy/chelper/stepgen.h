@@ -0,0 +1,24 @@
+#ifndef STEPGEN_H
+#define STEPGEN_H
+
+#include <stdint.h> // int32_t
+
+struct stepper_kinematics;
+struct steppersync;
+struct trapq;
+struct stepgen_pool *stepgen_pool_alloc(int num_threads);
+void stepgen_pool_free(struct stepgen_pool *sp);
+int32_t stepgen_pool_generate_steps(struct stepgen_pool *sp
+    , struct stepper_kinematics **sk_list, int sk_num, double flush_time);
+
+struct motion_pipeline *pipeline_alloc(struct stepgen_pool *pool);
+void pipeline_free(struct motion_pipeline *mp);
+int32_t pipeline_set_trapqs(struct motion_pipeline *mp
+                            , struct trapq **tq_list, int tq_num);
+int32_t pipeline_set_steppersyncs(struct motion_pipeline *mp
+                                  , struct steppersync **ss_list, int ss_num);
+int32_t pipeline_advance(struct motion_pipeline *mp
+    , struct stepper_kinematics **sk_list, int sk_num
+    , double flush_time, double free_time, double move_flush_time);
+
+#endif // stepgen.h
@@ -9,6 +9,7 @@
 #include <stdlib.h> // malloc
 #include <string.h> // memset
 #include "compiler.h" // unlikely
+#include "pyhelper.h" // errorf
 #include "trapq.h" // move_get_coord
 
 // Allocate a new 'move' object
@@ -69,6 +70,7 @@ trapq_free(struct trapq *tq)
         list_del(&m->node);
         free(m);
     }
+    free(tq->hist_index);
     free(tq);
 }
 
@@ -92,6 +94,38 @@ trapq_check_sentinels(struct trapq *tq)
 }
 
 #define MAX_NULL_MOVE 1.0
+#define MERGE_EPSILON 0.000000001
+#define MERGE_MAX_DEVIATION 0.000001
+
+// Check if a move continues the previous move in the same direction
+// with the same acceleration (and can thus be represented by extending
+// the previous move)
+static int
+can_merge(struct move *prev, struct move *m)
+{
+    if (!prev->start_v && !prev->half_accel)
+        // Null move (or head sentinel)
+        return 0;
+    if (fabs(prev->print_time + prev->move_t - m->print_time) > MERGE_EPSILON
+        || prev->half_accel != m->half_accel)
+        return 0;
+    double end_v = prev->start_v + 2. * prev->half_accel * prev->move_t;
+    if (fabs(end_v - m->start_v) > MERGE_EPSILON)
+        return 0;
+    // The start and end of the move must be on the extended path (the
+    // direction of g-code moves is only collinear to within rounding)
+    double merged_t = m->print_time + m->move_t - prev->print_time;
+    struct coord start_pos = move_get_coord(prev, prev->move_t);
+    struct coord end_pos = move_get_coord(prev, merged_t);
+    struct coord move_end_pos = move_get_coord(m, m->move_t);
+    int i;
+    for (i = 0; i < 3; i++)
+        if (fabs(start_pos.axis[i] - m->start_pos.axis[i]) > MERGE_MAX_DEVIATION
+            || fabs(end_pos.axis[i] - move_end_pos.axis[i])
+               > MERGE_MAX_DEVIATION)
+            return 0;
+    return 1;
+}
 
 // Add a move to the trapezoid velocity queue
 void
@@ -99,6 +133,14 @@ trapq_add_move(struct trapq *tq, struct move *m)
 {
     struct move *tail_sentinel = list_last_entry(&tq->moves, struct move, node);
     struct move *prev = list_prev_entry(tail_sentinel, node);
+    if (tq->merge_moves && can_merge(prev, m)) {
+        // Extend the previous move instead of adding a new one
+        prev->move_t = m->print_time + m->move_t - prev->print_time;
+        tail_sentinel->print_time = 0.;
+        tq->merged_moves++;
+        free(m);
+        return;
+    }
     if (prev->print_time + prev->move_t < m->print_time) {
         // Add a null move to fill time gap
         struct move *null_move = move_alloc();
@@ -164,6 +206,87 @@ trapq_append(struct trapq *tq, double print_time
 }
 
 #define HISTORY_EXPIRE (30.0)
+#define HISTORY_MIN_INDEX 64
+#define HISTORY_MAX_INDEX (1<<16)
+
+// Return the history move at the given position (0 is the oldest move)
+static inline struct move *
+history_get(struct trapq *tq, int pos)
+{
+    return tq->hist_index[(tq->hist_start + pos) & (tq->hist_size - 1)];
+}
+
+// Remove the oldest move from the history
+static void
+history_expire_oldest(struct trapq *tq)
+{
+    struct move *m = history_get(tq, 0);
+    tq->hist_start = (tq->hist_start + 1) & (tq->hist_size - 1);
+    tq->hist_count--;
+    list_del(&m->node);
+    free(m);
+}
+
+// Remove the newest move from the history
+static void
+history_remove_newest(struct trapq *tq)
+{
+    struct move *m = history_get(tq, tq->hist_count - 1);
+    tq->hist_count--;
+    list_del(&m->node);
+    free(m);
+}
+
+// Add a move to the head of the history
+static void
+history_add(struct trapq *tq, struct move *m)
+{
+    if (tq->hist_count >= tq->hist_size) {
+        struct move **hi = NULL;
+        int size = tq->hist_size ? tq->hist_size * 2 : HISTORY_MIN_INDEX;
+        if (tq->hist_size < HISTORY_MAX_INDEX) {
+            hi = malloc(size * sizeof(*hi));
+            if (!hi)
+                errorf("trapq history: out of memory");
+        }
+        if (!hi) {
+            // Limit the memory used by the history
+            if (!tq->hist_count) {
+                free(m);
+                return;
+            }
+            history_expire_oldest(tq);
+        } else {
+            // Grow the index (and move the wrapped entries to the end)
+            int i;
+            for (i = 0; i < tq->hist_count; i++)
+                hi[i] = history_get(tq, i);
+            free(tq->hist_index);
+            tq->hist_index = hi;
+            tq->hist_size = size;
+            tq->hist_start = 0;
+        }
+    }
+    int pos = (tq->hist_start + tq->hist_count) & (tq->hist_size - 1);
+    tq->hist_index[pos] = m;
+    tq->hist_count++;
+    list_add_head(&m->node, &tq->history);
+}
+
+// Find the position of the newest history move starting before a time
+static int
+history_find(struct trapq *tq, double print_time)
+{
+    int low = 0, high = tq->hist_count;
+    while (low < high) {
+        int mid = (low + high) / 2;
+        if (history_get(tq, mid)->print_time < print_time)
+            low = mid + 1;
+        else
+            high = mid;
+    }
+    return low - 1;
+}
 
 // Expire any moves older than `print_time` from the trapezoid velocity queue
 void __visible
@@ -182,24 +305,37 @@ trapq_finalize_moves(struct trapq *tq, double print_time)
             break;
         list_del(&m->node);
         if (m->start_v || m->half_accel)
-            list_add_head(&m->node, &tq->history);
+            history_add(tq, m);
         else
             free(m);
     }
     // Free old moves from history list
-    if (list_empty(&tq->history))
+    if (!tq->hist_count)
         return;
-    struct move *latest = list_first_entry(&tq->history, struct move, node);
+    struct move *latest = history_get(tq, tq->hist_count - 1);
     double expire_time = latest->print_time + latest->move_t - HISTORY_EXPIRE;
-    for (;;) {
-        struct move *m = list_last_entry(&tq->history, struct move, node);
-        if (m == latest || m->print_time + m->move_t > expire_time)
+    while (tq->hist_count > 1) {
+        struct move *m = history_get(tq, 0);
+        if (m->print_time + m->move_t > expire_time)
             break;
-        list_del(&m->node);
-        free(m);
+        history_expire_oldest(tq);
     }
 }
 
+// Enable (or disable) merging of consecutive moves in the same direction
+void __visible
+trapq_set_merge_moves(struct trapq *tq, int enable)
+{
+    tq->merge_moves = enable;
+}
+
+// Return the number of moves merged into a previous move
+int64_t __visible
+trapq_get_merged_moves(struct trapq *tq)
+{
+    return tq->merged_moves;
+}
+
 // Note a position change in the trapq history
 void __visible
 trapq_set_position(struct trapq *tq, double print_time
@@ -209,15 +345,14 @@ trapq_set_position(struct trapq *tq, double print_time
     trapq_finalize_moves(tq, NEVER_TIME);
 
     // Prune any moves in the trapq history that were interrupted
-    while (!list_empty(&tq->history)) {
-        struct move *m = list_first_entry(&tq->history, struct move, node);
+    while (tq->hist_count) {
+        struct move *m = history_get(tq, tq->hist_count - 1);
         if (m->print_time < print_time) {
             if (m->print_time + m->move_t > print_time)
                 m->move_t = print_time - m->print_time;
             break;
         }
-        list_del(&m->node);
-        free(m);
+        history_remove_newest(tq);
     }
 
     // Add a marker to the trapq history
@@ -226,7 +361,7 @@ trapq_set_position(struct trapq *tq, double print_time
     m->start_pos.x = pos_x;
     m->start_pos.y = pos_y;
     m->start_pos.z = pos_z;
-    list_add_head(&m->node, &tq->history);
+    history_add(tq, m);
 }
 
 // Return history of movement queue
@@ -234,13 +369,11 @@ int __visible
 trapq_extract_old(struct trapq *tq, struct pull_move *p, int max
                   , double start_time, double end_time)
 {
-    int res = 0;
-    struct move *m;
-    list_for_each_entry(m, &tq->history, node) {
+    int res = 0, pos;
+    for (pos = history_find(tq, end_time); pos >= 0; pos--) {
+        struct move *m = history_get(tq, pos);
         if (start_time >= m->print_time + m->move_t || res >= max)
             break;
-        if (end_time <= m->print_time)
-            continue;
         p->print_time = m->print_time;
         p->move_t = m->move_t;
         p->start_v = m->start_v;
@@ -1,6 +1,7 @@
 #ifndef TRAPQ_H
 #define TRAPQ_H
 
+#include <stdint.h> // int64_t
 #include "list.h" // list_node
 
 struct coord {
@@ -22,6 +23,12 @@ struct move {
 
 struct trapq {
     struct list_head moves, history;
+    // Time ordered index of the history list (oldest move first)
+    struct move **hist_index;
+    int hist_size, hist_start, hist_count;
+    // Merging of consecutive moves with the same direction and accel
+    int merge_moves;
+    int64_t merged_moves;
 };
 
 struct pull_move {
@@ -44,6 +51,8 @@ void trapq_append(struct trapq *tq, double print_time
                   , double axes_r_x, double axes_r_y, double axes_r_z
                   , double start_v, double cruise_v, double accel);
 void trapq_finalize_moves(struct trapq *tq, double print_time);
+void trapq_set_merge_moves(struct trapq *tq, int enable);
+int64_t trapq_get_merged_moves(struct trapq *tq);
 void trapq_set_position(struct trapq *tq, double print_time
                         , double pos_x, double pos_y, double pos_z);
 int trapq_extract_old(struct trapq *tq, struct pull_move *p, int max
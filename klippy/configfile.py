@@ -3,7 +3,7 @@
 # Copyright (C) 2016-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import sys, os, glob, re, time, logging, configparser, io
+import sys, os, glob, re, time, logging, configparser, io, hashlib
 
 error = configparser.Error
 
@@ -138,9 +138,19 @@ AUTOSAVE_HEADER = """
 #*#
 """
 
+# Parsed main config files (to speed up restarts with an unchanged config)
+config_cache = {}
+
+def _hash_data(data):
+    # Python 2 reads the config files as (already encoded) byte strings
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return hashlib.sha256(data).hexdigest()
+
 class PrinterConfig:
     def __init__(self, printer):
         self.printer = printer
+        self.config_sources = None
         self.autosave = None
         self.deprecated = {}
         self.status_raw_config = {}
@@ -162,7 +172,10 @@ class PrinterConfig:
             msg = "Unable to open config file %s" % (filename,)
             logging.exception(msg)
             raise error(msg)
-        return data.replace('\r\n', '\n')
+        data = data.replace('\r\n', '\n')
+        if self.config_sources is not None:
+            self.config_sources[('file', filename)] = _hash_data(data)
+        return data
     def _find_autosave_data(self, data):
         regular_data = data
         autosave_data = ""
@@ -228,6 +241,8 @@ class PrinterConfig:
             # Empty set is OK if wildcard but not for direct file reference
             raise error("Include file '%s' does not exist" % (include_glob,))
         include_filenames.sort()
+        if self.config_sources is not None:
+            self.config_sources[('glob', include_glob)] = include_filenames
         for include_filename in include_filenames:
             include_data = self._read_config_file(include_filename)
             self._parse_config(include_data, include_filename, fileconfig,
@@ -259,14 +274,52 @@ class PrinterConfig:
                 buffer.append(line)
         self._parse_config_buffer(buffer, filename, fileconfig)
         visited.remove(path)
-    def _build_config_wrapper(self, data, filename):
+    def _new_fileconfig(self):
         if sys.version_info.major >= 3:
-            fileconfig = configparser.RawConfigParser(
+            return configparser.RawConfigParser(
                 strict=False, inline_comment_prefixes=(';', '#'))
-        else:
-            fileconfig = configparser.RawConfigParser()
+        return configparser.RawConfigParser()
+    def _build_config_wrapper(self, data, filename):
+        fileconfig = self._new_fileconfig()
         self._parse_config(data, filename, fileconfig, set())
         return ConfigWrapper(self.printer, fileconfig, {}, 'printer')
+    # Parsed config caching
+    def _get_parsed_data(self, config):
+        fileconfig = config.fileconfig
+        return [(section, fileconfig.items(section))
+                for section in fileconfig.sections()]
+    def _build_parsed_wrapper(self, parsed_data):
+        fileconfig = self._new_fileconfig()
+        for section, options in parsed_data:
+            fileconfig.add_section(section)
+            for option, value in options:
+                fileconfig.set(section, option, value)
+        return ConfigWrapper(self.printer, fileconfig, {}, 'printer')
+    def _check_config_sources(self, sources):
+        # Check that all config files (and include globs) are unchanged
+        for (source_type, name), info in sources.items():
+            if source_type == 'glob':
+                if sorted(glob.glob(name)) != info:
+                    return False
+                continue
+            try:
+                with open(name, 'r') as f:
+                    data = f.read().replace('\r\n', '\n')
+            except:
+                return False
+            if _hash_data(data) != info:
+                return False
+        return True
+    def _read_cached_config(self, filename):
+        cache = config_cache.get(filename)
+        if cache is None:
+            return None
+        sources, autosave_data, parsed_data = cache
+        if not self._check_config_sources(sources):
+            del config_cache[filename]
+            return None
+        self.autosave = self._build_parsed_wrapper(autosave_data)
+        return self._build_parsed_wrapper(parsed_data)
     def _build_config_string(self, config):
         sfile = io.StringIO()
         config.fileconfig.write(sfile)
@@ -275,13 +328,34 @@ class PrinterConfig:
         return self._build_config_wrapper(self._read_config_file(filename),
                                           filename)
     def read_main_config(self):
+        start_time = time.time()
         filename = self.printer.get_start_args()['config_file']
-        data = self._read_config_file(filename)
-        regular_data, autosave_data = self._find_autosave_data(data)
-        regular_config = self._build_config_wrapper(regular_data, filename)
-        autosave_data = self._strip_duplicates(autosave_data, regular_config)
-        self.autosave = self._build_config_wrapper(autosave_data, filename)
-        cfg = self._build_config_wrapper(regular_data + autosave_data, filename)
+        cfg = self._read_cached_config(filename)
+        if cfg is not None:
+            logging.info("Loaded config file %s from cache in %.3f seconds",
+                         filename, time.time() - start_time)
+            return cfg
+        self.config_sources = {}
+        try:
+            data = self._read_config_file(filename)
+            regular_data, autosave_data = self._find_autosave_data(data)
+            regular_config = self._build_config_wrapper(regular_data, filename)
+            autosave_data = self._strip_duplicates(autosave_data,
+                                                   regular_config)
+            self.autosave = self._build_config_wrapper(autosave_data, filename)
+            cfg = self._build_config_wrapper(regular_data + autosave_data,
+                                             filename)
+            sources = self.config_sources
+        finally:
+            self.config_sources = None
+        if (not cfg.fileconfig.defaults()
+            and not self.autosave.fileconfig.defaults()):
+            config_cache[filename] = (
+                sources, self._get_parsed_data(self.autosave),
+                self._get_parsed_data(cfg))
+        logging.info("Loaded config file %s (%d files) in %.3f seconds",
+                     filename, len([s for s in sources if s[0] == 'file']),
+                     time.time() - start_time)
         return cfg
     def check_unused_options(self, config):
         fileconfig = config.fileconfig
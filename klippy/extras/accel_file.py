@@ -0,0 +1,60 @@
+# Binary file format for raw accelerometer captures
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import array, struct, sys, zlib
+
+# The file starts with a header (magic, version, flags, number of
+# columns, number of rows) followed by the rows of samples (time,
+# accel_x, accel_y, accel_z) as little-endian doubles.  If FLAG_ZLIB is
+# set the sample data is zlib compressed.
+MAGIC = b'KLACCEL\0'
+VERSION = 1
+FLAG_ZLIB = 0x01
+HEADER = struct.Struct('<8sHHIQ')
+COLUMNS = 4
+
+# Supported capture formats (name: (file extension, flags))
+FORMATS = {'csv': ('.csv', None), 'binary': ('.bin', 0),
+           'binary_zlib': ('.bin', FLAG_ZLIB)}
+
+def is_binary_file(filename):
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+# Write samples (a list of buffers of flattened rows of doubles)
+def write_file(filename, views, flags=0):
+    rows = sum([len(v) for v in views]) // COLUMNS
+    compress = None
+    if flags & FLAG_ZLIB:
+        compress = zlib.compressobj(1)
+    with open(filename, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, flags, COLUMNS, rows))
+        for view in views:
+            if sys.byteorder != 'little':
+                view = array.array('d', view)
+                view.byteswap()
+            if compress is not None:
+                f.write(compress.compress(view))
+            else:
+                f.write(view)
+        if compress is not None:
+            f.write(compress.flush())
+
+# Load a capture as a numpy array (memory mapped if not compressed)
+def read_file(filename, np):
+    with open(filename, 'rb') as f:
+        magic, version, flags, columns, rows = HEADER.unpack(
+            f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Unsupported accelerometer file '%s'"
+                             % (filename,))
+        if flags & FLAG_ZLIB:
+            data = np.frombuffer(zlib.decompress(f.read()), dtype='<f8')
+            return data[:rows * columns].reshape(rows, columns)
+    if not rows:
+        return np.zeros((0, columns))
+    data = np.memmap(filename, dtype='<f8', mode='r', offset=HEADER.size,
+                     shape=(rows * columns,))
+    return data.reshape(rows, columns)
@@ -3,8 +3,8 @@
 # Copyright (C) 2020-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, time, collections, threading, multiprocessing, os
-from . import bus, motion_report
+import logging, time, collections, threading, multiprocessing, os, array
+from . import bus, motion_report, accel_file
 
 # ADXL345 registers
 REG_DEVID = 0x00
@@ -30,6 +30,29 @@ SCALE_Z  = 0.003906 * FREEFALL_ACCEL # 1 / 256 (at 3.3V) mg/LSB
 Accel_Measurement = collections.namedtuple(
     'Accel_Measurement', ('time', 'accel_x', 'accel_y', 'accel_z'))
 
+# Read-only sequence of Accel_Measurement over the flattened sample rows
+# (the tuples are only created as the samples are accessed)
+class AccelSamples:
+    def __init__(self, views):
+        self.views = views
+        self.count = sum([len(v) for v in views]) // 4
+    def __len__(self):
+        return self.count
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError("sample index out of range")
+        pos = index * 4
+        for view in self.views:
+            if pos < len(view):
+                return Accel_Measurement(*view[pos:pos+4])
+            pos -= len(view)
+    def __iter__(self):
+        for view in self.views:
+            for pos in range(0, len(view), 4):
+                yield Accel_Measurement(*view[pos:pos+4])
+
 # Helper class to obtain measurements
 class AccelQueryHelper:
     def __init__(self, printer, cconn):
@@ -37,65 +60,40 @@ class AccelQueryHelper:
         self.cconn = cconn
         print_time = printer.lookup_object('toolhead').get_last_move_time()
         self.request_start_time = self.request_end_time = print_time
-        self.samples = self.raw_samples = []
+        self.samples = []
     def finish_measurements(self):
         toolhead = self.printer.lookup_object('toolhead')
         self.request_end_time = toolhead.get_last_move_time()
         toolhead.wait_moves()
         self.cconn.finalize()
-    def _get_raw_samples(self):
-        raw_samples = self.cconn.get_messages()
-        if raw_samples:
-            self.raw_samples = raw_samples
-        return self.raw_samples
     def has_valid_samples(self):
-        raw_samples = self._get_raw_samples()
-        for msg in raw_samples:
-            data = msg['params']['data']
-            first_sample_time = data[0][0]
-            last_sample_time = data[-1][0]
-            if (first_sample_time > self.request_end_time
-                    or last_sample_time < self.request_start_time):
-                continue
-            # The time intervals [first_sample_time, last_sample_time]
-            # and [request_start_time, request_end_time] have non-zero
-            # intersection. It is still theoretically possible that none
-            # of the samples from raw_samples fall into the time interval
-            # [request_start_time, request_end_time] if it is too narrow
-            # or on very heavy data losses. In practice, that interval
-            # is at least 1 second, so this possibility is negligible.
-            return True
-        return False
+        return bool(self.get_sample_views())
+    def get_sample_views(self):
+        # Return memoryviews of the requested samples (as flattened
+        # time, accel_x, accel_y, accel_z rows) without copying them
+        return self.cconn.get_views(self.request_start_time,
+                                    self.request_end_time)
     def get_samples(self):
-        raw_samples = self._get_raw_samples()
-        if not raw_samples:
-            return self.samples
-        total = sum([len(m['params']['data']) for m in raw_samples])
-        count = 0
-        self.samples = samples = [None] * total
-        for msg in raw_samples:
-            for samp_time, x, y, z in msg['params']['data']:
-                if samp_time < self.request_start_time:
-                    continue
-                if samp_time > self.request_end_time:
-                    break
-                samples[count] = Accel_Measurement(samp_time, x, y, z)
-                count += 1
-        del samples[count:]
+        self.samples = AccelSamples(self.get_sample_views())
         return self.samples
-    def write_to_file(self, filename):
+    def write_to_file(self, filename, file_format='csv'):
+        flags = accel_file.FORMATS[file_format][1]
         def write_impl():
             try:
                 # Try to re-nice writing process
                 os.nice(20)
             except:
                 pass
+            if flags is not None:
+                accel_file.write_file(filename, self.get_sample_views(),
+                                      flags)
+                return
             f = open(filename, "w")
             f.write("#time,accel_x,accel_y,accel_z\n")
-            samples = self.samples or self.get_samples()
-            for t, accel_x, accel_y, accel_z in samples:
-                f.write("%.6f,%.6f,%.6f,%.6f\n" % (
-                    t, accel_x, accel_y, accel_z))
+            for view in self.get_sample_views():
+                view = view.tolist()
+                f.writelines(["%.6f,%.6f,%.6f,%.6f\n" % tuple(view[i:i+4])
+                              for i in range(0, len(view), 4)])
             f.close()
         write_proc = multiprocessing.Process(target=write_impl)
         write_proc.daemon = True
@@ -140,15 +138,20 @@ class AccelCommandHelper:
         name = gcmd.get("NAME", time.strftime("%Y%m%d_%H%M%S"))
         if not name.replace('-', '').replace('_', '').isalnum():
             raise gcmd.error("Invalid NAME parameter")
+        file_format = gcmd.get("FORMAT", "csv").lower()
+        if file_format not in accel_file.FORMATS:
+            raise gcmd.error("Invalid FORMAT parameter")
+        ext = accel_file.FORMATS[file_format][0]
         bg_client = self.bg_client
         self.bg_client = None
         bg_client.finish_measurements()
         # Write data to file
         if self.base_name == self.name:
-            filename = "/tmp/%s-%s.csv" % (self.base_name, name)
+            filename = "/tmp/%s-%s%s" % (self.base_name, name, ext)
         else:
-            filename = "/tmp/%s-%s-%s.csv" % (self.base_name, self.name, name)
-        bg_client.write_to_file(filename)
+            filename = "/tmp/%s-%s-%s%s" % (self.base_name, self.name, name,
+                                           ext)
+        bg_client.write_to_file(filename, file_format)
         gcmd.respond_info("Writing raw accelerometer data to %s file"
                           % (filename,))
     cmd_ACCELEROMETER_QUERY_help = "Query accelerometer for the current values"
@@ -262,7 +265,8 @@ class ADXL345:
         self.clock_sync = ClockSyncRegression(self.mcu, 640)
         # API server endpoints
         self.api_dump = motion_report.APIDumpHelper(
-            self.printer, self._api_update, self._api_startstop, 0.100)
+            self.printer, self._api_update, self._api_startstop, 0.100,
+            data_width=4)
         self.name = config.get_name().split()[-1]
         wh = self.printer.lookup_object('webhooks')
         wh.register_mux_endpoint("adxl345/dump_adxl345", "sensor", self.name,
@@ -305,7 +309,8 @@ class ADXL345:
         time_base, chip_base, inv_freq = self.clock_sync.get_time_translation()
         # Process every message in raw_samples
         count = seq = 0
-        samples = [None] * (len(raw_samples) * SAMPLES_PER_BLOCK)
+        samples = array.array('d', [0.]) * (
+            len(raw_samples) * SAMPLES_PER_BLOCK * 4)
         for params in raw_samples:
             seq_diff = (last_sequence - params['sequence']) & 0xffff
             seq_diff -= (seq_diff & 0x8000) << 1
@@ -327,8 +332,11 @@ class ADXL345:
                 y = round(raw_xyz[y_pos] * y_scale, 6)
                 z = round(raw_xyz[z_pos] * z_scale, 6)
                 ptime = round(time_base + (msg_cdiff + i) * inv_freq, 6)
-                samples[count] = (ptime, x, y, z)
-                count += 1
+                samples[count] = ptime
+                samples[count+1] = x
+                samples[count+2] = y
+                samples[count+3] = z
+                count += 4
         self.clock_sync.set_last_chip_clock(seq * SAMPLES_PER_BLOCK + i)
         del samples[count:]
         return samples
@@ -191,17 +191,15 @@ class AngleCalibration:
         toolhead.wait_moves()
         # Finish data collection
         cconn.finalize()
-        msgs = cconn.get_messages()
         # Correlate query responses
         cal = {}
         step = 0
-        for msg in msgs:
-            for query_time, pos in msg['params']['data']:
-                # Add to step tracking
-                while step < len(times) and query_time > times[step][1]:
-                    step += 1
-                if step < len(times) and query_time >= times[step][0]:
-                    cal.setdefault(step, []).append(pos)
+        for query_time, pos in cconn.iter_samples():
+            # Add to step tracking
+            while step < len(times) and query_time > times[step][1]:
+                step += 1
+            if step < len(times) and query_time >= times[step][0]:
+                cal.setdefault(step, []).append(pos)
         if len(cal) != len(times):
             raise self.printer.command_error(
                 "Failed calibration - incomplete sensor data")
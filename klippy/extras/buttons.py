@@ -3,7 +3,7 @@
 # Copyright (C) 2018  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging
+import logging, bisect
 
 
 ######################################################################
@@ -70,10 +70,12 @@ class MCU_buttons:
         # Send ack to MCU
         self.ack_cmd.send([self.oid, new_count])
         self.ack_count += new_count
-        # Call self.handle_button() with this event in main thread
-        for nb in new_buttons:
-            self.reactor.register_async_callback(
-                (lambda e, s=self, b=nb: s.handle_button(e, b)))
+        # Call self.handle_buttons() with these events in main thread
+        self.reactor.register_async_callback(
+            (lambda e, s=self, b=new_buttons: s.handle_buttons(e, b)))
+    def handle_buttons(self, eventtime, buttons):
+        for button in buttons:
+            self.handle_button(eventtime, button)
     def handle_button(self, eventtime, button):
         button ^= self.invert
         changed = button ^ self.last_button
@@ -96,6 +98,8 @@ class MCU_ADC_buttons:
     def __init__(self, printer, pin, pullup):
         self.reactor = printer.get_reactor()
         self.buttons = []
+        self.lookup_points = []
+        self.lookup_buttons = []
         self.last_button = None
         self.last_pressed = None
         self.last_debouncetime = 0
@@ -114,6 +118,24 @@ class MCU_ADC_buttons:
         self.min_value = min(self.min_value, min_value)
         self.max_value = max(self.max_value, max_value)
         self.buttons.append((min_value, max_value, callback))
+        self._build_lookup()
+
+    def _find_button(self, value):
+        for i, (min_value, max_value, cb) in enumerate(self.buttons):
+            if min_value < value < max_value:
+                return i
+        return None
+    def _build_lookup(self):
+        # Store the button found at each range boundary (at even
+        # positions) and between boundaries (at odd positions)
+        points = sorted(set([v for b in self.buttons for v in b[:2]]))
+        lookup = []
+        for i, point in enumerate(points):
+            if i:
+                lookup.append(self._find_button((points[i-1] + point) * .5))
+            lookup.append(self._find_button(point))
+        self.lookup_points = points
+        self.lookup_buttons = lookup
 
     def adc_callback(self, read_time, read_value):
         adc = max(.00001, min(.99999, read_value))
@@ -122,10 +144,11 @@ class MCU_ADC_buttons:
         # Determine button pressed
         btn = None
         if self.min_value <= value <= self.max_value:
-            for i, (min_value, max_value, cb) in enumerate(self.buttons):
-                if min_value < value < max_value:
-                    btn = i
-                    break
+            pos = bisect.bisect_left(self.lookup_points, value)
+            if self.lookup_points[pos] == value:
+                btn = self.lookup_buttons[2 * pos]
+            else:
+                btn = self.lookup_buttons[2 * pos - 1]
 
         # If the button changed, due to noise or pressing:
         if btn != self.last_button:
@@ -135,20 +158,25 @@ class MCU_ADC_buttons:
         # button debounce check & new button pressed
         if ((read_time - self.last_debouncetime) >= ADC_DEBOUNCE_TIME
             and self.last_button == btn and self.last_pressed != btn):
+            events = []
             # release last_pressed
             if self.last_pressed is not None:
-                self.call_button(self.last_pressed, False)
+                events.append((self.last_pressed, False))
                 self.last_pressed = None
             if btn is not None:
-                self.call_button(btn, True)
+                events.append((btn, True))
                 self.last_pressed = btn
+            self.call_buttons(events)
 
         self.last_button = btn
 
-    def call_button(self, button, state):
-        minval, maxval, callback = self.buttons[button]
-        self.reactor.register_async_callback(
-            (lambda e, cb=callback, s=state: cb(e, s)))
+    def call_buttons(self, events):
+        callbacks = [(self.buttons[button][2], state)
+                     for button, state in events]
+        def handle_events(eventtime):
+            for callback, state in callbacks:
+                callback(eventtime, state)
+        self.reactor.register_async_callback(handle_events)
 
 
 ######################################################################
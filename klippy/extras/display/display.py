@@ -5,7 +5,7 @@
 # Copyright (C) 2018  Eric Callahan <arksine.code@gmail.com>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, os, ast
+import logging, os, ast, copy
 from . import hd44780, hd44780_spi, st7920, uc1701, menu
 
 # Normal time between each screen redraw
@@ -51,6 +51,105 @@ class DisplayTemplate:
         context.update(params)
         return self.template.render(context)
 
+MISSING = object()
+
+# Status of a printer object that records which fields are read
+class TrackedStatus(dict):
+    def __init__(self, tracker, name, status):
+        dict.__init__(self, status)
+        self._tracker = tracker
+        self._name = name
+    def __getitem__(self, key):
+        val = dict.get(self, key, MISSING)
+        self._tracker.note_read(self._name, key, val)
+        if val is MISSING:
+            raise KeyError(key)
+        return val
+    def get(self, key, default=None):
+        val = dict.get(self, key, MISSING)
+        self._tracker.note_read(self._name, key, val)
+        if val is MISSING:
+            return default
+        return val
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+    # Reading all fields disables caching
+    def __iter__(self):
+        self._tracker.disable()
+        return dict.__iter__(self)
+    def __len__(self):
+        self._tracker.disable()
+        return dict.__len__(self)
+    def keys(self):
+        self._tracker.disable()
+        return dict.keys(self)
+    def values(self):
+        self._tracker.disable()
+        return dict.values(self)
+    def items(self):
+        self._tracker.disable()
+        return dict.items(self)
+
+# Wrapper around the template "printer" variable that records the
+# status fields a template reads (so its output can be reused as long
+# as those fields are unchanged)
+class StatusTracker:
+    def __init__(self, status):
+        self._status = status
+        self._tracked = {}
+        self._reads = None
+    def start(self):
+        self._reads = {}
+    def finish(self):
+        reads = self._reads
+        self._reads = None
+        return reads
+    def disable(self):
+        self._reads = None
+    def note_read(self, name, key, val):
+        if self._reads is not None:
+            if type(val) in (list, dict):
+                # Keep the value as read, even if it is later modified
+                val = copy.deepcopy(val)
+            self._reads[(name, key)] = val
+    def _lookup(self, name, key):
+        try:
+            status = self._status[name]
+        except KeyError:
+            return MISSING
+        if key is None:
+            return True
+        return status.get(key, MISSING)
+    def is_unchanged(self, reads):
+        for (name, key), val in reads.items():
+            try:
+                if self._lookup(name, key) != val:
+                    return False
+            except Exception:
+                return False
+        return True
+    def __getitem__(self, name):
+        tracked = self._tracked.get(name)
+        if tracked is None:
+            try:
+                status = self._status[name]
+            except KeyError:
+                self.note_read(name, None, MISSING)
+                raise
+            # Only copy the status of each object once per screen update
+            self._tracked[name] = tracked = TrackedStatus(self, name, status)
+        self.note_read(name, None, True)
+        return tracked
+    def __contains__(self, name):
+        try:
+            self.__getitem__(name)
+        except KeyError:
+            return False
+        return True
+    def __iter__(self):
+        self.disable()
+        return iter(self._status)
+
 # Store [display_data my_group my_item] sections (one instance per group name)
 class DisplayGroup:
     def __init__(self, config, name, data_configs):
@@ -74,15 +173,33 @@ class DisplayGroup:
             if c.get('text'):
                 template = gcode_macro.load_template(c, 'text')
                 self.data_items.append((row, col, template))
+        # Rendered text (and the status fields it depends on) of each item
+        self.render_cache = {}
     def show(self, display, templates, eventtime):
         context = self.data_items[0][2].create_template_context(eventtime)
-        context['draw_progress_bar'] = display.draw_progress_bar
+        tracker = StatusTracker(context['printer'])
+        context['printer'] = tracker
+        def draw_progress_bar(*args):
+            # Drawing has side effects - don't cache the rendered text
+            tracker.disable()
+            return display.draw_progress_bar(*args)
+        context['draw_progress_bar'] = draw_progress_bar
         def render(name, **kwargs):
             return templates[name].render(context, **kwargs)
         context['render'] = render
-        for row, col, template in self.data_items:
-            text = template.render(context)
-            display.draw_text(row, col, text.replace('\n', ''), eventtime)
+        render_cache = self.render_cache
+        for i, (row, col, template) in enumerate(self.data_items):
+            cache = render_cache.get(i)
+            if cache is not None and tracker.is_unchanged(cache[0]):
+                text = cache[1]
+            else:
+                render_cache.pop(i, None)
+                tracker.start()
+                text = template.render(context).replace('\n', '')
+                reads = tracker.finish()
+                if reads is not None:
+                    render_cache[i] = (reads, text)
+            display.draw_text(row, col, text, eventtime)
         context.clear() # Remove circular references for better gc
 
 # Global cache of DisplayTemplate, DisplayGroup, and glyphs
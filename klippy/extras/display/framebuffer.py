@@ -0,0 +1,46 @@
+# Helper code for finding the changed parts of a display framebuffer
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import binascii, re
+
+CHANGED_RE = re.compile(b'[^\x00]+')
+
+# Return the [position, count] regions that differ between two
+# framebuffers.  Changes that are close to each other (at most max_gap
+# bytes apart) are batched together while the following batch is
+# shorter than 16 bytes.
+def find_changes(new_data, old_data, max_gap):
+    if new_data == old_data:
+        return []
+    # Compare all bytes at once and then scan the result for non-zero runs
+    size = len(new_data)
+    xor_val = (int(binascii.hexlify(new_data), 16)
+               ^ int(binascii.hexlify(old_data), 16))
+    xor_data = binascii.unhexlify('%0*x' % (2 * size, xor_val))
+    # Batch together changes (starting from the end of the framebuffer)
+    diffs = []
+    pos = count = 0
+    for m in reversed(list(CHANGED_RE.finditer(xor_data))):
+        start, i = m.start(), m.end() - 1
+        if count and i + max_gap >= pos and count < 16:
+            count += pos - i
+            pos = i
+        else:
+            if count:
+                diffs.append([pos, count])
+            pos, count = i, 1
+        # Add the remaining bytes of this run one batch at a time
+        while pos > start:
+            if count >= 16:
+                diffs.append([pos, count])
+                pos, count = pos - 1, 1
+                continue
+            add = min(16 - count, pos - start)
+            pos -= add
+            count += add
+    if count:
+        diffs.append([pos, count])
+    diffs.reverse()
+    return diffs
@@ -8,7 +8,7 @@
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import math
 
-# Coordinates created by this are converted into G1 commands.
+# Coordinates created by this are queued as a batch of linear moves.
 #
 # supports XY, XZ & YZ planes with remaining axis as helical
 
@@ -29,6 +29,7 @@ class ArcSupport:
     def __init__(self, config):
         self.printer = config.get_printer()
         self.mm_per_arc_segment = config.getfloat('resolution', 1., above=0.0)
+        self.max_deviation = config.getfloat('max_deviation', None, above=0.)
 
         self.gcode_move = self.printer.load_object(config, 'gcode_move')
         self.gcode = self.printer.lookup_object('gcode')
@@ -88,7 +89,7 @@ class ArcSupport:
             raise gcmd.error("G2/G3 requires IJ, IK or JK parameters")
 
         asE = gcmd.get_float("E", None)
-        asF = gcmd.get_float("F", None)
+        asF = gcmd.get_float("F", None, above=0.)
 
         # Build list of linear coordinates to move
         coords = self.planArc(currentPos, asTarget, asPlanar,
@@ -99,17 +100,8 @@ class ArcSupport:
                 e_base = currentPos[3]
             e_per_move = (asE - e_base) / len(coords)
 
-        # Convert coords into G1 commands
-        for coord in coords:
-            g1_params = {'X': coord[0], 'Y': coord[1], 'Z': coord[2]}
-            if e_per_move:
-                g1_params['E'] = e_base + e_per_move
-                if gcodestatus['absolute_extrude']:
-                    e_base += e_per_move
-            if asF is not None:
-                g1_params['F'] = asF
-            g1_gcmd = self.gcode.create_gcode_command("G1", "G1", g1_params)
-            self.gcode_move.cmd_G1(g1_gcmd)
+        # Queue the moves of the whole arc
+        self.gcode_move.move_batch(coords, e_per_move, asF)
 
     # function planArc() originates from marlin plan_arc()
     # https://github.com/MarlinFirmware/Marlin
@@ -149,12 +141,23 @@ class ArcSupport:
         # Determine number of segments
         linear_travel = targetPos[helical_axis] - currentPos[helical_axis]
         radius = math.hypot(r_P, r_Q)
-        flat_mm = radius * angular_travel
-        if linear_travel:
-            mm_of_travel = math.hypot(flat_mm, linear_travel)
+        if self.max_deviation is not None:
+            # Use the longest segments that stay within max_deviation of
+            # the arc (at most a quarter turn each)
+            segment_angle = .5 * math.pi
+            if self.max_deviation < radius:
+                segment_angle = min(segment_angle, 2. * math.acos(
+                    1. - self.max_deviation / radius))
+            segments = max(1., math.ceil(math.fabs(angular_travel)
+                                         / segment_angle))
         else:
-            mm_of_travel = math.fabs(flat_mm)
-        segments = max(1., math.floor(mm_of_travel / self.mm_per_arc_segment))
+            flat_mm = radius * angular_travel
+            if linear_travel:
+                mm_of_travel = math.hypot(flat_mm, linear_travel)
+            else:
+                mm_of_travel = math.fabs(flat_mm)
+            segments = max(1., math.floor(mm_of_travel
+                                          / self.mm_per_arc_segment))
 
         # Generate coordinates
         theta_per_segment = angular_travel / segments
@@ -141,6 +141,21 @@ class GCodeMove:
             raise gcmd.error("Unable to parse move '%s'"
                              % (gcmd.get_commandline(),))
         self.move_with_transform(self.last_position, self.speed)
+    def move_batch(self, coords, e_per_move=0., speed=None):
+        # Move through a list of absolute XYZ g-code positions, extruding
+        # e_per_move (in g-code units) on each move.  This is equivalent
+        # to a series of G1 commands, but avoids creating a g-code
+        # command for each move of long generated paths (eg, arcs).
+        if speed is not None:
+            self.speed = speed * self.speed_factor
+        e_move = e_per_move * self.extrude_factor
+        last_position = self.last_position
+        base_position = self.base_position
+        for coord in coords:
+            for pos in range(3):
+                last_position[pos] = coord[pos] + base_position[pos]
+            last_position[3] += e_move
+            self.move_with_transform(last_position, self.speed)
     # G-Code coordinate manipulation
     def cmd_G20(self, gcmd):
         # Set units to inches
@@ -0,0 +1,99 @@
+# Two stage thermal model for master/slave heater chains
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import math
+
+# The slave heater temperature follows its target with a first order
+# lag, and the master (eg, chamber) temperature is heated by the slave
+# while losing heat to the ambient:
+#   dTs/dt = (slave_target - Ts) / slave_tau
+#   dTm/dt = (Ts - Tm) / master_tau - (Tm - ambient) / loss_tau
+class ThermalModel:
+    def __init__(self, slave_tau, master_tau, loss_tau, ambient):
+        self.slave_tau = slave_tau
+        self.master_tau = master_tau
+        self.loss_tau = loss_tau
+        self.ambient = ambient
+    def step(self, master_temp, slave_temp, slave_target, dt):
+        master_rate = ((slave_temp - master_temp) / self.master_tau
+                       - (master_temp - self.ambient) / self.loss_tau)
+        master_temp += master_rate * dt
+        slave_temp += min(dt / self.slave_tau, 1.) * (slave_target
+                                                      - slave_temp)
+        return master_temp, slave_temp
+    def predict_response(self, master_temp, slave_temp, horizon, dt):
+        # The model is linear, so the predicted master temperatures for
+        # a constant slave target are free[i] + slave_target * gain[i]
+        # where free is the prediction with a zero slave target and
+        # gain is the response to a unit slave target from rest.
+        free, gain = [], []
+        gain_master = gain_slave = 0.
+        slave_rate = min(dt / self.slave_tau, 1.)
+        inv_master_tau, inv_loss_tau = 1. / self.master_tau, 1. / self.loss_tau
+        for i in range(int(math.ceil(horizon / dt))):
+            master_temp, slave_temp = self.step(master_temp, slave_temp,
+                                                0., dt)
+            gain_master += ((gain_slave - gain_master) * inv_master_tau
+                            - gain_master * inv_loss_tau) * dt
+            gain_slave += slave_rate * (1. - gain_slave)
+            free.append(master_temp)
+            gain.append(gain_master)
+        return free, gain
+    def get_params(self):
+        return {'slave_tau': self.slave_tau, 'master_tau': self.master_tau,
+                'loss_tau': self.loss_tau, 'ambient': self.ambient}
+
+# Solve a small linear system using Gaussian elimination
+def solve_linear(matrix, vector):
+    n = len(vector)
+    m = [list(row) + [v] for row, v in zip(matrix, vector)]
+    for col in range(n):
+        pivot = max(range(col, n), key=(lambda r: abs(m[r][col])))
+        if abs(m[pivot][col]) < 1e-12:
+            return None
+        m[col], m[pivot] = m[pivot], m[col]
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            for c in range(col, n + 1):
+                m[r][c] -= f * m[col][c]
+    res = [0.] * n
+    for r in reversed(range(n)):
+        res[r] = (m[r][n] - sum([m[r][c] * res[c]
+                                 for c in range(r + 1, n)])) / m[r][r]
+    return res
+
+# Identify the model from a list of (time, master_temp, slave_temp,
+# slave_target) samples.  Returns a ThermalModel or None.
+def identify(samples):
+    if len(samples) < 4:
+        return None
+    s_num = s_den = 0.
+    ata = [[0.] * 3 for i in range(3)]
+    atb = [0.] * 3
+    for (t0, m0, s0, tgt0), (t1, m1, s1, tgt1) in zip(samples, samples[1:]):
+        dt = t1 - t0
+        if dt <= 0.:
+            continue
+        # Slave: rate = (target - Ts) / slave_tau
+        err = tgt0 - s0
+        s_num += (s1 - s0) / dt * err
+        s_den += err * err
+        # Master: rate = p * (Ts - Tm) + q * Tm + r
+        row = (s0 - m0, m0, 1.)
+        rate = (m1 - m0) / dt
+        for i in range(3):
+            atb[i] += row[i] * rate
+            for j in range(3):
+                ata[i][j] += row[i] * row[j]
+    if s_num <= 0. or s_den <= 0.:
+        return None
+    res = solve_linear(ata, atb)
+    if res is None:
+        return None
+    p, q, r = res
+    if p <= 0. or q >= 0.:
+        return None
+    loss_tau = -1. / q
+    return ThermalModel(s_den / s_num, 1. / p, loss_tau, r * loss_tau)
@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import os, logging, threading
+from . import heater_model
 
 
 ######################################################################
@@ -167,14 +168,19 @@ class HeaterMaster(Heater):
         # pwm caching
         self.next_pwm_time = 0.
         self.last_pwm_value = 0.
-        # Setup control algorithm sub-class
-        algos = {'watermark': ControlBangBang, 'pid': ControlPID}
-        algo = config.getchoice('control', algos)
-        self.control = algo(self, config)
         # Setup slave heater
         pheaters = self.printer.lookup_object('heaters')
         self.slave_heater = pheaters.lookup_heater(config.get('slave_heater'))
+        if self.get_slave_max_target() <= 0.:
+            raise config.error(
+                "The max_temp of slave heater '%s' must be above 10"
+                % (self.slave_heater.name,))
         self.pwm_delay = 1  # update pwm every second
+        # Setup control algorithm sub-class
+        algos = {'watermark': ControlBangBang, 'pid': ControlPID,
+                 'predictive': ControlPredictive}
+        algo = config.getchoice('control', algos)
+        self.control = algo(self, config)
         # Load additional modules
         self.printer.load_object(config, "verify_heater %s" % (self.name,))
         self.printer.load_object(config, "pid_calibrate")
@@ -193,8 +199,18 @@ class HeaterMaster(Heater):
         pwm_time = read_time + self.pwm_delay
         self.next_pwm_time = pwm_time + 0.75 * MAX_HEAT_TIME
         self.last_pwm_value = value
-        slave_temp = (self.slave_heater.max_temp - 10) * value
+        slave_temp = self.get_slave_max_target() * value
         self.slave_heater.set_temp(slave_temp)
+    def set_slave_target(self, read_time, slave_temp):
+        if self.target_temp <= 0.:
+            slave_temp = 0.
+        self.last_pwm_value = slave_temp / self.get_slave_max_target()
+        self.slave_heater.set_temp(slave_temp)
+    def get_slave_temp(self):
+        with self.slave_heater.lock:
+            return self.slave_heater.smoothed_temp
+    def get_slave_max_target(self):
+        return self.slave_heater.max_temp - 10
 
     def get_temp(self, eventtime):
         with self.lock:
@@ -277,6 +293,61 @@ class ControlPID:
                 or abs(self.prev_temp_deriv) > PID_SETTLE_SLOPE)
 
 
+######################################################################
+# Model predictive control algo (for master/slave heater chains)
+######################################################################
+
+class ControlPredictive:
+    def __init__(self, heater, config):
+        self.heater = heater
+        self.model = heater_model.ThermalModel(
+            config.getfloat('model_slave_tau', above=0.),
+            config.getfloat('model_master_tau', above=0.),
+            config.getfloat('model_loss_tau', above=0.),
+            config.getfloat('model_ambient', AMBIENT_TEMP))
+        self.horizon = config.getfloat('predict_horizon', 120., above=0.)
+        self.max_overshoot = config.getfloat('max_overshoot', 1., minval=0.)
+        self.next_update_time = 0.
+        self.prev_temp = AMBIENT_TEMP
+        self.prev_temp_time = 0.
+        self.prev_temp_deriv = 0.
+    def temperature_update(self, read_time, temp, target_temp):
+        time_diff = read_time - self.prev_temp_time
+        if time_diff > 0.:
+            self.prev_temp_deriv = (temp - self.prev_temp) / time_diff
+        self.prev_temp = temp
+        self.prev_temp_time = read_time
+        if read_time < self.next_update_time:
+            return
+        dt = self.heater.get_pwm_delay()
+        self.next_update_time = read_time + dt
+        if target_temp <= 0.:
+            self.heater.set_slave_target(read_time, 0.)
+            return
+        # Pick the slave target with the least squared error over the
+        # prediction horizon
+        slave_temp = self.heater.get_slave_temp()
+        free, gain = self.model.predict_response(temp, slave_temp,
+                                                 self.horizon, dt)
+        err_gain = sum([g * (target_temp - f) for f, g in zip(free, gain)])
+        gain_gain = sum([g * g for g in gain])
+        max_target = self.heater.get_slave_max_target()
+        slave_target = max_target
+        if gain_gain > 0.:
+            slave_target = err_gain / gain_gain
+        # Limit it so the prediction does not exceed the allowed overshoot
+        max_temp = target_temp + self.max_overshoot
+        for f, g in zip(free, gain):
+            if g > 0. and f + slave_target * g > max_temp:
+                slave_target = (max_temp - f) / g
+        slave_target = max(0., min(max_target, slave_target))
+        self.heater.set_slave_target(read_time, slave_target)
+    def check_busy(self, eventtime, smoothed_temp, target_temp):
+        temp_diff = target_temp - smoothed_temp
+        return (abs(temp_diff) > PID_SETTLE_DELTA
+                or abs(self.prev_temp_deriv) > PID_SETTLE_SLOPE)
+
+
 ######################################################################
 # Sensor and heater lookup
 ######################################################################
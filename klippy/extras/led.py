@@ -81,6 +81,7 @@ class PrinterLED:
         self.printer = config.get_printer()
         self.led_helpers = {}
         self.active_templates = {}
+        self.render_cache = {}
         self.render_timer = None
         # Load templates
         dtemplates = display.lookup_display_templates(config)
@@ -118,28 +119,43 @@ class PrinterLED:
             return reactor.NEVER
         # Setup gcode_macro template context
         context = self.create_template_context(eventtime)
+        tracker = display.StatusTracker(context['printer'])
+        context['printer'] = tracker
         def render(name, **kwargs):
             return self.templates[name].render(context, **kwargs)
         context['render'] = render
-        # Render all templates
+        # Render all templates (reusing colors whose inputs are unchanged)
         need_transmit = {}
         rendered = {}
+        render_cache = {}
         template_info = self.active_templates.items()
         for (led_helper, index), (uid, template, lparams) in template_info:
             color = rendered.get(uid)
             if color is None:
-                try:
-                    text = template.render(context, **lparams)
-                    parts = [max(0., min(1., float(f)))
-                             for f in text.split(',', 4)]
-                except Exception as e:
-                    logging.exception("led template render error")
-                    parts = []
-                if len(parts) < 4:
-                    parts += [0.] * (4 - len(parts))
-                rendered[uid] = color = tuple(parts)
+                cache = self.render_cache.get(uid)
+                if cache is not None and tracker.is_unchanged(cache[0]):
+                    color = cache[1]
+                    render_cache[uid] = cache
+                else:
+                    tracker.start()
+                    try:
+                        text = template.render(context, **lparams)
+                        parts = [max(0., min(1., float(f)))
+                                 for f in text.split(',', 4)]
+                    except Exception as e:
+                        logging.exception("led template render error")
+                        tracker.disable()
+                        parts = []
+                    if len(parts) < 4:
+                        parts += [0.] * (4 - len(parts))
+                    color = tuple(parts)
+                    reads = tracker.finish()
+                    if reads is not None:
+                        render_cache[uid] = (reads, color)
+                rendered[uid] = color
             need_transmit[led_helper] = 1
             led_helper.set_color(index, color)
+        self.render_cache = render_cache
         context.clear() # Remove circular references for better gc
         # Transmit pending changes
         for led_helper in need_transmit.keys():
@@ -3,17 +3,22 @@
 # Copyright (C) 2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging
+import sys, logging, array, itertools, mmap, tempfile
 import chelper
 
 API_UPDATE_INTERVAL = 0.500
+NEVER_TIME = 9999999999999999.
 
 # Helper to periodically transmit data to a set of API clients
+# If data_width is set, the "data" of each message is a flat array of
+# rows (of data_width values each).  Internal clients store that array
+# directly and API clients are sent the data as a list of rows.
 class APIDumpHelper:
     def __init__(self, printer, data_cb, startstop_cb=None,
-                 update_interval=API_UPDATE_INTERVAL):
+                 update_interval=API_UPDATE_INTERVAL, data_width=None):
         self.printer = printer
         self.data_cb = data_cb
+        self.data_width = data_width
         if startstop_cb is None:
             startstop_cb = (lambda is_start: None)
         self.startstop_cb = startstop_cb
@@ -59,7 +64,7 @@ class APIDumpHelper:
         self.clients[cconn] = template
         self._start()
     def add_internal_client(self):
-        cconn = InternalDumpClient()
+        cconn = InternalDumpClient(self.data_width)
         self.clients[cconn] = {}
         self._start()
         return cconn
@@ -71,6 +76,7 @@ class APIDumpHelper:
             return self._stop()
         if not msg:
             return eventtime + self.update_interval
+        api_msg = None
         for cconn, template in list(self.clients.items()):
             if cconn.is_closed():
                 del self.clients[cconn]
@@ -79,25 +85,160 @@ class APIDumpHelper:
                 continue
             tmp = dict(template)
             tmp['params'] = msg
+            if self.data_width and not isinstance(cconn, InternalDumpClient):
+                if api_msg is None:
+                    api_msg = self._get_api_msg(msg)
+                tmp['params'] = api_msg
             cconn.send(tmp)
         return eventtime + self.update_interval
+    def _get_api_msg(self, msg):
+        width = self.data_width
+        data = msg['data']
+        api_msg = dict(msg)
+        api_msg['data'] = [data[i:i+width].tolist()
+                           for i in range(0, len(data), width)]
+        return api_msg
+
+SEGMENT_ROWS = 32768
+MAX_MEMORY_SEGMENTS = 16
+
+# Storage for the rows of numeric samples sent to an internal client.
+# The rows (whose first column must be the sample time) are stored
+# contiguously in preallocated segments of doubles.  Once too many
+# segments are held in memory the oldest ones are moved to a temporary
+# file (and accessed via mmap) so captures may be of any length.
+class SampleBuffer:
+    def __init__(self, width):
+        self.width = width
+        self.segment_size = SEGMENT_ROWS * width
+        # Each segment is [first_time, last_time, row_count, data] where
+        # data is an array or the offset of the segment in spill_file
+        self.segments = []
+        self.spilled_count = 0
+        self.spill_file = self.spill_map = None
+        self.spill_size = 0
+        self.row_count = 0
+    def __len__(self):
+        return self.row_count
+    def _spill_segment(self):
+        if self.spill_file is None:
+            self.spill_file = tempfile.TemporaryFile()
+        seg = self.segments[self.spilled_count]
+        self.spill_file.seek(self.spill_size)
+        seg[3].tofile(self.spill_file)
+        seg[3] = self.spill_size
+        self.spill_size += self.segment_size * 8
+        self.spilled_count += 1
+    def _add_segment(self):
+        data = array.array('d', [0.]) * self.segment_size
+        self.segments.append([0., 0., 0, data])
+        if len(self.segments) - self.spilled_count > MAX_MEMORY_SEGMENTS:
+            self._spill_segment()
+        return self.segments[-1]
+    def append(self, rows):
+        # The rows may be given as a flat array of doubles
+        width = self.width
+        flat = rows
+        if not isinstance(flat, array.array):
+            flat = array.array('d', itertools.chain.from_iterable(rows))
+        pos, total = 0, len(flat)
+        while pos < total:
+            seg = self.segments[-1] if self.segments else None
+            if seg is None or seg[2] * width >= self.segment_size:
+                seg = self._add_segment()
+            start = seg[2] * width
+            count = min(total - pos, self.segment_size - start)
+            seg[3][start:start+count] = flat[pos:pos+count]
+            if not seg[2]:
+                seg[0] = flat[pos]
+            seg[1] = flat[pos + count - width]
+            seg[2] += count // width
+            pos += count
+        self.row_count += total // width
+    def _get_view(self, seg):
+        data = seg[3]
+        count = seg[2] * self.width
+        if not isinstance(data, int):
+            if sys.version_info.major < 3:
+                # Arrays do not support memoryview on Python 2
+                return data[:count]
+            return memoryview(data)[:count]
+        if self.spill_map is None or len(self.spill_map) < self.spill_size:
+            # Map the file again to include newly spilled segments
+            if self.spill_map is not None:
+                try:
+                    self.spill_map.close()
+                except BufferError:
+                    # Still in use by views - released along with them
+                    pass
+            self.spill_file.flush()
+            self.spill_map = mmap.mmap(self.spill_file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+        if sys.version_info.major < 3:
+            view = array.array('d')
+            view.fromstring(self.spill_map[data:data + count * 8])
+            return view
+        view = memoryview(self.spill_map)[data:data + self.segment_size * 8]
+        return view.cast('d')[:count]
+    def _find_row(self, view, print_time, after):
+        # Return the first row with a time at (or after) print_time
+        width = self.width
+        low, high = 0, len(view) // width
+        while low < high:
+            mid = (low + high) // 2
+            samp_time = view[mid * width]
+            if samp_time < print_time or (after and samp_time == print_time):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+    def get_views(self, start_time, end_time):
+        # Return memoryviews of the (flattened) rows in a time range
+        width = self.width
+        res = []
+        for seg in self.segments:
+            if not seg[2] or seg[1] < start_time or seg[0] > end_time:
+                continue
+            view = self._get_view(seg)
+            first, last = 0, seg[2]
+            if seg[0] < start_time:
+                first = self._find_row(view, start_time, False)
+            if seg[1] > end_time:
+                last = self._find_row(view, end_time, True)
+            if first < last:
+                res.append(view[first * width:last * width])
+        return res
+    def iter_rows(self, start_time, end_time):
+        width = self.width
+        for view in self.get_views(start_time, end_time):
+            for pos in range(0, len(view), width):
+                yield tuple(view[pos:pos+width])
 
 # An "internal webhooks" wrapper for using APIDumpHelper internally
 class InternalDumpClient:
-    def __init__(self):
-        self.msgs = []
+    def __init__(self, data_width=None):
+        self.data_width = data_width
+        self.samples = None
         self.is_done = False
-    def get_messages(self):
-        return self.msgs
+    def get_views(self, start_time=-NEVER_TIME, end_time=NEVER_TIME):
+        if self.samples is None:
+            return []
+        return self.samples.get_views(start_time, end_time)
+    def iter_samples(self, start_time=-NEVER_TIME, end_time=NEVER_TIME):
+        if self.samples is None:
+            return iter(())
+        return self.samples.iter_rows(start_time, end_time)
     def finalize(self):
         self.is_done = True
     def is_closed(self):
         return self.is_done
     def send(self, msg):
-        self.msgs.append(msg)
-        if len(self.msgs) >= 10000:
-            # Avoid filling up memory with too many samples
-            self.finalize()
+        data = msg['params'].get('data')
+        if not data:
+            return
+        if self.samples is None:
+            self.samples = SampleBuffer(self.data_width or len(data[0]))
+        self.samples.append(data)
 
 # Extract stepper queue_step messages
 class DumpStepper:
@@ -159,8 +300,6 @@ class DumpStepper:
         hdr = ('interval', 'count', 'add')
         web_request.send({'header': hdr})
 
-NEVER_TIME = 9999999999999999.
-
 # Extract trapezoidal motion queue (trapq)
 class DumpTrapQ:
     def __init__(self, printer, name, trapq):
@@ -4,7 +4,7 @@
 # Copyright (C) 2020-2021 Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, time, collections, threading, multiprocessing, os
+import logging, time, collections, threading, multiprocessing, os, array
 from . import bus, motion_report, adxl345
 
 MPU9250_ADDR =      0x68
@@ -89,7 +89,8 @@ class MPU9250:
         self.clock_sync = adxl345.ClockSyncRegression(self.mcu, 640)
         # API server endpoints
         self.api_dump = motion_report.APIDumpHelper(
-            self.printer, self._api_update, self._api_startstop, 0.100)
+            self.printer, self._api_update, self._api_startstop, 0.100,
+            data_width=4)
         self.name = config.get_name().split()[-1]
         wh = self.printer.lookup_object('webhooks')
         wh.register_mux_endpoint("mpu9250/dump_mpu9250", "sensor", self.name,
@@ -130,7 +131,8 @@ class MPU9250:
         time_base, chip_base, inv_freq = self.clock_sync.get_time_translation()
         # Process every message in raw_samples
         count = seq = 0
-        samples = [None] * (len(raw_samples) * SAMPLES_PER_BLOCK)
+        samples = array.array('d', [0.]) * (
+            len(raw_samples) * SAMPLES_PER_BLOCK * 4)
         for params in raw_samples:
             seq_diff = (last_sequence - params['sequence']) & 0xffff
             seq_diff -= (seq_diff & 0x8000) << 1
@@ -151,8 +153,11 @@ class MPU9250:
                 y = round(raw_xyz[y_pos] * y_scale, 6)
                 z = round(raw_xyz[z_pos] * z_scale, 6)
                 ptime = round(time_base + (msg_cdiff + i) * inv_freq, 6)
-                samples[count] = (ptime, x, y, z)
-                count += 1
+                samples[count] = ptime
+                samples[count+1] = x
+                samples[count+2] = y
+                samples[count+3] = z
+                count += 4
         self.clock_sync.set_last_chip_clock(seq * SAMPLES_PER_BLOCK + i)
         del samples[count:]
         return samples
@@ -4,6 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import logging
+from .display import framebuffer
 
 BACKGROUND_PRIORITY_CLOCK = 0x7fffffff00000000
 
@@ -15,7 +16,8 @@ MAX_MCU_SIZE = 500  # Sanity check on LED chain length
 class PrinterNeoPixel:
     def __init__(self, config):
         self.printer = printer = config.get_printer()
-        self.mutex = printer.get_reactor().mutex()
+        self.reactor = reactor = printer.get_reactor()
+        self.mutex = reactor.mutex()
         # Configure neopixel
         ppins = printer.lookup_object('pins')
         pin_params = ppins.lookup_pin(config.get('pin'))
@@ -46,6 +48,13 @@ class PrinterNeoPixel:
         self.color_data = bytearray(len(self.color_map))
         self.update_color_data(self.led_helper.get_status()['color_data'])
         self.old_color_data = bytearray([d ^ 1 for d in self.color_data])
+        # Limit the rate of led updates sent to the mcu
+        max_frame_rate = config.getfloat('max_frame_rate', 0., minval=0.)
+        self.min_frame_time = self.next_frame_time = 0.
+        self.pending_print_time = None
+        if max_frame_rate:
+            self.min_frame_time = 1. / max_frame_rate
+            self.frame_timer = reactor.register_timer(self._frame_event)
         # Register callbacks
         printer.register_event_handler("klippy:connect", self.send_data)
     def build_config(self):
@@ -69,16 +78,8 @@ class PrinterNeoPixel:
         old_data, new_data = self.old_color_data, self.color_data
         if new_data == old_data:
             return
-        # Find the position of all changed bytes in this framebuffer
-        diffs = [[i, 1] for i, (n, o) in enumerate(zip(new_data, old_data))
-                 if n != o]
-        # Batch together changes that are close to each other
-        for i in range(len(diffs)-2, -1, -1):
-            pos, count = diffs[i]
-            nextpos, nextcount = diffs[i+1]
-            if pos + 5 >= nextpos and nextcount < 16:
-                diffs[i][1] = nextcount + (nextpos - pos)
-                del diffs[i+1]
+        # Find (and batch together) the changes in the color data
+        diffs = framebuffer.find_changes(new_data, old_data, 5)
         # Transmit changes
         ucmd = self.neopixel_update_cmd.send
         for pos, count in diffs:
@@ -99,12 +100,29 @@ class PrinterNeoPixel:
                 break
         else:
             logging.info("Neopixel update did not succeed")
+    def _send_frame(self, eventtime, print_time=None):
+        self.next_frame_time = eventtime + self.min_frame_time
+        self.pending_print_time = None
+        self.send_data(print_time)
+    def _frame_event(self, eventtime):
+        def reactor_bgfunc(eventtime):
+            with self.mutex:
+                self._send_frame(eventtime, self.pending_print_time)
+        self.reactor.register_callback(reactor_bgfunc)
+        return self.reactor.NEVER
     def update_leds(self, led_state, print_time):
         def reactor_bgfunc(eventtime):
             with self.mutex:
                 self.update_color_data(led_state)
-                self.send_data(print_time)
-        self.printer.get_reactor().register_callback(reactor_bgfunc)
+                if eventtime < self.next_frame_time:
+                    # Send the latest colors once the next frame is due
+                    # (at the print_time of the latest update)
+                    self.pending_print_time = print_time
+                    self.reactor.update_timer(self.frame_timer,
+                                              self.next_frame_time)
+                    return
+                self._send_frame(eventtime, print_time)
+        self.reactor.register_callback(reactor_bgfunc)
     def get_status(self, eventtime=None):
         return self.led_helper.get_status(eventtime)
 
@@ -4,7 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import math, logging
-from . import heaters
+from . import heaters, heater_model
 
 class PIDCalibrate:
     def __init__(self, config):
@@ -117,12 +117,7 @@ class ControlAutoTune:
         amplitude = .5 * abs(temp_diff)
         Ku = 4. * self.heater_max_power / (math.pi * amplitude)
         Tu = time_diff
-        # Use Ziegler-Nichols method to generate PID parameters
-        Ti = 0.5 * Tu
-        Td = 0.125 * Tu
-        Kp = 0.6 * Ku * heaters.PID_PARAM_BASE
-        Ki = Kp / Ti
-        Kd = Kp * Td
+        Kp, Ki, Kd = calc_ziegler_nichols(Ku, Tu)
         logging.info("Autotune: raw=%f/%f Ku=%f Tu=%f  Kp=%f Ki=%f Kd=%f",
                      temp_diff, self.heater_max_power, Ku, Tu, Kp, Ki, Kd)
         return Kp, Ki, Kd
@@ -140,5 +135,116 @@ class ControlAutoTune:
         f.write('\n'.join(pwm + out))
         f.close()
 
+# Use Ziegler-Nichols method to generate PID parameters
+def calc_ziegler_nichols(Ku, Tu):
+    Ti = 0.5 * Tu
+    Td = 0.125 * Tu
+    Kp = 0.6 * Ku * heaters.PID_PARAM_BASE
+    Ki = Kp / Ti
+    Kd = Kp * Td
+    return Kp, Ki, Kd
+
+
+######################################################################
+# Offline tuning from recorded heater traces
+######################################################################
+
+# Split (time, temp, pwm) samples into runs of consecutive samples.  A
+# log may span several klippy sessions (each with its own monotonic
+# clock), so a new run is started whenever time goes backwards or jumps
+# forward by more than max_gap.
+def split_trace(samples, max_gap):
+    runs = []
+    last_time = None
+    for sample in samples:
+        if (last_time is None or sample[0] < last_time
+            or sample[0] - last_time > max_gap):
+            runs.append([])
+        runs[-1].append(sample)
+        last_time = sample[0]
+    return runs
+
+# Resample a run of (time, temp, pwm) samples onto a fixed time grid.
+# The temperature is linearly interpolated and the pwm value is held.
+def resample_trace(samples, dt):
+    if len(samples) < 2:
+        return []
+    out = []
+    pos = 0
+    t = samples[0][0]
+    while t <= samples[-1][0]:
+        while samples[pos+1][0] < t:
+            pos += 1
+        t0, temp0, pwm0 = samples[pos]
+        t1, temp1, pwm1 = samples[pos+1]
+        frac = (t - t0) / (t1 - t0) if t1 > t0 else 0.
+        out.append((temp0 + (temp1 - temp0) * frac, pwm0))
+        t += dt
+    return out
+
+def _fit_dead_time(traces, delay, dt):
+    # Least squares fit of dT/dt = a * pwm(t - delay) - b * T + c
+    ata = [[0.] * 3 for i in range(3)]
+    atb = [0.] * 3
+    for trace in traces:
+        for k in range(delay, len(trace) - 1):
+            row = (trace[k-delay][1], -trace[k][0], 1.)
+            rate = (trace[k+1][0] - trace[k][0]) / dt
+            for i in range(3):
+                atb[i] += row[i] * rate
+                for j in range(3):
+                    ata[i][j] += row[i] * row[j]
+    res = heater_model.solve_linear(ata, atb)
+    if res is None:
+        return None
+    a, b, c = res
+    err = 0.
+    for trace in traces:
+        for k in range(delay, len(trace) - 1):
+            rate = (trace[k+1][0] - trace[k][0]) / dt
+            pred = a * trace[k-delay][1] - b * trace[k][0] + c
+            err += (rate - pred)**2
+    return err, a, b, c
+
+# Identify a first order plus dead time heater model from a list of
+# (time, temp, pwm) samples.  Returns (gain, time_constant, dead_time)
+# where gain is the steady state temperature rise at full power.
+def identify_heater(samples, dt=1., max_dead_time=60., max_gap=10.):
+    traces = [resample_trace(run, dt) for run in split_trace(samples, max_gap)]
+    traces = [trace for trace in traces if len(trace) >= 4]
+    if not traces:
+        return None
+    longest = max([len(trace) for trace in traces])
+    best = None
+    for delay in range(min(int(max_dead_time / dt), longest // 2) + 1):
+        res = _fit_dead_time(traces, delay, dt)
+        if res is None:
+            continue
+        err, a, b, c = res
+        if a <= 0. or b <= 0.:
+            continue
+        if best is None or err < best[0]:
+            best = (err, a / b, 1. / b, delay * dt)
+    if best is None:
+        return None
+    # Half a sample of hold delay is implicit in the sampled data
+    err, gain, tau, dead_time = best
+    return gain, tau, dead_time + .5 * dt
+
+# Calculate PID parameters for an identified heater model by finding
+# the oscillation a relay test would produce (the frequency at which
+# the model phase lag reaches 180 degrees).
+def calc_model_pid(gain, tau, dead_time):
+    low, high = 0., math.pi / dead_time
+    for i in range(100):
+        freq = .5 * (low + high)
+        if math.atan(freq * tau) + freq * dead_time < math.pi:
+            low = freq
+        else:
+            high = freq
+    Ku = math.sqrt(1. + (freq * tau)**2) / gain
+    Tu = 2. * math.pi / freq
+    return calc_ziegler_nichols(Ku, Tu)
+
 def load_config(config):
     return PIDCalibrate(config)
@@ -48,6 +48,10 @@ class PrinterProbe:
                                                  minval=0.)
         self.samples_retries = config.getint('samples_tolerance_retries', 0,
                                              minval=0)
+        # Fast multi-point probing support
+        self.fast_probe = config.getboolean('fast_probe', False)
+        self.last_run_stats = {'points': 0, 'fast': False,
+                               'duration': 0., 'time_per_point': 0.}
         # Register z_virtual_endstop pin
         self.printer.lookup_object('pins').register_chip('probe', self)
         # Register homing event handlers
@@ -112,7 +116,23 @@ class PrinterProbe:
         return self.lift_speed
     def get_offsets(self):
         return self.x_offset, self.y_offset, self.z_offset
-    def _probe(self, speed):
+    def use_fast_probe(self, gcmd):
+        fast = gcmd.get_int("FAST_PROBE", int(self.fast_probe),
+                            minval=0, maxval=1) == 1
+        if fast:
+            # The fast mode only takes a single sample at each point
+            params = gcmd.get_command_parameters()
+            for name in ["SAMPLES", "SAMPLE_RETRACT_DIST", "SAMPLES_TOLERANCE",
+                         "SAMPLES_TOLERANCE_RETRIES", "SAMPLES_RESULT"]:
+                if name in params:
+                    raise gcmd.error("%s is not supported with FAST_PROBE"
+                                     % (name,))
+        return fast
+    def note_probe_run(self, points, duration, fast):
+        self.last_run_stats = {
+            'points': points, 'fast': fast, 'duration': duration,
+            'time_per_point': duration / points if points else 0.}
+    def _probing_move(self, speed):
         toolhead = self.printer.lookup_object('toolhead')
         curtime = self.printer.get_reactor().monotonic()
         if 'z' not in toolhead.get_status(curtime)['homed_axes']:
@@ -127,9 +147,14 @@ class PrinterProbe:
             if "Timeout during endstop homing" in reason:
                 reason += HINT_TIMEOUT
             raise self.printer.command_error(reason)
-        self.gcode.respond_info("probe at %.3f,%.3f is z=%.6f"
-                                % (epos[0], epos[1], epos[2]))
         return epos[:3]
+    def report_probe(self, pos):
+        self.gcode.respond_info("probe at %.3f,%.3f is z=%.6f"
+                                % (pos[0], pos[1], pos[2]))
+    def _probe(self, speed):
+        pos = self._probing_move(speed)
+        self.report_probe(pos)
+        return pos
     def _move(self, coord, speed):
         self.printer.lookup_object('toolhead').manual_move(coord, speed)
     def _calc_mean(self, positions):
@@ -182,6 +207,10 @@ class PrinterProbe:
         if samples_result == 'median':
             return self._calc_median(positions)
         return self._calc_mean(positions)
+    def run_fast_probe(self, gcmd):
+        # Single sample probe - the caller must report the result
+        speed = gcmd.get_float("PROBE_SPEED", self.speed, above=0.)
+        return self._probing_move(speed)
     cmd_PROBE_help = "Probe Z-height at current XY position"
     def cmd_PROBE(self, gcmd):
         pos = self.run_probe(gcmd)
@@ -197,7 +226,8 @@ class PrinterProbe:
     def get_status(self, eventtime):
         return {'name': self.name,
                 'last_query': self.last_state,
-                'last_z_result': self.last_z_result}
+                'last_z_result': self.last_z_result,
+                'last_run': dict(self.last_run_stats)}
     cmd_PROBE_ACCURACY_help = "Probe Z-height accuracy at current XY position"
     def cmd_PROBE_ACCURACY(self, gcmd):
         speed = gcmd.get_float("PROBE_SPEED", self.speed, above=0.)
@@ -371,6 +401,7 @@ class ProbePointsHelper:
         self.lift_speed = self.speed
         self.probe_offsets = (0., 0., 0.)
         self.results = []
+        self.probe_count = 0
     def minimum_points(self,n):
         if len(self.probe_points) < n:
             raise self.printer.config_error(
@@ -398,12 +429,14 @@ class ProbePointsHelper:
                 return True
             self.results = []
         # Move to next XY probe point
+        toolhead.manual_move(self._next_position(), self.speed)
+        return False
+    def _next_position(self):
         nextpos = list(self.probe_points[len(self.results)])
         if self.use_offsets:
             nextpos[0] -= self.probe_offsets[0]
             nextpos[1] -= self.probe_offsets[1]
-        toolhead.manual_move(nextpos, self.speed)
-        return False
+        return nextpos
     def start_probe(self, gcmd):
         manual_probe.verify_no_manual_probe(self.printer)
         # Lookup objects
@@ -425,14 +458,53 @@ class ProbePointsHelper:
         if self.horizontal_move_z < self.probe_offsets[2]:
             raise gcmd.error("horizontal_move_z can't be less than"
                              " probe's z_offset")
+        fast = probe.use_fast_probe(gcmd)
+        reactor = self.printer.get_reactor()
+        start_time = reactor.monotonic()
+        self.probe_count = 0
         probe.multi_probe_begin()
+        if fast:
+            try:
+                self._fast_probe(probe, gcmd)
+            finally:
+                probe.multi_probe_end()
+        else:
+            while 1:
+                done = self._move_next()
+                if done:
+                    break
+                pos = probe.run_probe(gcmd)
+                self.probe_count += 1
+                self.results.append(pos)
+            probe.multi_probe_end()
+        probe.note_probe_run(self.probe_count,
+                             reactor.monotonic() - start_time, fast)
+    def _fast_probe(self, probe, gcmd):
+        # Probe each point with a single down move from horizontal_move_z.
+        # The lift and the travel to the next point are queued in the
+        # toolhead lookahead before the result is reported so that the
+        # toolhead keeps moving while the result is processed.
+        toolhead = self.printer.lookup_object('toolhead')
+        toolhead.manual_move([None, None, self.horizontal_move_z], self.speed)
+        toolhead.manual_move(self._next_position(), self.speed)
         while 1:
-            done = self._move_next()
-            if done:
-                break
-            pos = probe.run_probe(gcmd)
+            pos = probe.run_fast_probe(gcmd)
+            self.probe_count += 1
+            toolhead.manual_move([None, None, self.horizontal_move_z],
+                                 self.lift_speed)
             self.results.append(pos)
-        probe.multi_probe_end()
+            done = len(self.results) >= len(self.probe_points)
+            if not done:
+                toolhead.manual_move(self._next_position(), self.speed)
+            probe.report_probe(pos)
+            if not done:
+                continue
+            toolhead.get_last_move_time()
+            res = self.finalize_callback(self.probe_offsets, self.results)
+            if res != "retry":
+                return
+            self.results = []
+            toolhead.manual_move(self._next_position(), self.speed)
     def _manual_probe_start(self):
         done = self._move_next()
         if not done:
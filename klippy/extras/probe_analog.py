@@ -3,10 +3,61 @@
 # Copyright (C) 2023-2023  Michal O'Tomek
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging
+import logging, math
 from . import probe
 import statistics
 
+# Fit the contact point from a list of (time, adc_value) samples taken
+# during a probing move.  The curve is modeled as a flat baseline
+# followed by a linear ramp once the probe is loaded; the best split
+# point is found with a single pass over prefix sums.  Returns a
+# (contact_time, slope, rms) tuple or None if no fit is possible.
+def fit_contact(samples, min_samples=5):
+    count = len(samples)
+    if count < 2 * min_samples:
+        return None
+    time_base = samples[0][0]
+    ts = [t - time_base for t, v in samples]
+    vs = [float(v) for t, v in samples]
+    # Prefix sums of t, v, t*t, t*v, v*v
+    st = [0.] * (count + 1)
+    sv = [0.] * (count + 1)
+    stt = [0.] * (count + 1)
+    stv = [0.] * (count + 1)
+    svv = [0.] * (count + 1)
+    for i in range(count):
+        t, v = ts[i], vs[i]
+        st[i+1] = st[i] + t
+        sv[i+1] = sv[i] + v
+        stt[i+1] = stt[i] + t * t
+        stv[i+1] = stv[i] + t * v
+        svv[i+1] = svv[i] + v * v
+    best = None
+    for k in range(min_samples, count - min_samples + 1):
+        # Baseline is the mean of samples [0, k)
+        base = sv[k] / k
+        base_err = svv[k] - sv[k] * base
+        # Least squares line through samples [k, count)
+        n = count - k
+        r_t, r_v = st[count] - st[k], sv[count] - sv[k]
+        r_tt = stt[count] - stt[k] - r_t * r_t / n
+        r_tv = stv[count] - stv[k] - r_t * r_v / n
+        r_vv = svv[count] - svv[k] - r_v * r_v / n
+        if r_tt <= 0.:
+            continue
+        slope = r_tv / r_tt
+        err = base_err + r_vv - slope * r_tv
+        if slope <= 0. or (best is not None and err >= best[0]):
+            continue
+        contact = r_t / n + (base - r_v / n) / slope
+        best = (err, contact, slope)
+    if best is None:
+        return None
+    err, contact, slope = best
+    if contact < ts[0] or contact > ts[-1]:
+        return None
+    return (time_base + contact, slope, math.sqrt(max(0., err) / count))
+
 # Analog "endstop" wrapper
 class AnalogEndstopWrapper:
     def __init__(self, config):
@@ -31,11 +82,16 @@ class AnalogEndstopWrapper:
         self.treshold = config.getint("treshold", 0)
         self.base_adc = 0
         self.mcu_endstop = mcu.setup_pin('analog_endstop', pin_params)
+        # Bulk capture of the trigger curve
+        self.capture = config.getboolean('capture_samples', False)
+        self.fit_min_samples = config.getint('fit_min_samples', 5, minval=2)
+        self.fit_stats = {}
+        if self.capture:
+            self.mcu_endstop.setup_capture()
         # Wrappers
         self.get_mcu = self.mcu_endstop.get_mcu
         self.add_stepper = self.mcu_endstop.add_stepper
         self.get_steppers = self.mcu_endstop.get_steppers
-        self.home_wait = self.mcu_endstop.home_wait
         self.query_endstop = self.mcu_endstop.query_endstop
         # Register BLTOUCH_DEBUG command
         self.gcode = self.printer.lookup_object('gcode')
@@ -96,6 +152,8 @@ class AnalogEndstopWrapper:
     def home_start(self, print_time, sample_time, oversample_count, rest_time,
                    triggered=None):
         rest_time = rest_time
+        if self.capture:
+            self.mcu_endstop.capture_start(print_time)
         self.finish_home_complete = self.mcu_endstop.home_start(
             print_time, sample_time, oversample_count, rest_time,
             self.base_adc + self.treshold)
@@ -105,11 +163,39 @@ class AnalogEndstopWrapper:
         return self.finish_home_complete
     def wait_for_trigger(self, eventtime):
         self.finish_home_complete.wait()
+    def home_wait(self, home_end_time):
+        trigger_time = self.mcu_endstop.home_wait(home_end_time)
+        if not self.capture:
+            return trigger_time
+        samples, overflows = self.mcu_endstop.capture_finish()
+        if trigger_time <= 0.:
+            return trigger_time
+        samples = [s for s in samples if s[0] <= trigger_time]
+        res = fit_contact(samples, self.fit_min_samples)
+        if res is None:
+            logging.info("Analog probe: unable to fit contact point"
+                         " (%d samples, %d overflows)",
+                         len(samples), overflows)
+            self.fit_stats = {'samples': len(samples),
+                              'overflows': overflows, 'fitted': False}
+            return trigger_time
+        contact_time, slope, rms = res
+        self.fit_stats = {'samples': len(samples), 'overflows': overflows,
+                          'fitted': True, 'slope': slope, 'rms': rms,
+                          'trigger_delay': trigger_time - contact_time}
+        logging.info("Analog probe: contact fitted %.6fs before trigger"
+                     " (%d samples, %d overflows, slope=%.3f/s, rms=%.3f)",
+                     trigger_time - contact_time, len(samples), overflows,
+                     slope, rms)
+        return contact_time
     def probe_finish(self, hmove):
         self.wait_trigger_complete.wait()
         self.sync_print_time()
     def get_position_endstop(self):
         return self.position_endstop
+    def get_status(self, eventtime):
+        return {'base_adc': self.base_adc, 'treshold': self.treshold,
+                'last_fit': dict(self.fit_stats)}
 
     cmd_ANALOG_PROBE_DEBUG_help = "Returns analog probe debug report"
     def cmd_ANALOG_PROBE_DEBUG(self, gcmd):
@@ -117,6 +203,9 @@ class AnalogEndstopWrapper:
         gcmd.respond_info(f"Analog Probe debug. ADC Value="
                           f"{self.mcu_endstop.query_endstop()}, ADC base value"
                           f" = {self.base_adc}, treshold={self.treshold}")
+        if self.fit_stats:
+            gcmd.respond_info("Last trigger fit: " + ", ".join(
+                ["%s=%s" % (k, v) for k, v in sorted(self.fit_stats.items())]))
         self.sync_print_time()
 
 def load_config(config):
@@ -3,15 +3,49 @@ import configparser
 from configfile import ConfigWrapper
 
 KELVIN_TO_CELSIUS = -273.15
+DEFAULT_REPORT_INTERVAL = 0.300
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) & 1:
+        return values[middle]
+    return (values[middle-1] + values[middle]) * .5
+
+AGGREGATE_METHODS = {
+    'mean': lambda values: sum(values) / len(values),
+    'median': _median,
+    'min': min,
+    'max': max,
+}
+
 class SensorGroup:
     cmd_SENSOR_GROUP_DEBUG_help = "Return sensor group temperatures"
-    def __init__(self, config, sensors, name):
+    def __init__(self, config, sensors, name, params):
         self.name = name
-        self.num_sensors = len(sensors)
-        self.temps = [0]*self.num_sensors
-        self.temps_valid = [False]*self.num_sensors
-        self.last_valid_temps = [0]*self.num_sensors
+        self.num_sensors = n = len(sensors)
+        self.aggregate = AGGREGATE_METHODS[params['aggregate']]
+        self.report_interval = params['report_interval']
+        self.report_slack = .25 * self.report_interval
+        self.max_skew = params['max_skew']
+        self.outlier_delta = params['outlier_delta']
         self.last_temp = 0
+        self.last_valid_temps = [0]*n
+        self.next_report_time = 0.
+        # Latest reading of each member
+        self.member_times = [0.]*n
+        self.member_values = [0.]*n
+        # Per member health statistics
+        self.reading_counts = [0]*n
+        self.stale_counts = [0]*n
+        self.rejected_counts = [0]*n
+        self.member_skews = [0.]*n
+        # Ring buffer of the member readings used in each report
+        self.ring_size = params['history']
+        self.ring_values = [[None]*n for i in range(self.ring_size)]
+        self.ring_results = [0.]*self.ring_size
+        self.ring_pos = self.ring_count = 0
+        self.temperature_callback = None
         self.sensors = sensors
         for i, s in enumerate(self.sensors):
             cb = self._callback_factory(i)
@@ -23,33 +57,84 @@ class SensorGroup:
                                    self.cmd_SENSOR_GROUP_DEBUG,
                                    desc=self.cmd_SENSOR_GROUP_DEBUG_help)
     def cmd_SENSOR_GROUP_DEBUG(self, gcmd):
-        gcmd.respond_info(f"Last average temperature: {self.last_temp}. Last sensors temperatures: {self.last_valid_temps}")
+        gcmd.respond_info("Last aggregate temperature: %s. "
+                          "Last sensors temperatures: %s"
+                          % (self.last_temp, self.last_valid_temps))
+        for i, h in enumerate(self.get_member_health()):
+            gcmd.respond_info(
+                "sensor_%d: readings=%d stale=%d rejected=%d skew=%.3f"
+                " bias=%.3f" % (i + 1, h['readings'], h['stale'],
+                                h['rejected'], h['skew'], h['bias']))
     def _callback_factory(self, i):
         def cb(read_time, read_value):
-            nonlocal self
-            nonlocal i
-            self.temps[i] = read_value
-            self.temps_valid[i] = True
-            all_valid = True
-            for v in self.temps_valid:
-                all_valid = all_valid and v
-            if all_valid:
-                # invalidate all values
-                for i, s in enumerate(self.temps_valid):
-                    self.temps_valid[i] = False
-                awg = 0
-                for i, t in enumerate(self.temps):
-                    awg += t
-                    self.last_valid_temps[i] = t
-                awg = awg / self.num_sensors
-                self.last_temp = awg
-                if self.temperature_callback is not None:
-                    self.temperature_callback(read_time, awg)
+            self.member_times[i] = read_time
+            self.member_values[i] = read_value
+            self.reading_counts[i] += 1
+            if read_time >= self.next_report_time:
+                self._report(read_time)
         return cb
+    def _report(self, read_time):
+        self.next_report_time = (read_time + self.report_interval
+                                 - self.report_slack)
+        # Collect the members with a recent enough reading
+        row = self.ring_values[self.ring_pos]
+        values = []
+        for i in range(self.num_sensors):
+            skew = read_time - self.member_times[i]
+            self.member_skews[i] = skew
+            if skew > self.max_skew:
+                if self.reading_counts[i]:
+                    self.stale_counts[i] += 1
+                row[i] = None
+                continue
+            row[i] = self.member_values[i]
+            values.append(row[i])
+        if not values:
+            return
+        median = None
+        # Reject readings too far from the median of the group
+        if self.outlier_delta and len(values) > 2:
+            median = _median(values)
+            values = []
+            for i, v in enumerate(row):
+                if v is None:
+                    continue
+                if abs(v - median) > self.outlier_delta:
+                    self.rejected_counts[i] += 1
+                    row[i] = None
+                    continue
+                values.append(v)
+        result = self.aggregate(values) if values else median
+        self.ring_results[self.ring_pos] = result
+        self.ring_pos = (self.ring_pos + 1) % self.ring_size
+        self.ring_count = min(self.ring_count + 1, self.ring_size)
+        for i, v in enumerate(row):
+            if v is not None:
+                self.last_valid_temps[i] = v
+        self.last_temp = result
+        if self.temperature_callback is not None:
+            self.temperature_callback(read_time, result)
+    def get_member_health(self):
+        health = []
+        for i in range(self.num_sensors):
+            # Average deviation from the group result over the ring buffer
+            diffs = [self.ring_values[j][i] - self.ring_results[j]
+                     for j in range(self.ring_count)
+                     if self.ring_values[j][i] is not None]
+            bias = sum(diffs) / len(diffs) if diffs else 0.
+            health.append({'readings': self.reading_counts[i],
+                           'stale': self.stale_counts[i],
+                           'rejected': self.rejected_counts[i],
+                           'skew': self.member_skews[i],
+                           'bias': bias})
+        return health
+    def get_status(self, eventtime):
+        return {'temperature': round(self.last_temp, 2),
+                'members': self.get_member_health()}
     def setup_callback(self, temperature_callback):
         self.temperature_callback = temperature_callback
     def get_report_time_delta(self):
-        return 0
+        return self.report_interval
     def setup_minmax(self, min_temp, max_temp):
         for s in self.sensors:
             #s.setup_minmax(min_temp, max_temp)
@@ -62,18 +147,40 @@ class SensorGroupFactory:
         self.num_sensors = config.getint("num_sensors")
         self.sensors = []
         for i in range(self.num_sensors):
-            prefix = f"sensor_{i+1}_"
+            prefix = "sensor_%d_" % (i + 1,)
             rc = configparser.RawConfigParser()
             rc.add_section(prefix)
             for o in config.get_prefix_options(prefix):
                 rc.set(prefix, o[len(prefix):], config.get(o))
             sensor_config = ConfigWrapper(config.printer, rc, config.access_tracking, prefix)
             self.sensors.append(pheaters.setup_sensor(sensor_config))
+        # Aggregation settings
+        member_interval = max([s.get_report_time_delta()
+                               for s in self.sensors])
+        report_interval = config.getfloat(
+            'report_interval', member_interval or DEFAULT_REPORT_INTERVAL,
+            above=0.)
+        methods = {m: m for m in AGGREGATE_METHODS}
+        self.params = {
+            'aggregate': config.getchoice('aggregate', methods, 'mean'),
+            'report_interval': report_interval,
+            'max_skew': config.getfloat('max_skew', 2. * report_interval,
+                                        above=0.),
+            'outlier_delta': config.getfloat('outlier_delta', 0., minval=0.),
+            'history': config.getint('history', 16, minval=1),
+        }
+        self.group = None
 
     def create(self, config):
-        return SensorGroup(config, self.sensors, self.name)
+        self.group = SensorGroup(config, self.sensors, self.name, self.params)
+        return self.group
+    def get_status(self, eventtime):
+        if self.group is None:
+            return {}
+        return self.group.get_status(eventtime)
 
 def load_config_prefix(config):
     sensor_group_factory = SensorGroupFactory(config)
     pheaters = config.get_printer().load_object(config, "heaters")
-    pheaters.add_sensor_factory(sensor_group_factory.name, sensor_group_factory.create)
\ No newline at end of file
+    pheaters.add_sensor_factory(sensor_group_factory.name, sensor_group_factory.create)
+    return sensor_group_factory
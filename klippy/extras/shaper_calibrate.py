@@ -152,10 +152,11 @@ class ShaperCalibrate:
         if isinstance(raw_values, np.ndarray):
             data = raw_values
         else:
-            samples = raw_values.get_samples()
-            if not samples:
+            views = raw_values.get_sample_views()
+            if not views:
                 return None
-            data = np.array(samples)
+            data = np.concatenate([np.frombuffer(v, dtype=np.float64)
+                                   for v in views]).reshape(-1, 4)
 
         N = data.shape[0]
         T = data[-1,0] - data[0,0]
@@ -3,7 +3,8 @@
 # Copyright (C) 2018-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import os, time, logging
+import os, time, logging, json
+import queuelogger
 
 class PrinterSysStats:
     def __init__(self, config):
@@ -43,6 +44,10 @@ class PrinterSysStats:
                         break
             except:
                 pass
+        # Report log messages lost due to a full log queue
+        dropped = queuelogger.get_dropped_records()
+        if dropped is not None:
+            msg = "%s log_dropped=%d" % (msg, dropped)
         return (False, msg)
     def get_status(self, eventtime):
         return {'sysload': self.last_load_avg,
@@ -55,6 +60,9 @@ class PrinterStats:
         reactor = self.printer.get_reactor()
         self.stats_timer = reactor.register_timer(self.generate_stats)
         self.stats_cb = []
+        self.stats_log = None
+        if self.printer.get_start_args().get('stats_log') is not None:
+            self.stats_log = logging.getLogger(queuelogger.STATS_LOGGER)
         self.printer.register_event_handler("klippy:ready", self.handle_ready)
     def handle_ready(self):
         self.stats_cb = [o.stats for n, o in self.printer.lookup_objects()
@@ -65,10 +73,36 @@ class PrinterStats:
     def generate_stats(self, eventtime):
         stats = [cb(eventtime) for cb in self.stats_cb]
         if max([s[0] for s in stats]):
-            logging.info("Stats %.1f: %s", eventtime,
-                         ' '.join([s[1] for s in stats]))
+            msg = ' '.join([s[1] for s in stats])
+            logging.info("Stats %.1f: %s", eventtime, msg)
+            if self.stats_log is not None:
+                record = {'time': eventtime, 'stats': parse_stats(msg)}
+                self.stats_log.info(json.dumps(record, separators=(',', ':')))
         return eventtime + 1.
 
+def _parse_value(val):
+    try:
+        return int(val)
+    except ValueError:
+        pass
+    try:
+        return float(val)
+    except ValueError:
+        return val
+
+# Convert a stats line ("name=value" fields, each group of fields
+# following an optional "prefix:" word) into {prefix: {name: value}}
+def parse_stats(msg):
+    groups = {}
+    fields = groups.setdefault('', {})
+    for part in msg.split():
+        if '=' not in part:
+            fields = groups.setdefault(part.rstrip(':'), {})
+            continue
+        name, val = part.split('=', 1)
+        fields[name] = _parse_value(val)
+    return groups
+
 def load_config(config):
     config.get_printer().add_object('system_stats', PrinterSysStats(config))
     return PrinterStats(config)
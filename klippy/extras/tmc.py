@@ -125,21 +125,29 @@ class TMCErrorCheck:
         # Setup for temperature query
         self.adc_temp = None
         self.adc_temp_reg = self.fields.lookup_register("adc_temp")
-    def _query_register(self, reg_info, try_clear=False):
+        # Registers read together on each periodic check
+        self.poll_registers = [reg_name]
+        if self.gstat_reg_info is not None:
+            self.poll_registers.append(self.gstat_reg_info[1])
+        if self.adc_temp_reg is not None:
+            self.poll_registers.append(self.adc_temp_reg)
+    def _query_register(self, reg_info, try_clear=False, val=None):
         last_value, reg_name, mask, err_mask, cs_actual_mask = reg_info
         cleared_flags = 0
         count = 0
         while 1:
-            try:
-                val = self.mcu_tmc.get_register(reg_name)
-            except self.printer.command_error as e:
-                count += 1
-                if count < 3 and str(e).startswith("Unable to read tmc uart"):
-                    # Allow more retries on a TMC UART read error
-                    reactor = self.printer.get_reactor()
-                    reactor.pause(reactor.monotonic() + 0.050)
-                    continue
-                raise
+            if val is None:
+                try:
+                    val = self.mcu_tmc.get_register(reg_name)
+                except self.printer.command_error as e:
+                    count += 1
+                    if (count < 3
+                        and str(e).startswith("Unable to read tmc uart")):
+                        # Allow more retries on a TMC UART read error
+                        reactor = self.printer.get_reactor()
+                        reactor.pause(reactor.monotonic() + 0.050)
+                        continue
+                    raise
             if val & mask != last_value & mask:
                 fmt = self.fields.pretty_format(reg_name, val)
                 logging.info("TMC '%s' reports %s", self.stepper_name, fmt)
@@ -163,21 +171,35 @@ class TMCErrorCheck:
                 try_clear = False
                 cleared_flags |= val & err_mask
                 self.mcu_tmc.set_register(reg_name, val & err_mask)
+            val = None
         return cleared_flags
-    def _query_temperature(self):
+    def _query_temperature(self, val=None):
+        if val is not None:
+            self.adc_temp = val
+            return
         try:
             self.adc_temp = self.mcu_tmc.get_register(self.adc_temp_reg)
         except self.printer.command_error as e:
             # Ignore comms error for temperature
             self.adc_temp = None
             return
+    def _read_poll_registers(self):
+        try:
+            return self.mcu_tmc.get_registers(self.poll_registers,
+                                              periodic=True)
+        except self.printer.command_error as e:
+            # Fall back to reading (and retrying) each register
+            return {}
     def _do_periodic_check(self, eventtime):
         try:
-            self._query_register(self.drv_status_reg_info)
+            vals = self._read_poll_registers()
+            self._query_register(self.drv_status_reg_info,
+                                 val=vals.get(self.drv_status_reg_info[1]))
             if self.gstat_reg_info is not None:
-                self._query_register(self.gstat_reg_info)
+                self._query_register(self.gstat_reg_info,
+                                     val=vals.get(self.gstat_reg_info[1]))
             if self.adc_temp_reg is not None:
-                self._query_temperature()
+                self._query_temperature(vals.get(self.adc_temp_reg))
         except self.printer.command_error as e:
             self.printer.invoke_shutdown(str(e))
             return self.printer.get_reactor().NEVER
@@ -448,8 +470,9 @@ class TMCCommandHelper:
                 if reg_name not in self.read_registers:
                     gcmd.respond_info(self.fields.pretty_format(reg_name, val))
             gcmd.respond_info("========== Queried registers ==========")
+            vals = self.mcu_tmc.get_registers(self.read_registers)
             for reg_name in self.read_registers:
-                val = self.mcu_tmc.get_register(reg_name)
+                val = vals[reg_name]
                 if self.read_translate is not None:
                     reg_name, val = self.read_translate(reg_name, val)
                 gcmd.respond_info(self.fields.pretty_format(reg_name, val))
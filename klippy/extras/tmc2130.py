@@ -182,11 +182,18 @@ class TMCCurrentHelper:
 # TMC2130 SPI
 ######################################################################
 
+# Time a register value read on behalf of another chain device is valid
+PREFETCH_TIME = 0.250
+
 class MCU_TMC_SPI_chain:
     def __init__(self, config, chain_len=1):
         self.printer = config.get_printer()
         self.chain_len = chain_len
-        self.mutex = self.printer.get_reactor().mutex()
+        self.reactor = self.printer.get_reactor()
+        self.mutex = self.reactor.mutex()
+        # Registers periodically polled at each chain position
+        self.polled = {}
+        self.prefetched = {}
         share = None
         if chain_len > 1:
             share = "tmc_spi_cs"
@@ -196,16 +203,62 @@ class MCU_TMC_SPI_chain:
     def _build_cmd(self, data, chain_pos):
         return ([0x00] * ((self.chain_len - chain_pos) * 5) +
                 data + [0x00] * ((chain_pos - 1) * 5))
-    def reg_read(self, reg, chain_pos):
-        cmd = self._build_cmd([reg, 0x00, 0x00, 0x00, 0x00], chain_pos)
-        self.spi.spi_send(cmd)
+    def _build_read_cmd(self, regs):
+        cmd = []
+        for chain_pos in range(self.chain_len, 0, -1):
+            cmd.extend([regs.get(chain_pos, 0x00), 0x00, 0x00, 0x00, 0x00])
+        return cmd
+    def reg_read_multi(self, reads):
+        # Each transfer reads one register from every chain position
+        # (the response to a read is returned by the following transfer)
+        rounds = []
+        read_rounds = []
+        for chain_pos, reg in reads:
+            for i, regs in enumerate(rounds):
+                if chain_pos not in regs:
+                    break
+            else:
+                i = len(rounds)
+                rounds.append({})
+            rounds[i][chain_pos] = reg
+            read_rounds.append(i)
+        cmds = [self._build_read_cmd(regs) for regs in rounds]
+        self.spi.spi_send(cmds[0])
         if self.printer.get_start_args().get('debugoutput') is not None:
-            return 0
-        params = self.spi.spi_transfer(cmd)
-        pr = bytearray(params['response'])
-        pr = pr[(self.chain_len - chain_pos) * 5 :
-                (self.chain_len - chain_pos + 1) * 5]
-        return (pr[1] << 24) | (pr[2] << 16) | (pr[3] << 8) | pr[4]
+            return [0] * len(reads)
+        responses = []
+        for cmd in cmds[1:] + cmds[-1:]:
+            params = self.spi.spi_transfer(cmd)
+            responses.append(bytearray(params['response']))
+        out = []
+        for (chain_pos, reg), i in zip(reads, read_rounds):
+            pos = (self.chain_len - chain_pos) * 5
+            pr = responses[i][pos:pos+5]
+            out.append((pr[1] << 24) | (pr[2] << 16) | (pr[3] << 8) | pr[4])
+        return out
+    def reg_read(self, reg, chain_pos):
+        return self.reg_read_multi([(chain_pos, reg)])[0]
+    def reg_poll(self, chain_pos, regs):
+        # Read the periodically polled registers of a chain device, and
+        # also read the polled registers of the other chain devices
+        curtime = self.reactor.monotonic()
+        self.polled[chain_pos] = (curtime, regs)
+        prefetch = self.prefetched.pop(chain_pos, None)
+        if (prefetch is not None and prefetch[1] == regs
+            and curtime < prefetch[0] + PREFETCH_TIME):
+            return prefetch[2]
+        reads = [(chain_pos, reg) for reg in regs]
+        others = [(pos, pregs) for pos, (ptime, pregs) in self.polled.items()
+                  if pos != chain_pos and curtime < ptime + 2.]
+        for pos, pregs in others:
+            reads.extend([(pos, reg) for reg in pregs])
+        vals = self.reg_read_multi(reads)
+        start = len(regs)
+        for pos, pregs in others:
+            pvals = vals[start:start+len(pregs)]
+            self.prefetched[pos] = (curtime, pregs, pvals)
+            start += len(pregs)
+        return vals[:len(regs)]
     def reg_write(self, reg, val, chain_pos, print_time=None):
         minclock = 0
         if print_time is not None:
@@ -263,6 +316,15 @@ class MCU_TMC_SPI:
         with self.mutex:
             read = self.tmc_spi.reg_read(reg, self.chain_pos)
         return read
+    def get_registers(self, reg_names, periodic=False):
+        regs = [self.name_to_reg[reg_name] for reg_name in reg_names]
+        with self.mutex:
+            if periodic:
+                vals = self.tmc_spi.reg_poll(self.chain_pos, regs)
+            else:
+                reads = [(self.chain_pos, reg) for reg in regs]
+                vals = self.tmc_spi.reg_read_multi(reads)
+        return dict(zip(reg_names, vals))
     def set_register(self, reg_name, val, print_time=None):
         reg = self.name_to_reg[reg_name]
         with self.mutex:
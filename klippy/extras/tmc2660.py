@@ -213,6 +213,9 @@ class MCU_TMC2660_SPI:
             params = self.spi.spi_transfer(msg)
         pr = bytearray(params['response'])
         return (pr[0] << 16) | (pr[1] << 8) | pr[2]
+    def get_registers(self, reg_names, periodic=False):
+        return {reg_name: self.get_register(reg_name)
+                for reg_name in reg_names}
     def set_register(self, reg_name, val, print_time=None):
         minclock = 0
         if print_time is not None:
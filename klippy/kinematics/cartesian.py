@@ -18,7 +18,7 @@ class CartKinematics:
             rail.setup_itersolve('cartesian_stepper_alloc', axis.encode())
         for s in self.get_steppers():
             s.set_trapq(toolhead.get_trapq())
-            toolhead.register_step_generator(s.generate_steps)
+            toolhead.register_batch_step_generator(s.generate_steps)
         self.printer.register_event_handler("stepper_enable:motor_off",
                                             self._motor_off)
         # Setup boundary checks
@@ -39,7 +39,7 @@ class CartKinematics:
             dc_rail = stepper.LookupMultiRail(dc_config)
             dc_rail.setup_itersolve('cartesian_stepper_alloc', dc_axis.encode())
             for s in dc_rail.get_steppers():
-                toolhead.register_step_generator(s.generate_steps)
+                toolhead.register_batch_step_generator(s.generate_steps)
             self.dual_carriage_rails = [
                 self.rails[self.dual_carriage_axis], dc_rail]
             self.printer.lookup_object('gcode').register_command(
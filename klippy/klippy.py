@@ -47,6 +47,31 @@ config, and restart the host software.
 Printer is shutdown
 """
 
+# Track the time spent in each step of printer startup
+class StartupTimer:
+    def __init__(self):
+        self.start_time = time.time()
+        self.times = {}
+        self.nested = [0.]
+    def measure(self, name, func, *args):
+        # Time spent in nested measurements is reported separately
+        self.nested.append(0.)
+        start_time = time.time()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.time() - start_time
+            nested_time = self.nested.pop()
+            self.nested[-1] += elapsed
+            self.times[name] = self.times.get(name, 0.) + elapsed - nested_time
+    def log_report(self, min_time=.001):
+        total_time = time.time() - self.start_time
+        times = sorted([(t, n) for n, t in self.times.items()], reverse=True)
+        lines = ["%.3f %s" % (t, n) for t, n in times if t >= min_time]
+        lines.append("%.3f other" % (total_time - sum(self.times.values()),))
+        logging.info("Startup timing (%.3f seconds):\n  %s",
+                     total_time, "\n  ".join(lines))
+
 class Printer:
     config_error = configfile.error
     command_error = gcode.CommandError
@@ -60,6 +85,7 @@ class Printer:
         self.run_result = None
         self.event_handlers = {}
         self.objects = collections.OrderedDict()
+        self.startup_timer = None
         # Init printer components that must be setup prior to config
         for m in [gcode, webhooks]:
             m.add_early_printer_objects(self)
@@ -118,7 +144,8 @@ class Printer:
             if default is not configfile.sentinel:
                 return default
             raise self.config_error("Unable to load module '%s'" % (section,))
-        mod = importlib.import_module('extras.' + module_name)
+        mod = self._measure("import " + module_name,
+                            importlib.import_module, 'extras.' + module_name)
         init_func = 'load_config'
         if len(module_parts) > 1:
             init_func = 'load_config_prefix'
@@ -127,20 +154,28 @@ class Printer:
             if default is not configfile.sentinel:
                 return default
             raise self.config_error("Unable to load module '%s'" % (section,))
-        self.objects[section] = init_func(config.getsection(section))
+        self.objects[section] = self._measure("load_config " + section,
+                                              init_func,
+                                              config.getsection(section))
         return self.objects[section]
+    def _measure(self, name, func, *args):
+        if self.startup_timer is None:
+            return func(*args)
+        return self.startup_timer.measure(name, func, *args)
     def _read_config(self):
         self.objects['configfile'] = pconfig = configfile.PrinterConfig(self)
-        config = pconfig.read_main_config()
+        config = self._measure("read config", pconfig.read_main_config)
         if self.bglogger is not None:
             pconfig.log_config(config)
         # Create printer components
         for m in [pins, mcu]:
-            m.add_printer_objects(config)
+            self._measure("load_config " + m.__name__,
+                          m.add_printer_objects, config)
         for section_config in config.get_prefix_sections(''):
             self.load_object(config, section_config.get_name(), None)
         for m in [toolhead]:
-            m.add_printer_objects(config)
+            self._measure("load_config " + m.__name__,
+                          m.add_printer_objects, config)
         # Validate that there are no undefined parameters in the config file
         pconfig.check_unused_options(config)
     def _build_protocol_error_message(self, e):
@@ -170,14 +205,25 @@ class Printer:
         msg += msg_update + ["Up-to-date MCU(s):"] + msg_updated
         msg += [message_protocol_error2, str(e)]
         return "\n".join(msg)
+    def _measure_handler(self, event, cb):
+        # Report handlers as Class.method (Python 2 has no __qualname__)
+        name = getattr(cb, '__name__', cb.__class__.__name__)
+        obj = getattr(cb, '__self__', None)
+        if obj is not None:
+            name = "%s.%s" % (obj.__class__.__name__, name)
+        if hasattr(obj, 'get_name'):
+            name = "%s %s" % (name, obj.get_name())
+        self._measure("%s %s" % (event, name), cb)
     def _connect(self, eventtime):
+        self.startup_timer = StartupTimer()
         try:
             self._read_config()
-            self.send_event("klippy:mcu_identify")
+            for cb in self.event_handlers.get("klippy:mcu_identify", []):
+                self._measure_handler("mcu_identify", cb)
             for cb in self.event_handlers.get("klippy:connect", []):
                 if self.state_message is not message_startup:
                     return
-                cb()
+                self._measure_handler("connect", cb)
         except (self.config_error, pins.error) as e:
             logging.exception("Config error")
             self._set_state("%s\n%s" % (str(e), message_restart))
@@ -197,6 +243,9 @@ class Printer:
             self._set_state("Internal error during connect: %s\n%s"
                             % (str(e), message_restart,))
             return
+        finally:
+            self.startup_timer.log_report()
+            self.startup_timer = None
         try:
             self._set_state(message_ready)
             for cb in self.event_handlers.get("klippy:ready", []):
@@ -307,6 +356,8 @@ def main():
                     help="api server unix domain socket filename")
     opts.add_option("-l", "--logfile", dest="logfile",
                     help="write log to file instead of stderr")
+    opts.add_option("--stats-log", dest="statslog",
+                    help="also write stats as json records to file")
     opts.add_option("-v", action="store_true", dest="verbose",
                     help="enable debug messages")
     opts.add_option("-o", "--debugoutput", dest="debugoutput",
@@ -342,6 +393,10 @@ def main():
         bglogger = queuelogger.setup_bg_logging(options.logfile, debuglevel)
     else:
         logging.getLogger().setLevel(debuglevel)
+    statslogger = None
+    if options.statslog:
+        start_args['stats_log'] = options.statslog
+        statslogger = queuelogger.setup_stats_logging(options.statslog)
     logging.info("Starting Klippy...")
     git_info = util.get_git_version()
     git_vers = git_info["version"]
@@ -399,6 +454,8 @@ def main():
 
     if bglogger is not None:
         bglogger.stop()
+    if statslogger is not None:
+        statslogger.stop()
 
     if res == 'error_exit':
         sys.exit(-1)
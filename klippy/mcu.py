@@ -3,7 +3,7 @@
 # Copyright (C) 2016-2023  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import sys, os, zlib, logging, math
+import sys, os, zlib, logging, math, threading
 import serialhdl, msgproto, pins, chelper, clocksync
 
 class error(Exception):
@@ -560,8 +560,17 @@ class MCU_analog_endstop:
         self._trdispatch = ffi_main.gc(ffi_lib.trdispatch_alloc(),
                                        ffi_lib.free)
         self._trsyncs = [MCU_trsync(mcu, self._trdispatch)]
+        # Bulk sample capture
+        self._capture_cmd = self._capture_end_cmd = None
+        self._capture_enabled = False
+        self._capture_lock = threading.Lock()
+        self._capture_msgs = []
     def get_mcu(self):
         return self._mcu
+    def setup_capture(self):
+        self._capture_enabled = True
+        self._mcu.register_response(self._handle_capture_data,
+                                    "analog_endstop_data", self._oid)
     def add_stepper(self, stepper):
         trsyncs = {trsync.get_mcu(): trsync for trsync in self._trsyncs}
         trsync = trsyncs.get(stepper.get_mcu())
@@ -605,6 +614,47 @@ class MCU_analog_endstop:
             "analog_endstop_state oid=%c next_clock=%u pin_value=%u "
             "treshold=%u",
             oid=self._oid, cq=cmd_queue)
+        if self._capture_enabled:
+            self._capture_cmd = self._mcu.lookup_command(
+                "analog_endstop_capture oid=%c enable=%c", cq=cmd_queue)
+            self._capture_end_cmd = self._mcu.lookup_query_command(
+                "analog_endstop_capture oid=%c enable=%c",
+                "analog_endstop_capture_status oid=%c next_sequence=%hu"
+                " overflows=%hu", oid=self._oid, cq=cmd_queue)
+    def _handle_capture_data(self, params):
+        with self._capture_lock:
+            self._capture_msgs.append(params)
+    def capture_start(self, print_time):
+        with self._capture_lock:
+            self._capture_msgs = []
+        clock = self._mcu.print_time_to_clock(print_time)
+        self._capture_cmd.send([self._oid, 1], reqclock=clock)
+    def capture_finish(self):
+        # Returns the list of (print_time, value) samples and overflow count
+        if self._mcu.is_fileoutput():
+            return [], 0
+        params = self._capture_end_cmd.send([self._oid, 0])
+        with self._capture_lock:
+            msgs = self._capture_msgs
+            self._capture_msgs = []
+        clock32_to_clock64 = self._mcu.clock32_to_clock64
+        clock_to_print_time = self._mcu.clock_to_print_time
+        samples = []
+        for msg in msgs:
+            data = bytearray(msg['data'])
+            values = [data[i] | (data[i+1] << 8)
+                      for i in range(0, len(data) - 1, 2)]
+            if not values:
+                continue
+            first_time = clock_to_print_time(clock32_to_clock64(msg['clock']))
+            last_time = clock_to_print_time(
+                clock32_to_clock64(msg['last_clock']))
+            interval = 0.
+            if len(values) > 1:
+                interval = (last_time - first_time) / (len(values) - 1)
+            samples.extend([(first_time + i * interval, v)
+                            for i, v in enumerate(values)])
+        return samples, params['overflows']
     def home_start(self, print_time, sample_time, oversample_count, rest_time,
                    treshold):
         clock = self._mcu.print_time_to_clock(print_time)
@@ -705,6 +755,8 @@ class MCU:
         ffi_main, self._ffi_lib = chelper.get_ffi()
         self._max_stepper_error = config.getfloat('max_stepper_error', 0.000025,
                                                   minval=0.)
+        self._adaptive_stepper_error = config.getfloat(
+            'adaptive_max_stepper_error', 0., minval=0.)
         self._reserved_move_slots = 0
         self._stepqueues = []
         self._steppersync = None
@@ -965,6 +1017,8 @@ class MCU:
         return int(time * self._mcu_freq)
     def get_max_stepper_error(self):
         return self._max_stepper_error
+    def get_adaptive_stepper_error(self):
+        return self._adaptive_stepper_error
     # Wrapper functions
     def get_printer(self):
         return self._printer
@@ -1061,16 +1115,8 @@ class MCU:
         return self._is_shutdown
     def get_shutdown_clock(self):
         return self._shutdown_clock
-    def flush_moves(self, print_time):
-        if self._steppersync is None:
-            return
-        clock = self.print_time_to_clock(print_time)
-        if clock < 0:
-            return
-        ret = self._ffi_lib.steppersync_flush(self._steppersync, clock)
-        if ret:
-            raise error("Internal error in MCU '%s' stepcompress"
-                        % (self._name,))
+    def get_steppersync(self):
+        return self._steppersync
     def check_active(self, print_time, eventtime):
         if self._steppersync is None:
             return
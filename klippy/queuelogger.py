@@ -3,7 +3,39 @@
 # Copyright (C) 2016-2019  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import logging, logging.handlers, threading, queue, time
+import logging, logging.handlers, threading, collections, time
+
+MAX_QUEUE_RECORDS = 20000
+
+# Bounded queue of log records.  Adding a record does not take a lock
+# unless the background thread is waiting for new records.
+class LogQueue:
+    def __init__(self, maxsize=MAX_QUEUE_RECORDS):
+        self.records = collections.deque()
+        self.maxsize = maxsize
+        self.wake = threading.Event()
+        self.dropped = 0
+    def put_nowait(self, record):
+        if len(self.records) >= self.maxsize:
+            self.dropped += 1
+            return
+        self.records.append(record)
+        if not self.wake.is_set():
+            self.wake.set()
+    def close(self):
+        self.records.append(None)
+        self.wake.set()
+    def get_all(self):
+        records = self.records
+        while not records:
+            self.wake.clear()
+            if records:
+                break
+            self.wake.wait()
+        return [records.popleft() for i in range(len(records))]
+
+# Message arguments that may be safely formatted in another thread
+IMMUTABLE_ARGS = (str, bytes, int, float, bool, type(None))
 
 # Class to forward all messages through a queue to a background thread
 class QueueHandler(logging.Handler):
@@ -12,10 +44,16 @@ class QueueHandler(logging.Handler):
         self.queue = queue
     def emit(self, record):
         try:
-            self.format(record)
-            record.msg = record.message
-            record.args = None
-            record.exc_info = None
+            args = record.args
+            if record.exc_info is not None or (
+                    args and (type(args) is not tuple
+                              or not all([type(a) in IMMUTABLE_ARGS
+                                          for a in args]))):
+                # Format now as the arguments may change after return
+                self.format(record)
+                record.msg = record.message
+                record.args = None
+                record.exc_info = None
             self.queue.put_nowait(record)
         except Exception:
             self.handleError(record)
@@ -25,18 +63,45 @@ class QueueListener(logging.handlers.TimedRotatingFileHandler):
     def __init__(self, filename):
         logging.handlers.TimedRotatingFileHandler.__init__(
             self, filename, when='midnight', backupCount=5)
-        self.bg_queue = queue.Queue()
+        self.bg_queue = LogQueue()
         self.bg_thread = threading.Thread(target=self._bg_thread)
         self.bg_thread.start()
         self.rollover_info = {}
     def _bg_thread(self):
         while 1:
-            record = self.bg_queue.get(True)
-            if record is None:
+            records = self.bg_queue.get_all()
+            # Records queued after the shutdown marker are discarded
+            is_done = None in records
+            if is_done:
+                records = records[:records.index(None)]
+            self._write_records(records)
+            if is_done:
                 break
-            self.handle(record)
+    def _write_records(self, records):
+        # Format all pending records and write them with a single call
+        self.acquire()
+        try:
+            out = []
+            for record in records:
+                if not self.filter(record):
+                    continue
+                if self.shouldRollover(record):
+                    self.stream.write(''.join(out))
+                    out = []
+                    self.doRollover()
+                try:
+                    out.append(self.format(record) + "\n")
+                except Exception:
+                    self.handleError(record)
+            if out:
+                self.stream.write(''.join(out))
+                self.flush()
+        except Exception:
+            self.handleError(records[-1])
+        finally:
+            self.release()
     def stop(self):
-        self.bg_queue.put_nowait(None)
+        self.bg_queue.close()
         self.bg_thread.join()
     def set_rollover_info(self, name, info):
         if info is None:
@@ -55,7 +120,13 @@ class QueueListener(logging.handlers.TimedRotatingFileHandler):
         self.emit(logging.makeLogRecord(
             {'msg': "\n".join(lines), 'level': logging.INFO}))
 
+# Queue listener for a file of data records (no rollover messages)
+class RecordQueueListener(QueueListener):
+    def doRollover(self):
+        logging.handlers.TimedRotatingFileHandler.doRollover(self)
+
 MainQueueHandler = None
+STATS_LOGGER = "klippy.stats"
 
 def setup_bg_logging(filename, debuglevel):
     global MainQueueHandler
@@ -66,6 +137,20 @@ def setup_bg_logging(filename, debuglevel):
     root.setLevel(debuglevel)
     return ql
 
+def setup_stats_logging(filename):
+    ql = RecordQueueListener(filename)
+    logger = logging.getLogger(STATS_LOGGER)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(QueueHandler(ql.bg_queue))
+    return ql
+
+# Return the number of main log records dropped due to a full queue
+def get_dropped_records():
+    if MainQueueHandler is None:
+        return None
+    return MainQueueHandler.queue.dropped
+
 def clear_bg_logging():
     global MainQueueHandler
     if MainQueueHandler is not None:
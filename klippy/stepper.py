@@ -103,6 +103,10 @@ class MCU_stepper:
         ffi_main, ffi_lib = chelper.get_ffi()
         ffi_lib.stepcompress_fill(self._stepqueue, max_error_ticks,
                                   step_cmd_tag, dir_cmd_tag)
+        adaptive_error = self._mcu.get_adaptive_stepper_error()
+        if adaptive_error > max_error:
+            ffi_lib.stepcompress_set_adaptive_error(
+                self._stepqueue, self._mcu.seconds_to_clock(adaptive_error))
     def get_oid(self):
         return self._oid
     def get_step_dist(self):
@@ -211,7 +215,7 @@ class MCU_stepper:
         return old_tq
     def add_active_callback(self, cb):
         self._active_callbacks.append(cb)
-    def generate_steps(self, flush_time):
+    def generate_steps(self, flush_time, step_batch=None):
         # Check for activity if necessary
         if self._active_callbacks:
             sk = self._stepper_kinematics
@@ -223,6 +227,10 @@ class MCU_stepper:
                     cb(ret)
         # Generate steps
         sk = self._stepper_kinematics
+        if step_batch is not None:
+            # Steps are generated when the batch is flushed
+            step_batch.append(sk)
+            return
         ret = self._itersolve_generate_steps(sk, flush_time)
         if ret:
             raise error("Internal error in stepcompress")
@@ -231,6 +239,36 @@ class MCU_stepper:
         a = axis.encode()
         return ffi_lib.itersolve_is_active_axis(self._stepper_kinematics, a)
 
+# Generate the steps of a batch of steppers (in parallel when the pool
+# has more than one thread)
+class StepGenerationBatch:
+    def __init__(self, printer, num_threads):
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self._pool = ffi_main.gc(ffi_lib.stepgen_pool_alloc(num_threads),
+                                 ffi_lib.stepgen_pool_free)
+        if self._pool == ffi_main.NULL:
+            raise printer.config_error(
+                "Unable to start %d step generation threads"
+                % (num_threads,))
+        self._generate_steps = ffi_lib.stepgen_pool_generate_steps
+        self._sk_list = []
+    def get_pool(self):
+        return self._pool
+    def append(self, sk):
+        self._sk_list.append(sk)
+    def pop_steppers(self):
+        sk_list = self._sk_list
+        self._sk_list = []
+        return sk_list
+    def flush(self, flush_time):
+        sk_list = self.pop_steppers()
+        if not sk_list:
+            return
+        ret = self._generate_steps(self._pool, sk_list, len(sk_list),
+                                   flush_time)
+        if ret:
+            raise error("Internal error in stepcompress")
+
 # Helper code to build a stepper object from a config section
 def PrinterStepper(config, units_in_radians=False):
     printer = config.get_printer()
@@ -407,9 +445,9 @@ class PrinterRail:
     def setup_itersolve(self, alloc_func, *params):
         for stepper in self.steppers:
             stepper.setup_itersolve(alloc_func, *params)
-    def generate_steps(self, flush_time):
+    def generate_steps(self, flush_time, step_batch=None):
         for stepper in self.steppers:
-            stepper.generate_steps(flush_time)
+            stepper.generate_steps(flush_time, step_batch)
     def set_trapq(self, trapq):
         for stepper in self.steppers:
             stepper.set_trapq(trapq)
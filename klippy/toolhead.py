@@ -4,7 +4,7 @@
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
 import math, logging, importlib
-import mcu, chelper, kinematics.extruder
+import mcu, chelper, stepper, kinematics.extruder
 
 # Common suffixes: _d is distance (in mm), _v is velocity (in
 #   mm/second), _v2 is velocity squared (mm^2/s^2), _t is time (in
@@ -195,6 +195,55 @@ DRIP_TIME = 0.100
 class DripModeEndSignal(Exception):
     pass
 
+# Interface to the chelper motion pipeline, which generates the steps
+# of a step generation batch, finalizes the trapqs, and flushes the mcu
+# step queues in one call
+class MotionPipeline(stepper.StepGenerationBatch):
+    def __init__(self, printer, num_threads):
+        stepper.StepGenerationBatch.__init__(self, printer, num_threads)
+        ffi_main, ffi_lib = chelper.get_ffi()
+        self.pipeline = ffi_main.gc(ffi_lib.pipeline_alloc(self.get_pool()),
+                                    ffi_lib.pipeline_free)
+        if self.pipeline == ffi_main.NULL:
+            raise printer.config_error("Unable to allocate motion pipeline")
+        self.pipeline_set_trapqs = ffi_lib.pipeline_set_trapqs
+        self.pipeline_set_steppersyncs = ffi_lib.pipeline_set_steppersyncs
+        self.pipeline_advance = ffi_lib.pipeline_advance
+        self.trapqs = []
+        self.mcus = []
+        self.steppersyncs = []
+    def set_trapqs(self, trapqs):
+        ret = self.pipeline_set_trapqs(self.pipeline, trapqs, len(trapqs))
+        if ret:
+            raise stepper.error("Unable to update motion pipeline trapqs")
+        self.trapqs = trapqs
+    def set_mcus(self, mcus):
+        mcus = [m for m in mcus if m.get_steppersync() is not None]
+        steppersyncs = [m.get_steppersync() for m in mcus]
+        ret = self.pipeline_set_steppersyncs(self.pipeline, steppersyncs,
+                                             len(steppersyncs))
+        if ret:
+            raise stepper.error("Unable to update motion pipeline mcus")
+        self.mcus = mcus
+        self.steppersyncs = steppersyncs
+    def _check_mcus(self):
+        # An mcu frees its steppersync when it disconnects (for example,
+        # during a firmware restart) - stop flushing it
+        for m, ss in zip(self.mcus, self.steppersyncs):
+            if m.get_steppersync() is not ss:
+                self.set_mcus(self.mcus)
+                break
+    def advance(self, flush_time, free_time, move_flush_time):
+        self._check_mcus()
+        sk_list = self.pop_steppers()
+        ret = self.pipeline_advance(self.pipeline, sk_list, len(sk_list),
+                                    flush_time, free_time, move_flush_time)
+        if ret < 0:
+            raise stepper.error("Internal error in stepcompress")
+        if ret:
+            raise mcu.error("Internal error in MCU '%s' stepcompress"
+                            % (self.mcus[ret - 1].get_name(),))
+
 # Main code to track events (and their timing) on the printer toolhead
 class ToolHead:
     def __init__(self, config):
@@ -208,6 +257,8 @@ class ToolHead:
             self.can_pause = False
         self.move_queue = MoveQueue(self)
         self.commanded_pos = [0., 0., 0., 0.]
+        self.printer.register_event_handler("klippy:connect",
+                                            self._handle_connect)
         self.printer.register_event_handler("klippy:shutdown",
                                             self._handle_shutdown)
         # Velocity and acceleration control
@@ -246,7 +297,14 @@ class ToolHead:
         self.trapq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
         self.trapq_append = ffi_lib.trapq_append
         self.trapq_finalize_moves = ffi_lib.trapq_finalize_moves
+        self.trapq_get_merged_moves = ffi_lib.trapq_get_merged_moves
+        self.merge_moves = config.getboolean('merge_collinear_moves', False)
+        ffi_lib.trapq_set_merge_moves(self.trapq, self.merge_moves)
         self.step_generators = []
+        self.batch_step_generators = []
+        num_threads = config.getint('step_generation_threads', 1, minval=1)
+        self.motion_pipeline = MotionPipeline(self.printer, num_threads)
+        self.motion_pipeline.set_trapqs([self.trapq])
         # Create kinematics class
         gcode = self.printer.lookup_object('gcode')
         self.Coord = gcode.Coord
@@ -280,17 +338,17 @@ class ToolHead:
         batch_time = MOVE_BATCH_TIME
         kin_flush_delay = self.kin_flush_delay
         fft = self.force_flush_time
+        pipeline = self.motion_pipeline
         while 1:
             self.print_time = min(self.print_time + batch_time, next_print_time)
             sg_flush_time = max(fft, self.print_time - kin_flush_delay)
             for sg in self.step_generators:
                 sg(sg_flush_time)
+            for sg in self.batch_step_generators:
+                sg(sg_flush_time, pipeline)
             free_time = max(fft, sg_flush_time - kin_flush_delay)
-            self.trapq_finalize_moves(self.trapq, free_time)
-            self.extruder.update_move_time(free_time)
             mcu_flush_time = max(fft, sg_flush_time - self.move_flush_time)
-            for m in self.all_mcus:
-                m.flush_moves(mcu_flush_time)
+            pipeline.advance(sg_flush_time, free_time, mcu_flush_time)
             if self.print_time >= next_print_time:
                 break
     def _calc_print_time(self):
@@ -448,6 +506,7 @@ class ToolHead:
     def set_extruder(self, extruder, extrude_pos):
         self.extruder = extruder
         self.commanded_pos[3] = extrude_pos
+        self.motion_pipeline.set_trapqs([self.trapq, extruder.get_trapq()])
     def get_extruder(self):
         return self.extruder
     # Homing "drip move" handling
@@ -497,8 +556,12 @@ class ToolHead:
         is_active = buffer_time > -60. or not self.special_queuing_state
         if self.special_queuing_state == "Drip":
             buffer_time = 0.
-        return is_active, "print_time=%.3f buffer_time=%.3f print_stall=%d" % (
+        msg = "print_time=%.3f buffer_time=%.3f print_stall=%d" % (
             self.print_time, max(buffer_time, 0.), self.print_stall)
+        if self.merge_moves:
+            msg += " merged_moves=%d" % (
+                self.trapq_get_merged_moves(self.trapq),)
+        return is_active, msg
     def check_busy(self, eventtime):
         est_print_time = self.mcu.estimated_print_time(eventtime)
         lookahead_empty = not self.move_queue.queue
@@ -517,6 +580,8 @@ class ToolHead:
                      'max_accel_to_decel': self.requested_accel_to_decel,
                      'square_corner_velocity': self.square_corner_velocity})
         return res
+    def _handle_connect(self):
+        self.motion_pipeline.set_mcus(self.all_mcus)
     def _handle_shutdown(self):
         self.can_pause = False
         self.move_queue.reset()
@@ -525,7 +590,14 @@ class ToolHead:
     def get_trapq(self):
         return self.trapq
     def register_step_generator(self, handler):
+        # The handler is invoked as handler(flush_time) and must generate
+        # its steps up to flush_time
         self.step_generators.append(handler)
+    def register_batch_step_generator(self, handler):
+        # The handler is invoked as handler(flush_time, step_batch) and
+        # must either generate its steps up to flush_time immediately or
+        # append its stepper_kinematics to the stepper.StepGenerationBatch
+        self.batch_step_generators.append(handler)
     def note_step_generation_scan_time(self, delay, old_delay=0.):
         self.flush_step_generation()
         cur_delay = self.kin_flush_delay
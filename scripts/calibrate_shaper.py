@@ -12,10 +12,14 @@ import numpy as np, matplotlib
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
                              '..', 'klippy'))
 shaper_calibrate = importlib.import_module('.shaper_calibrate', 'extras')
+accel_file = importlib.import_module('.accel_file', 'extras')
 
 MAX_TITLE_LENGTH=65
 
 def parse_log(logname):
+    if accel_file.is_binary_file(logname):
+        # Raw accelerometer data in binary format
+        return accel_file.read_file(logname, np)
     with open(logname) as f:
         for header in f:
             if not header.startswith('#'):
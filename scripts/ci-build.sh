@@ -77,6 +77,14 @@ start_test klippy "Test invoke klippy (Python3)"
 $PYTHON scripts/test_klippy.py -d ${DICTDIR} test/klippy/*.test
 finish_test klippy "Test invoke klippy (Python3)"
 
+start_test klippy "Test step solver (Python3)"
+$PYTHON scripts/test_stepsolver.py
+finish_test klippy "Test step solver (Python3)"
+
+start_test klippy "Test analog probe contact fit (Python3)"
+$PYTHON scripts/test_probe_fit.py
+finish_test klippy "Test analog probe contact fit (Python3)"
+
 start_test klippy "Test invoke klippy (Python2)"
 $PYTHON2 scripts/test_klippy.py -d ${DICTDIR} test/klippy/*.test
 finish_test klippy "Test invoke klippy (Python2)"
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Benchmark extruder step generation with smoothed pressure advance
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, os, optparse, random, time
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import chelper
+import test_stepsolver
+
+MCU_FREQ = 72000000.
+STEP_DIST = .0025
+
+
+# Run the extruder step generation and return (steps, generation time)
+def gen_steps(moves, end_time, pressure_advance, smooth_time, segments):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    tq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    for m in moves:
+        ffi_lib.trapq_append(tq, *m)
+    sk = ffi_main.gc(ffi_lib.extruder_stepper_alloc(), ffi_lib.free)
+    ffi_lib.extruder_set_pressure_advance(sk, pressure_advance, smooth_time)
+    ffi_lib.extruder_set_smooth_segments(sk, segments)
+    sc = ffi_main.gc(ffi_lib.stepcompress_alloc(0), ffi_lib.stepcompress_free)
+    ffi_lib.stepcompress_fill(sc, 0, 1, 2)
+    ffi_lib.itersolve_set_stepcompress(sk, sc, STEP_DIST)
+    ffi_lib.itersolve_set_trapq(sk, tq)
+    data = ffi_main.new('struct pull_history_steps[]',
+                        test_stepsolver.MAX_HISTORY)
+    steps = []
+    last_clock = 0
+    elapsed = 0.
+    with open(os.devnull, 'wb') as f:
+        sq = ffi_lib.serialqueue_alloc(f.fileno(), b'f', 0)
+        ss = ffi_main.gc(ffi_lib.steppersync_alloc(sq, [sc], 1, 1000000),
+                         ffi_lib.steppersync_free)
+        ffi_lib.steppersync_set_time(ss, 0., MCU_FREQ)
+        flush_time = 0.
+        end_time += smooth_time
+        while flush_time < end_time:
+            flush_time = min(flush_time + test_stepsolver.FLUSH_TIME,
+                             end_time)
+            start_time = time.perf_counter()
+            ret = ffi_lib.itersolve_generate_steps(sk, flush_time)
+            elapsed += time.perf_counter() - start_time
+            if ret:
+                raise Exception("Internal error in stepcompress")
+            ret = ffi_lib.steppersync_flush(ss, int(flush_time * MCU_FREQ))
+            if ret:
+                raise Exception("Internal error in steppersync")
+            count = ffi_lib.stepcompress_extract_old(
+                sc, data, test_stepsolver.MAX_HISTORY, last_clock, 1<<63)
+            for i in reversed(range(count)):
+                h = data[i]
+                steps.append((h.first_clock, h.start_position, h.step_count,
+                              h.interval, h.add))
+                last_clock = max(last_clock, h.last_clock)
+        ffi_lib.serialqueue_exit(sq)
+        ffi_lib.serialqueue_free(sq)
+    return steps, elapsed
+
+# Expand queue_step history into (clock, position) steps
+def expand_steps(history):
+    out = []
+    for clock, position, step_count, interval, add in history:
+        sdir = 1 if step_count > 0 else -1
+        for j in range(abs(step_count)):
+            if j:
+                clock += interval + add * j
+            position += sdir
+            out.append((clock, position))
+    return out
+
+# Return the largest clock difference between two step streams and the
+# number of step pairs found in only one of them.  Where the smoothed
+# position only just reaches a step near a direction change, the two
+# methods may disagree on whether that step (and its reversal) is taken.
+def compare_steps(ref, steps):
+    ref, steps = expand_steps(ref), expand_steps(steps)
+    max_diff = extra_pairs = 0
+    i = j = 0
+    while i < len(ref) and j < len(steps):
+        (rc, rp), (c, p) = ref[i], steps[j]
+        if rp == p:
+            max_diff = max(max_diff, abs(rc - c))
+            i += 1
+            j += 1
+            continue
+        # Skip a step that is immediately reversed in one of the streams
+        if i and i + 1 < len(ref) and ref[i + 1][1] == ref[i - 1][1]:
+            i += 2
+        elif j and j + 1 < len(steps) and steps[j + 1][1] == steps[j - 1][1]:
+            j += 2
+        else:
+            return None
+        extra_pairs += 1
+    if i != len(ref) or j != len(steps):
+        return None
+    return max_diff, extra_pairs
+
+######################################################################
+# Startup
+######################################################################
+
+def main():
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-s", "--seeds", type="int", default=5,
+                    help="number of random move sequences")
+    opts.add_option("-m", "--moves", type="int", default=2000,
+                    help="number of moves in each sequence")
+    opts.add_option("-a", "--pressure_advance", type="float", default=.05,
+                    help="pressure_advance")
+    opts.add_option("-t", "--smooth_time", type="float", default=.040,
+                    help="pressure_advance_smooth_time")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    total_steps = 0
+    times = [0., 0.]
+    max_diff = extra_pairs = 0
+    for seed in range(options.seeds):
+        rnd = random.Random(seed)
+        moves, emoves, end_time = test_stepsolver.gen_moves(rnd, options.moves)
+        # Start after the smoothing window of the first move
+        emoves = [(m[0] + 1.,) + m[1:] for m in emoves]
+        res = []
+        for i, segments in enumerate([0, 1]):
+            steps, elapsed = gen_steps(emoves, end_time + 1.,
+                                       options.pressure_advance,
+                                       options.smooth_time, segments)
+            res.append(steps)
+            times[i] += elapsed
+        diff = compare_steps(res[0], res[1])
+        if diff is None:
+            sys.stdout.write("seed=%d: step streams differ\n" % (seed,))
+            sys.exit(-1)
+        max_diff = max(max_diff, diff[0])
+        extra_pairs += diff[1]
+        total_steps += sum([abs(h[2]) for h in res[0]])
+    sys.stdout.write("%d steps (pressure_advance=%.3f smooth_time=%.3f),"
+                     " max clock difference %d, %d reversed step pairs"
+                     " differ\n"
+                     % (total_steps, options.pressure_advance,
+                        options.smooth_time, max_diff, extra_pairs))
+    for name, t in zip(["integrated", "segments"], times):
+        sys.stdout.write("%s: %.3fs (%.0f steps/second)\n"
+                         % (name, t, total_steps / max(t, 1e-9)))
+
+if __name__ == '__main__':
+    main()
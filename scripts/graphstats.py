@@ -4,7 +4,7 @@
 # Copyright (C) 2016-2021  Kevin O'Connor <kevin@koconnor.net>
 #
 # This file may be distributed under the terms of the GNU GPLv3 license.
-import optparse, datetime
+import optparse, datetime, json
 import matplotlib
 
 MAXBANDWIDTH=25000.
@@ -18,12 +18,39 @@ APPLY_PREFIX = [
     'target', 'temp', 'pwm'
 ]
 
+# Load the json records written by klippy's --stats-log option
+def parse_stats_log(f, mcu):
+    apply_prefix = { p: 1 for p in APPLY_PREFIX }
+    out = []
+    for line in f:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        keyparts = {}
+        for prefix, fields in record['stats'].items():
+            if prefix == mcu:
+                prefix = ''
+            for name, val in fields.items():
+                if prefix and name in apply_prefix:
+                    name = prefix + ":" + name
+                keyparts[name] = val
+        if 'print_time' not in keyparts:
+            continue
+        keyparts['#sampletime'] = record['time']
+        out.append(keyparts)
+    f.close()
+    return out
+
 def parse_log(logname, mcu):
     if mcu is None:
         mcu = "mcu"
     mcu_prefix = mcu + ":"
     apply_prefix = { p: 1 for p in APPLY_PREFIX }
     f = open(logname, 'r')
+    if f.read(1) == '{':
+        f.seek(0)
+        return parse_stats_log(f, mcu)
+    f.seek(0)
     out = []
     for line in f:
         parts = line.split()
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# Identify a master/slave heater model from a log and replay controllers
+#
+# Both the recorded controller (its logged slave targets) and the
+# predictive controller are replayed through the model identified from
+# the log, so that the two controllers are compared against the same
+# plant.  The measured response is reported for reference only.
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import importlib, optparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+heaters = importlib.import_module('.heaters', 'extras')
+heater_model = importlib.import_module('.heater_model', 'extras')
+
+SETTLE_DELTA = 1.
+
+######################################################################
+# Log parsing
+######################################################################
+
+# Extract (time, master_temp, slave_temp, slave_target, master_target)
+# samples from the "Stats" lines of a klippy.log file
+def parse_log(logname, master, slave):
+    master_prefix = master + ":"
+    slave_prefix = slave + ":"
+    out = []
+    with open(logname, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0] not in ('Stats', 'INFO:root:Stats'):
+                continue
+            prefix = ""
+            vals = {}
+            for p in parts[2:]:
+                if '=' not in p:
+                    prefix = p
+                    continue
+                name, val = p.split('=', 1)
+                if prefix in (master_prefix, slave_prefix):
+                    vals[prefix + name] = float(val)
+            try:
+                out.append((float(parts[1][:-1]),
+                            vals[master_prefix + 'temp'],
+                            vals[slave_prefix + 'temp'],
+                            vals[slave_prefix + 'target'],
+                            vals[master_prefix + 'target']))
+            except KeyError:
+                continue
+    return out
+
+
+######################################################################
+# Controller replay
+######################################################################
+
+class ReplayConfig:
+    def __init__(self, params):
+        self.params = params
+    def getfloat(self, option, default=None, **kw):
+        return self.params.get(option, default)
+    def getint(self, option, default=None, **kw):
+        return self.params.get(option, default)
+
+# Stand-in for heaters.HeaterMaster that drives the thermal model
+class ReplayHeater:
+    def __init__(self, model, slave_max_temp, master_temp, slave_temp):
+        self.model = model
+        self.slave_max_temp = slave_max_temp
+        self.master_temp = master_temp
+        self.slave_temp = slave_temp
+        self.slave_target = 0.
+    def get_pwm_delay(self):
+        return 1.
+    def get_slave_max_target(self):
+        return self.slave_max_temp - 10
+    def get_slave_temp(self):
+        return self.slave_temp
+    def set_slave_target(self, read_time, slave_temp):
+        self.slave_target = slave_temp
+    def advance(self, dt):
+        self.master_temp, self.slave_temp = self.model.step(
+            self.master_temp, self.slave_temp, self.slave_target, dt)
+
+def calc_response(times, temps, targets):
+    # Report time to reach the last target and the overshoot past it
+    target = targets[-1]
+    start = [t for t, tgt in zip(times, targets) if tgt == target][0]
+    settle = None
+    for t, temp in zip(times, temps):
+        if t >= start and abs(temp - target) <= SETTLE_DELTA:
+            settle = t - start
+            break
+    overshoot = max([0.] + [temp - target for t, temp in zip(times, temps)
+                            if t >= start])
+    return settle, overshoot
+
+# Feed the recorded slave targets through the model
+def replay_recorded(samples, model):
+    t0, master_temp, slave_temp, slave_target, target = samples[0]
+    times, temps, targets = [], [], []
+    last_time = t0
+    for sample_time, m, s, sample_slave_target, target in samples:
+        master_temp, slave_temp = model.step(
+            master_temp, slave_temp, slave_target, sample_time - last_time)
+        slave_target = sample_slave_target
+        last_time = sample_time
+        times.append(sample_time)
+        temps.append(master_temp)
+        targets.append(target)
+    return times, temps, targets
+
+# Run the predictive controller in closed loop against the model
+def replay(samples, model, options):
+    params = {'model_slave_tau': model.slave_tau,
+              'model_master_tau': model.master_tau,
+              'model_loss_tau': model.loss_tau,
+              'model_ambient': model.ambient,
+              'predict_horizon': options.horizon,
+              'max_overshoot': options.overshoot}
+    t0, master_temp, slave_temp, slave_target, target = samples[0]
+    heater = ReplayHeater(model, options.slave_max_temp, master_temp,
+                          slave_temp)
+    control = heaters.ControlPredictive(heater, ReplayConfig(params))
+    times, temps, targets = [], [], []
+    last_time = t0
+    for sample in samples:
+        sample_time, target = sample[0], sample[4]
+        heater.advance(sample_time - last_time)
+        last_time = sample_time
+        control.temperature_update(sample_time, heater.master_temp, target)
+        times.append(sample_time)
+        temps.append(heater.master_temp)
+        targets.append(target)
+    return times, temps, targets
+
+def format_response(name, res):
+    settle, overshoot = res
+    if settle is None:
+        return "%s: target not reached, overshoot %.2f" % (name, overshoot)
+    return "%s: settled in %.1fs, overshoot %.2f" % (name, settle, overshoot)
+
+def main():
+    usage = "%prog [options] <klippy.log> <master heater> <slave heater>"
+    description = ("Identify a thermal model from the Stats lines of a log"
+                   " and replay both the recorded slave targets and the"
+                   " predictive controller through that model. The"
+                   " simulated results compare the controllers against the"
+                   " same model, not against the real heater.")
+    opts = optparse.OptionParser(usage, description=description)
+    opts.add_option("--slave_max_temp", type="float", default=110.,
+                    help="max_temp of the slave heater")
+    opts.add_option("--horizon", type="float", default=120.,
+                    help="prediction horizon (in seconds)")
+    opts.add_option("--overshoot", type="float", default=1.,
+                    help="allowed overshoot (in degrees)")
+    options, args = opts.parse_args()
+    if len(args) != 3:
+        opts.error("Incorrect number of arguments")
+    samples = parse_log(*args)
+    model = heater_model.identify([s[:4] for s in samples])
+    if model is None:
+        opts.error("Unable to identify a thermal model from the log")
+    print("Identified model:")
+    print("model_slave_tau: %.3f" % (model.slave_tau,))
+    print("model_master_tau: %.3f" % (model.master_tau,))
+    print("model_loss_tau: %.3f" % (model.loss_tau,))
+    print("model_ambient: %.3f" % (model.ambient,))
+    times = [s[0] for s in samples]
+    targets = [s[4] for s in samples]
+    if not targets[-1]:
+        return
+    print(format_response("Recorded (measured)", calc_response(
+        times, [s[1] for s in samples], targets)))
+    print(format_response("Recorded (simulated)", calc_response(
+        *replay_recorded(samples, model))))
+    print(format_response("Predictive (simulated)", calc_response(
+        *replay(samples, model, options))))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# Calculate heater PID parameters from recorded temperature traces
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import importlib, optparse, os, sys
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+pid_calibrate = importlib.import_module('.pid_calibrate', 'extras')
+
+# Extract (time, temp, pwm) samples for a heater from klippy.log
+# "Stats" lines
+def parse_log(logname, heater):
+    prefix = heater + ":"
+    out = []
+    with open(logname, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if not parts or parts[0] not in ('Stats', 'INFO:root:Stats'):
+                continue
+            if prefix not in parts:
+                continue
+            vals = {}
+            for p in parts[parts.index(prefix)+1:]:
+                if '=' not in p:
+                    break
+                name, val = p.split('=', 1)
+                vals[name] = val
+            if 'temp' in vals and 'pwm' in vals:
+                out.append((float(parts[1][:-1]), float(vals['temp']),
+                            float(vals['pwm'])))
+    return out
+
+# Extract (time, temp, pwm) samples from a PID_CALIBRATE WRITE_FILE=1
+# capture (/tmp/heattest.txt)
+def parse_heattest(logname):
+    pwm_samples = []
+    temp_samples = []
+    with open(logname, 'r') as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if parts[0] == 'pwm:':
+                pwm_samples.append((float(parts[1]), float(parts[2])))
+            else:
+                temp_samples.append((float(parts[0]), float(parts[1])))
+    out = []
+    pwm_pos = -1
+    for t, temp in temp_samples:
+        while (pwm_pos + 1 < len(pwm_samples)
+               and pwm_samples[pwm_pos+1][0] <= t):
+            pwm_pos += 1
+        pwm = pwm_samples[pwm_pos][1] if pwm_pos >= 0 else 0.
+        out.append((t, temp, pwm))
+    return out
+
+def main():
+    usage = "%prog [options] <logfile> [<logfile> ...]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("--heater", type="string", dest="heater",
+                    default="extruder", help="name of heater in Stats lines")
+    opts.add_option("--heattest", action="store_true",
+                    help="logs are PID_CALIBRATE WRITE_FILE=1 captures")
+    opts.add_option("--dt", type="float", default=1.,
+                    help="resampling interval (in seconds)")
+    opts.add_option("--max_dead_time", type="float", default=60.,
+                    help="longest dead time to consider (in seconds)")
+    opts.add_option("--max_gap", type="float", default=10.,
+                    help="time gap (in seconds) that starts a new trace")
+    options, args = opts.parse_args()
+    if len(args) < 1:
+        opts.error("Incorrect number of arguments")
+    for logname in args:
+        if options.heattest:
+            samples = parse_heattest(logname)
+        else:
+            samples = parse_log(logname, options.heater)
+        if not any([pwm for t, temp, pwm in samples]):
+            print("%s: no heating activity found" % (logname,))
+            continue
+        model = pid_calibrate.identify_heater(samples, options.dt,
+                                              options.max_dead_time,
+                                              options.max_gap)
+        if model is None:
+            print("%s: unable to identify heater model" % (logname,))
+            continue
+        gain, tau, dead_time = model
+        Kp, Ki, Kd = pid_calibrate.calc_model_pid(gain, tau, dead_time)
+        print("%s: gain=%.1f time_constant=%.1f dead_time=%.1f"
+              " pid_Kp=%.3f pid_Ki=%.3f pid_Kd=%.3f"
+              % (logname, gain, tau, dead_time, Kp, Ki, Kd))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# Benchmark step compression using recorded or synthetic step times
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, os, optparse, time
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             'motan'))
+import chelper, readlog
+
+MAX_HISTORY = 100000
+FLUSH_TIME = 0.500
+DEFAULT_MCU_FREQ = 72000000.
+
+
+######################################################################
+# Step time sources
+######################################################################
+
+# Group a list of (clock, sdir) steps into runs of [sdir, [clocks]]
+def add_step(runs, clock, sdir):
+    if not runs or runs[-1][0] != sdir:
+        runs.append([sdir, []])
+    runs[-1][1].append(clock)
+
+# Expand the "stepq" messages of a data_logger.py log into step clocks
+def load_log(log_prefix, names):
+    reader = readlog.JsonLogReader(log_prefix + ".json.gz")
+    steppers = {}
+    while 1:
+        jmsg = reader.pull_msg()
+        if jmsg is None:
+            break
+        qid = jmsg.get('q', '')
+        if not qid.startswith('stepq:'):
+            continue
+        name = qid[len('stepq:'):]
+        if names and name not in names:
+            continue
+        params = jmsg['params']
+        if not params['data']:
+            continue
+        info = steppers.setdefault(name, {'mcu_freq': None, 'runs': []})
+        cdiff = params['last_clock'] - params['first_clock']
+        tdiff = params['last_step_time'] - params['first_step_time']
+        if info['mcu_freq'] is None and cdiff and tdiff > 0.:
+            info['mcu_freq'] = round(cdiff / tdiff, -3)
+        runs = info['runs']
+        clock = params['first_clock'] - params['data'][0][0]
+        for interval, count, add in params['data']:
+            sdir = 1 if count > 0 else 0
+            for i in range(abs(count)):
+                clock += interval
+                interval += add
+                add_step(runs, clock, sdir)
+    out = []
+    for name, info in sorted(steppers.items()):
+        out.append((name, info['mcu_freq'] or DEFAULT_MCU_FREQ, info['runs']))
+    return out
+
+# Generate back and forth moves of a stepper at a high step rate
+def gen_synthetic(options):
+    mcu_freq = DEFAULT_MCU_FREQ
+    step_dist = options.rotation_distance / (200. * options.microsteps)
+    velocity, accel = options.velocity, options.accel
+    accel_t = velocity / accel
+    accel_d = .5 * velocity * accel_t
+    move_d = max(options.distance, 2. * accel_d)
+    cruise_t = (move_d - 2. * accel_d) / velocity
+    move_t = 2. * accel_t + cruise_t
+    steps = int(move_d / step_dist)
+    runs = []
+    print_time = .100
+    for i in range(options.moves):
+        clocks = []
+        for s in range(1, steps + 1):
+            d = s * step_dist
+            if d < accel_d:
+                t = (2. * d / accel)**.5
+            elif d < move_d - accel_d:
+                t = accel_t + (d - accel_d) / velocity
+            else:
+                t = move_t - (2. * max(0., move_d - d) / accel)**.5
+            clocks.append(int((print_time + t) * mcu_freq))
+        runs.append([(i + 1) & 1, clocks])
+        print_time += move_t + .050
+    return [("synthetic", mcu_freq, runs)]
+
+
+######################################################################
+# Step compression replay
+######################################################################
+
+# Split runs into (sdir, clock array, count) chunks of about FLUSH_TIME
+def build_chunks(runs, mcu_freq):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    flush_clocks = int(FLUSH_TIME * mcu_freq)
+    chunks = []
+    for sdir, clocks in runs:
+        pos = 0
+        while pos < len(clocks):
+            end = pos + 1
+            limit = clocks[pos] + flush_clocks
+            while end < len(clocks) and clocks[end] < limit:
+                end += 1
+            part = clocks[pos:end]
+            chunks.append((sdir, ffi_main.new('uint64_t[]', part), len(part),
+                           part[0]))
+            pos = end
+    return chunks
+
+# Run step times through stepcompress and return (messages, run time)
+def replay(runs, mcu_freq, max_error):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    chunks = build_chunks(runs, mcu_freq)
+    sc = ffi_main.gc(ffi_lib.stepcompress_alloc(0), ffi_lib.stepcompress_free)
+    ffi_lib.stepcompress_fill(sc, int(max_error * mcu_freq), 1, 2)
+    data = ffi_main.new('struct pull_history_steps[]', MAX_HISTORY)
+    messages = last_clock = 0
+    elapsed = 0.
+    with open(os.devnull, 'wb') as f:
+        sq = ffi_lib.serialqueue_alloc(f.fileno(), b'f', 0)
+        ss = ffi_main.gc(ffi_lib.steppersync_alloc(sq, [sc], 1, 1000000),
+                         ffi_lib.steppersync_free)
+        ffi_lib.steppersync_set_time(ss, 0., mcu_freq)
+        # Flush each chunk once the next chunk has been queued (the
+        # host normally generates steps ahead of the flush time)
+        flush_clocks = [c[3] for c in chunks[1:]] + [1<<63]
+        for (sdir, clocks, count, start), flush_clock in zip(chunks,
+                                                             flush_clocks):
+            start_time = time.perf_counter()
+            ret = ffi_lib.stepcompress_append_clocks(sc, sdir, clocks, count)
+            if not ret:
+                ret = ffi_lib.steppersync_flush(ss, flush_clock)
+            elapsed += time.perf_counter() - start_time
+            if ret:
+                raise Exception("Internal error in stepcompress")
+            # Count queue_step messages (history expires after a while)
+            count = ffi_lib.stepcompress_extract_old(
+                sc, data, MAX_HISTORY, last_clock, 1<<63)
+            messages += count
+            if count:
+                last_clock = data[0].last_clock
+        ffi_lib.serialqueue_exit(sq)
+        ffi_lib.serialqueue_free(sq)
+    return messages, elapsed
+
+
+######################################################################
+# Startup
+######################################################################
+
+def main():
+    usage = "%prog [options] <data_logger log prefix>"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-e", "--max_error", type="float", default=.000025,
+                    help="max_stepcompress_error (in seconds)")
+    opts.add_option("-n", "--stepper", action="append", dest="steppers",
+                    default=[], help="only replay the given stepper")
+    opts.add_option("-s", "--synthetic", action="store_true",
+                    help="generate step times instead of reading a log")
+    opts.add_option("--microsteps", type="int", default=256,
+                    help="synthetic stepper microsteps")
+    opts.add_option("--rotation_distance", type="float", default=40.,
+                    help="synthetic stepper rotation distance")
+    opts.add_option("--velocity", type="float", default=500.,
+                    help="synthetic move velocity")
+    opts.add_option("--accel", type="float", default=10000.,
+                    help="synthetic move acceleration")
+    opts.add_option("--distance", type="float", default=200.,
+                    help="synthetic move distance")
+    opts.add_option("--moves", type="int", default=8,
+                    help="number of synthetic moves")
+    options, args = opts.parse_args()
+    if options.synthetic:
+        if args:
+            opts.error("Incorrect number of arguments")
+        steppers = gen_synthetic(options)
+    else:
+        if len(args) != 1:
+            opts.error("Incorrect number of arguments")
+        steppers = load_log(args[0], options.steppers)
+        if not steppers:
+            opts.error("No step data found in log")
+    total_steps = total_messages = 0
+    total_time = 0.
+    for name, mcu_freq, runs in steppers:
+        steps = sum([len(clocks) for sdir, clocks in runs])
+        messages, elapsed = replay(runs, mcu_freq, options.max_error)
+        total_steps += steps
+        total_messages += messages
+        total_time += elapsed
+        print("%s: %d steps, %d queue_step messages (%.5f messages/step),"
+              " %.0f steps/second" % (name, steps, messages,
+                                      messages / max(steps, 1),
+                                      steps / max(elapsed, 1e-9)))
+    if len(steppers) > 1:
+        print("total: %d steps, %d queue_step messages (%.5f messages/step),"
+              " %.0f steps/second" % (total_steps, total_messages,
+                                      total_messages / max(total_steps, 1),
+                                      total_steps / max(total_time, 1e-9)))
+
+if __name__ == '__main__':
+    main()
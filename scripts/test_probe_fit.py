@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Check the analog probe contact fit against synthetic trigger curves
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, os, random
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+from extras import probe_analog
+
+SAMPLE_TIME = 0.000100
+
+# Produce (time, adc_value) samples of a flat baseline followed by a
+# ramp starting at contact_time
+def gen_curve(rnd, start_time, contact_time, count, base, slope, noise):
+    samples = []
+    for i in range(count):
+        t = start_time + i * SAMPLE_TIME
+        v = base + max(0., t - contact_time) * slope
+        samples.append((t, v + rnd.gauss(0., noise)))
+    return samples
+
+# Test cases: (description, contact sample position, sample count,
+# baseline, slope, noise, allowed contact time error)
+TESTS = [
+    ("exact curve", 60, 100, 1000., 200000., 0., .000000001),
+    ("early contact", 10, 100, 1000., 200000., 0., .000000001),
+    ("late contact", 90, 100, 1000., 200000., 0., .000000001),
+    ("noisy curve", 60, 100, 1000., 200000., 1., SAMPLE_TIME),
+    ("slow ramp", 50, 200, 3000., 20000., .5, 2. * SAMPLE_TIME),
+]
+
+def check_contact(desc, samples, contact_time, tolerance):
+    res = probe_analog.fit_contact(samples)
+    if res is None:
+        sys.stdout.write("%s: no fit\n" % (desc,))
+        return 1
+    fit_time, slope, rms = res
+    if abs(fit_time - contact_time) > tolerance:
+        sys.stdout.write("%s: contact %.9f expected %.9f\n"
+                         % (desc, fit_time, contact_time))
+        return 1
+    return 0
+
+def main():
+    rnd = random.Random(0)
+    failures = 0
+    start_time = 12.345
+    for desc, pos, count, base, slope, noise, tolerance in TESTS:
+        contact_time = start_time + (pos + .5) * SAMPLE_TIME
+        samples = gen_curve(rnd, start_time, contact_time, count,
+                            base, slope, noise)
+        failures += check_contact(desc, samples, contact_time, tolerance)
+    # Curves that can not be fit
+    if probe_analog.fit_contact([(0., 1.)] * 9) is not None:
+        sys.stdout.write("short capture: unexpected fit\n")
+        failures += 1
+    falling = gen_curve(rnd, start_time, start_time + .005, 100,
+                        1000., -200000., 0.)
+    if probe_analog.fit_contact(falling) is not None:
+        sys.stdout.write("falling curve: unexpected fit\n")
+        failures += 1
+    if failures:
+        sys.stdout.write("%d probe fit failures\n" % (failures,))
+        sys.exit(-1)
+    sys.stdout.write("All %d probe fit tests passed\n" % (len(TESTS) + 2,))
+
+if __name__ == '__main__':
+    main()
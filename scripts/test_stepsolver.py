@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# Check that the analytic step solver matches the iterative solver
+#
+# Copyright (C) 2026  agent <agent@local>
+#
+# This file may be distributed under the terms of the GNU GPLv3 license.
+import sys, os, optparse, random, bisect
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                             '..', 'klippy'))
+import chelper
+
+MAX_HISTORY = 100000
+FLUSH_TIME = 0.500
+# The iterative solver accepts a step time once it is known to within
+# 1ns or once the stepper position is within 1nm of the step position
+SOLVER_TIME_TOLERANCE = .000000001
+SOLVER_DIST_TOLERANCE = .000000001
+
+# Kinematic setups: (name, alloc function name, alloc parameter,
+# stepper position coefficients of the x, y, and z axes)
+KINEMATICS = [
+    ('cartesian_x', 'cartesian_stepper_alloc', b'x', (1., 0., 0.)),
+    ('cartesian_y', 'cartesian_stepper_alloc', b'y', (0., 1., 0.)),
+    ('cartesian_z', 'cartesian_stepper_alloc', b'z', (0., 0., 1.)),
+    ('cartesian_reverse_x', 'cartesian_reverse_stepper_alloc', b'x',
+     (-1., 0., 0.)),
+    ('corexy_plus', 'corexy_stepper_alloc', b'+', (1., 1., 0.)),
+    ('corexy_minus', 'corexy_stepper_alloc', b'-', (1., -1., 0.)),
+    ('corexz_plus', 'corexz_stepper_alloc', b'+', (1., 0., 1.)),
+    ('corexz_minus', 'corexz_stepper_alloc', b'-', (1., 0., -1.)),
+    ('extruder', 'extruder_stepper_alloc', None, (1., 0., 0.)),
+]
+
+
+######################################################################
+# Move generation
+######################################################################
+
+# Produce lists of trapq_append() parameters for the toolhead and for
+# the extruder (which uses negative velocities for retractions)
+def gen_moves(rnd, count):
+    moves = []
+    emoves = []
+    print_time = 0.100
+    pos = [0., 0., 0.]
+    epos = 0.
+    for i in range(count):
+        # Pick a move direction (with occasional single axis moves)
+        axes_d = [rnd.uniform(-1., 1.) for j in range(3)]
+        if rnd.random() < .3:
+            keep = rnd.randrange(3)
+            axes_d = [d if j == keep else 0. for j, d in enumerate(axes_d)]
+        move_d = rnd.choice([.001, .01, .1, 1., 10., 50.]) * rnd.random()
+        norm = sum([d*d for d in axes_d])**.5
+        if not norm or not move_d:
+            continue
+        axes_r = [d / norm for d in axes_d]
+        accel = rnd.choice([100., 1000., 3000., 10000.])
+        cruise_v = rnd.choice([1., 5., 25., 100., 300.])
+        start_v = rnd.choice([0., 0., cruise_v * rnd.random()])
+        end_v = rnd.choice([0., 0., cruise_v * rnd.random()])
+        # Limit velocities to what can be reached over move_d
+        max_v2 = min(start_v**2, end_v**2) + accel * move_d
+        cruise_v = min(cruise_v, max_v2**.5)
+        start_v = min(start_v, cruise_v)
+        end_v = min(end_v, cruise_v)
+        accel_t = (cruise_v - start_v) / accel
+        decel_t = (cruise_v - end_v) / accel
+        accel_d = (start_v + cruise_v) * .5 * accel_t
+        decel_d = (end_v + cruise_v) * .5 * decel_t
+        cruise_t = max(0., move_d - accel_d - decel_d) / cruise_v
+        moves.append((print_time, accel_t, cruise_t, decel_t,
+                      pos[0], pos[1], pos[2], axes_r[0], axes_r[1], axes_r[2],
+                      start_v, cruise_v, accel))
+        esign = -1. if axes_r[0] < 0. else 1.
+        emoves.append((print_time, accel_t, cruise_t, decel_t,
+                       epos, 0., 0., 1., 1., 0.,
+                       esign * start_v, esign * cruise_v, esign * accel))
+        print_time += accel_t + cruise_t + decel_t
+        pos = [p + r * move_d for p, r in zip(pos, axes_r)]
+        epos += esign * move_d
+        if rnd.random() < .2:
+            print_time += rnd.choice([.0001, .001, .1])
+    return moves, emoves, print_time
+
+# Produce a list of trapq_append() parameters for straight lines that
+# are each split into several pieces (as a slicer would split a line
+# into short collinear segments).  Each piece covers part of a single
+# acceleration, cruise, or deceleration phase of the line.  Lines may
+# be joined at a non-zero velocity and may continue in an almost
+# identical direction, so that the trapq must also reject moves that
+# are not collinear.
+def gen_split_moves(rnd, count):
+    moves = []
+    print_time = 0.100
+    pos = [0., 0., 0.]
+    axes_r = [1., 0., 0.]
+    start_v = 0.
+    for i in range(count):
+        if start_v and rnd.random() < .5:
+            axes_d = [r + rnd.choice([0., .001, .1]) * rnd.random()
+                      for r in axes_r]
+        else:
+            axes_d = [rnd.uniform(-1., 1.) for j in range(3)]
+        norm = sum([d*d for d in axes_d])**.5
+        if not norm:
+            continue
+        axes_r = [d / norm for d in axes_d]
+        accel = rnd.choice([100., 1000., 3000., 10000.])
+        if start_v and rnd.random() < .5:
+            cruise_v = start_v
+        else:
+            cruise_v = max(start_v, rnd.choice([5., 25., 100., 300.]))
+        end_v = rnd.choice([0., cruise_v])
+        accel_t = (cruise_v - start_v) / accel
+        decel_t = (cruise_v - end_v) / accel
+        accel_d = .5 * (start_v + cruise_v) * accel_t
+        decel_d = .5 * (end_v + cruise_v) * decel_t
+        move_d = max(rnd.choice([.1, 1., 10., 50.]) * rnd.uniform(.1, 1.),
+                     accel_d + decel_d)
+        cruise_t = (move_d - accel_d - decel_d) / cruise_v
+        phases = [(accel_t, accel, start_v), (cruise_t, 0., cruise_v),
+                  (decel_t, -accel, cruise_v)]
+        dist = 0.
+        for phase_t, phase_accel, v in phases:
+            if not phase_t:
+                continue
+            pieces = rnd.randrange(1, 8)
+            piece_t = phase_t / pieces
+            for j in range(pieces):
+                start_pos = [p + r * dist for p, r in zip(pos, axes_r)]
+                end_v = v + phase_accel * piece_t
+                if phase_accel > 0.:
+                    times, vels = (piece_t, 0., 0.), (v, end_v, phase_accel)
+                elif phase_accel < 0.:
+                    times, vels = (0., 0., piece_t), (v, v, -phase_accel)
+                else:
+                    times, vels = (0., piece_t, 0.), (v, v, accel)
+                moves.append((print_time,) + times + tuple(start_pos)
+                             + tuple(axes_r) + vels)
+                dist += .5 * (v + end_v) * piece_t
+                v = end_v
+                print_time += piece_t
+        pos = [p + r * dist for p, r in zip(pos, axes_r)]
+        start_v = max(0., v)
+        if start_v < .000001:
+            start_v = 0.
+            if rnd.random() < .2:
+                print_time += rnd.choice([.0001, .001, .1])
+    return moves, print_time
+
+
+######################################################################
+# Step generation
+######################################################################
+
+# Run the step generation and return the resulting queue_step history
+def gen_steps(kin, moves, end_time, step_dist, mcu_freq, iterative_only,
+              merge_moves=0):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    name, alloc_func, param, coeffs = kin
+    tq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    ffi_lib.trapq_set_merge_moves(tq, merge_moves)
+    for m in moves:
+        ffi_lib.trapq_append(tq, *m)
+    if param is None:
+        sk = getattr(ffi_lib, alloc_func)()
+    else:
+        sk = getattr(ffi_lib, alloc_func)(param)
+    sk = ffi_main.gc(sk, ffi_lib.free)
+    ffi_lib.itersolve_set_iterative_only(sk, iterative_only)
+    sc = ffi_main.gc(ffi_lib.stepcompress_alloc(0), ffi_lib.stepcompress_free)
+    # Use a max_error of zero so that every step clock is preserved
+    ffi_lib.stepcompress_fill(sc, 0, 1, 2)
+    ffi_lib.itersolve_set_stepcompress(sk, sc, step_dist)
+    ffi_lib.itersolve_set_trapq(sk, tq)
+    data = ffi_main.new('struct pull_history_steps[]', MAX_HISTORY)
+    steps = []
+    last_clock = 0
+    with open(os.devnull, 'wb') as f:
+        sq = ffi_lib.serialqueue_alloc(f.fileno(), b'f', 0)
+        ss = ffi_main.gc(ffi_lib.steppersync_alloc(sq, [sc], 1, 1000000),
+                         ffi_lib.steppersync_free)
+        ffi_lib.steppersync_set_time(ss, 0., mcu_freq)
+        flush_time = 0.
+        while flush_time < end_time:
+            flush_time = min(flush_time + FLUSH_TIME, end_time)
+            ret = ffi_lib.itersolve_generate_steps(sk, flush_time)
+            if ret:
+                raise Exception("Internal error in stepcompress")
+            ret = ffi_lib.steppersync_flush(ss, int(flush_time * mcu_freq))
+            if ret:
+                raise Exception("Internal error in steppersync")
+            # Expand new queue_step commands into (clock, position) steps
+            count = ffi_lib.stepcompress_extract_old(
+                sc, data, MAX_HISTORY, last_clock, 1<<63)
+            for i in reversed(range(count)):
+                h = data[i]
+                clock, position = h.first_clock, h.start_position
+                sdir = 1 if h.step_count > 0 else -1
+                for j in range(abs(h.step_count)):
+                    if j:
+                        clock += h.interval + h.add * j
+                    position += sdir
+                    steps.append((clock, position))
+                last_clock = max(last_clock, h.last_clock)
+        ffi_lib.serialqueue_exit(sq)
+        ffi_lib.serialqueue_free(sq)
+    return steps
+
+# Return the stepper velocity at the given time
+def calc_stepper_velocity(moves, move_times, coeffs, print_time):
+    pos = bisect.bisect_right(move_times, print_time) - 1
+    if pos < 0:
+        return 0.
+    (move_time, accel_t, cruise_t, decel_t, sx, sy, sz, rx, ry, rz,
+     start_v, cruise_v, accel) = moves[pos]
+    t = print_time - move_time
+    if t < accel_t:
+        v = start_v + accel * t
+    elif t < accel_t + cruise_t:
+        v = cruise_v
+    elif t < accel_t + cruise_t + decel_t:
+        v = cruise_v - accel * (t - accel_t - cruise_t)
+    else:
+        return 0.
+    return abs(v * (coeffs[0] * rx + coeffs[1] * ry + coeffs[2] * rz))
+
+# Return the allowed clock difference of each step of a step stream
+def calc_clock_tolerance(steps, moves, coeffs, mcu_freq):
+    move_times = [m[0] for m in moves]
+    out = []
+    for clock, position in steps:
+        v = calc_stepper_velocity(moves, move_times, coeffs, clock / mcu_freq)
+        if v < SOLVER_DIST_TOLERANCE:
+            out.append(None)
+            continue
+        tol_t = SOLVER_TIME_TOLERANCE + SOLVER_DIST_TOLERANCE / v
+        out.append(1 + int(tol_t * mcu_freq))
+    return out
+
+def run_test(seed, count):
+    rnd = random.Random(seed)
+    moves, emoves, end_time = gen_moves(rnd, count)
+    step_dist = rnd.choice([.0025, .00625, .0125, .025])
+    mcu_freq = rnd.choice([16000000., 72000000., 180000000.])
+    failures = total = exact = 0
+    for kin in KINEMATICS:
+        kin_moves = emoves if kin[2] is None else moves
+        fast = gen_steps(kin, kin_moves, end_time, step_dist, mcu_freq, 0)
+        ref = gen_steps(kin, kin_moves, end_time, step_dist, mcu_freq, 1)
+        tolerance = calc_clock_tolerance(ref, kin_moves, kin[3], mcu_freq)
+        bad = [i for i, (f, r, tol) in enumerate(zip(fast, ref, tolerance))
+               if f[1] != r[1] or (tol is not None and abs(f[0] - r[0]) > tol)]
+        if bad or len(fast) != len(ref):
+            first = bad[0] if bad else min(len(fast), len(ref))
+            sys.stdout.write("seed=%d %s step_dist=%.5f freq=%d: step"
+                             " streams differ (%d vs %d steps, first"
+                             " difference at step %d)\n"
+                             % (seed, kin[0], step_dist, mcu_freq,
+                                len(fast), len(ref), first))
+            failures += 1
+        total += len(ref)
+        exact += len([1 for f, r in zip(fast, ref) if f == r])
+    return failures, total, exact
+
+# Check that merging collinear moves in the trapq does not change the
+# generated steps
+def run_merge_test(seed, count):
+    rnd = random.Random(seed)
+    moves, end_time = gen_split_moves(rnd, count)
+    step_dist = rnd.choice([.0025, .00625, .0125, .025])
+    mcu_freq = rnd.choice([16000000., 72000000., 180000000.])
+    failures = 0
+    for kin in KINEMATICS:
+        if kin[2] is None:
+            continue
+        merged = gen_steps(kin, moves, end_time, step_dist, mcu_freq, 0, 1)
+        ref = gen_steps(kin, moves, end_time, step_dist, mcu_freq, 0, 0)
+        # Both streams are only accurate to within the solver tolerance
+        tolerance = calc_clock_tolerance(ref, moves, kin[3], mcu_freq)
+        bad = [i for i, (m, r, tol) in enumerate(zip(merged, ref, tolerance))
+               if m[1] != r[1]
+               or (tol is not None and abs(m[0] - r[0]) > 2 * tol)]
+        if bad or len(merged) != len(ref):
+            first = bad[0] if bad else min(len(merged), len(ref))
+            sys.stdout.write("seed=%d %s step_dist=%.5f freq=%d: merged"
+                             " step stream differs (%d vs %d steps, first"
+                             " difference at step %d)\n"
+                             % (seed, kin[0], step_dist, mcu_freq,
+                                len(merged), len(ref), first))
+            failures += 1
+    return failures
+
+# Return the number of trapq moves merged for a list of moves
+def count_merged_moves(moves):
+    ffi_main, ffi_lib = chelper.get_ffi()
+    tq = ffi_main.gc(ffi_lib.trapq_alloc(), ffi_lib.trapq_free)
+    ffi_lib.trapq_set_merge_moves(tq, 1)
+    for m in moves:
+        ffi_lib.trapq_append(tq, *m)
+    return ffi_lib.trapq_get_merged_moves(tq)
+
+
+######################################################################
+# Startup
+######################################################################
+
+def main():
+    # The defaults are a quick check (as run by the CI build); use
+    # something like "-s 10 -m 100" for a fuller sweep
+    usage = "%prog [options]"
+    opts = optparse.OptionParser(usage)
+    opts.add_option("-s", "--seeds", type="int", dest="seeds", default=3,
+                    help="number of random move sequences to test")
+    opts.add_option("-m", "--moves", type="int", dest="moves", default=30,
+                    help="number of moves in each sequence")
+    options, args = opts.parse_args()
+    if args:
+        opts.error("Incorrect number of arguments")
+    failures = total = exact = 0
+    for seed in range(options.seeds):
+        f, t, e = run_test(seed, options.moves)
+        failures += f
+        total += t
+        exact += e
+    merged = 0
+    for seed in range(options.seeds):
+        failures += run_merge_test(seed, options.moves)
+        rnd = random.Random(seed)
+        merged += count_merged_moves(gen_split_moves(rnd, options.moves)[0])
+    if not merged:
+        sys.stdout.write("No collinear moves were merged\n")
+        failures += 1
+    if failures:
+        sys.stdout.write("%d step stream mismatches\n" % (failures,))
+        sys.exit(-1)
+    sys.stdout.write("All %d step solver tests passed (%d steps, %.3f%%"
+                     " with identical clock)\n"
+                     % (options.seeds * len(KINEMATICS), total,
+                        100. * exact / max(total, 1)))
+    sys.stdout.write("Merged collinear moves match unmerged moves"
+                     " (%d moves merged)\n" % (merged,))
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@
 //
 // This file may be distributed under the terms of the GNU GPLv3 license.
 
+#include <string.h> // memcpy
 #include "basecmd.h" // oid_alloc
 #include "board/gpio.h" // struct gpio_adc
 #include "board/irq.h" // irq_disable
@@ -146,10 +147,51 @@ struct analog_endstop {
     uint8_t invalid_count, range_check_count;
     struct trsync *ts;
     uint8_t oversample_count, trigger_reason;
+    // Bulk capture of the samples taken during a homing move
+    uint32_t first_clock, last_clock;
+    uint16_t sequence, overflows;
+    uint8_t flags, data_count;
+    uint8_t data[48];
 };
 
+enum { AE_CAPTURE = 1<<0, AE_PENDING = 1<<1 };
+
+static struct task_wake analog_endstop_wake;
+
 static uint_fast8_t analog_endstop_oversample_event(struct timer *t);
 
+// Store a sample in the capture buffer (called from timer context)
+static void
+analog_endstop_capture(struct analog_endstop *a, uint16_t value)
+{
+    if (!(a->flags & AE_CAPTURE))
+        return;
+    if (a->flags & AE_PENDING) {
+        // Previous block not yet reported - drop this sample
+        a->overflows++;
+        return;
+    }
+    if (!a->data_count)
+        a->first_clock = a->timer.waketime;
+    a->last_clock = a->timer.waketime;
+    a->data[a->data_count++] = value;
+    a->data[a->data_count++] = value >> 8;
+    if (a->data_count + 2 > ARRAY_SIZE(a->data)) {
+        a->flags |= AE_PENDING;
+        sched_wake_task(&analog_endstop_wake);
+    }
+}
+
+// Request the report of a partially filled capture buffer
+static void
+analog_endstop_capture_flush(struct analog_endstop *a)
+{
+    if (a->data_count) {
+        a->flags |= AE_PENDING;
+        sched_wake_task(&analog_endstop_wake);
+    }
+}
+
 // Timer callback for an analog end stop
 static uint_fast8_t
 analog_endstop_event(struct timer *t)
@@ -161,7 +203,7 @@ analog_endstop_event(struct timer *t)
         return SF_RESCHEDULE;
     }
     uint16_t value = gpio_adc_read(a->pin);
-
+    analog_endstop_capture(a, value);
 
     uint32_t nextwake = a->timer.waketime + a->rest_time;
     if (value < a->treshold) {
@@ -195,6 +237,7 @@ analog_endstop_oversample_event(struct timer *t)
     uint8_t count = a->oversample_count - 1;
     if (!count) {
         trsync_do_trigger(a->ts, a->trigger_reason);
+        analog_endstop_capture_flush(a);
         return SF_DONE;
     }
     a->oversample_count = count;
@@ -226,6 +269,7 @@ command_analog_endstop_home(uint32_t *args)
     if (! e->oversample_count){
         // disable endstop checking
         e->ts = NULL;
+        analog_endstop_capture_flush(e);
         return;
     }
     e->rest_time = args[4];
@@ -261,3 +305,65 @@ command_analog_endstop_query_state(uint32_t *args)
 }
 DECL_COMMAND(command_analog_endstop_query_state,
     "analog_endstop_query_state oid=%c");
+
+// Report a block of captured samples if one is pending
+static void
+analog_endstop_report(struct analog_endstop *e, uint8_t oid)
+{
+    uint8_t data[ARRAY_SIZE(e->data)];
+    irq_disable();
+    if (!(e->flags & AE_PENDING)) {
+        irq_enable();
+        return;
+    }
+    uint_fast8_t data_count = e->data_count;
+    uint32_t first_clock = e->first_clock, last_clock = e->last_clock;
+    memcpy(data, e->data, data_count);
+    e->data_count = 0;
+    e->flags &= ~AE_PENDING;
+    irq_enable();
+    sendf("analog_endstop_data oid=%c sequence=%hu clock=%u last_clock=%u"
+          " data=%*s", oid, e->sequence, first_clock, last_clock
+          , data_count, data);
+    e->sequence++;
+}
+
+void
+command_analog_endstop_capture(uint32_t *args)
+{
+    uint8_t oid = args[0];
+    struct analog_endstop *e = oid_lookup(oid, command_config_analog_endstop);
+    if (args[1]) {
+        // Start a new capture
+        irq_disable();
+        e->flags = AE_CAPTURE;
+        e->data_count = 0;
+        irq_enable();
+        e->sequence = e->overflows = 0;
+        return;
+    }
+    // Stop capture and report any remaining samples
+    irq_disable();
+    e->flags &= ~AE_CAPTURE;
+    if (e->data_count)
+        e->flags |= AE_PENDING;
+    irq_enable();
+    analog_endstop_report(e, oid);
+    sendf("analog_endstop_capture_status oid=%c next_sequence=%hu"
+          " overflows=%hu", oid, e->sequence, e->overflows);
+}
+DECL_COMMAND(command_analog_endstop_capture,
+             "analog_endstop_capture oid=%c enable=%c");
+
+void
+analog_endstop_task(void)
+{
+    if (!sched_check_wake(&analog_endstop_wake))
+        return;
+    uint8_t oid;
+    struct analog_endstop *e;
+    foreach_oid(oid, e, command_config_analog_endstop) {
+        analog_endstop_report(e, oid);
+    }
+}
+DECL_TASK(analog_endstop_task);